@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 from pydantic_settings import BaseSettings
 
@@ -7,13 +8,42 @@ from pydantic_settings import BaseSettings
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ENV_PATH = BASE_DIR / ".env"
 
-print(f"⚙️  Loading Config. Looking for .env at: {ENV_PATH}")
-
 class Settings(BaseSettings):
     # Elastic Cloud Serverless Credentials
     ELASTIC_CLOUD_ID: str = ""
     ELASTIC_API_KEY: str = ""
     ELASTIC_ENDPOINT: str = "" # Serverless URL
+
+    # Additional clusters, JSON: {"name": {"endpoint": ..., "api_key": ..., "connections_per_node": ...}}
+    # ("simulated": {"indices": 1000, ...} instead of an endpoint runs an in-process fake cluster)
+    ELASTIC_CLUSTERS: str = ""
+    ELASTIC_DEFAULT_CLUSTER: str = "default" # Name of the ELASTIC_ENDPOINT cluster; holds agent state
+    ES_CONNECTIONS_PER_NODE: int = 10
+    ES_HTTP_COMPRESS: bool = True
+    ES_REQUEST_TIMEOUT: float = 30.0
+    ES_MAX_RETRIES: int = 3
+
+    # Adaptive Concurrency Limits (per cluster and operation class)
+    ES_LIMIT_INITIAL: int = 10             # In-flight requests allowed before any feedback
+    ES_LIMIT_MIN: int = 1
+    ES_LIMIT_MAX: int = 64
+    ES_LIMIT_BACKOFF: float = 0.7          # Multiplicative decrease on rejection/slowdown
+    ES_LIMIT_LATENCY_FACTOR: float = 3.0   # "Slow" = this many times the latency baseline...
+    ES_LIMIT_LATENCY_SLACK: float = 0.05   # ...plus this many seconds
+    ES_LIMIT_BACKGROUND_SHARE: float = 0.75 # Share of the limit background cycles may use
+
+    # Circuit Breaker / Hedged Reads
+    ES_BREAKER_WINDOW: int = 50            # Recent outcomes judged per cluster and operation class
+    ES_BREAKER_MIN_REQUESTS: int = 10      # Don't judge a window smaller than this
+    ES_BREAKER_ERROR_RATE: float = 0.5     # Opens at this share of 5xx/429/connection errors...
+    ES_BREAKER_SLOW_RATE: float = 0.8      # ...or of calls slower than ES_BREAKER_SLOW_CALL
+    ES_BREAKER_SLOW_CALL: float = 10.0
+    ES_BREAKER_OPEN_SECONDS: float = 30.0  # Fail-fast period before probing again
+    ES_BREAKER_HALF_OPEN_PROBES: int = 1
+    ES_HEDGE_MIN_SAMPLES: int = 20         # Latency samples needed before reads are hedged
+    ES_HEDGE_MIN_DELAY: float = 0.05       # Floor for the p95-based hedge delay (seconds)
+    ES_CONNECT_BACKOFF_MAX: float = 60.0   # Cap on the wait between failed connection attempts
+    ES_CONNECT_TIMEOUT: float = 5.0        # Connection check timeout (no retries)
     
     # Inference API (External LLM)
     INFERENCE_MODEL_ID: str = "gpt-4-turbo"
@@ -21,16 +51,123 @@ class Settings(BaseSettings):
     # App Config
     API_PREFIX: str = "/api/v1"
     DEBUG: bool = True
-    
+
+    # Agent Memory (History Writer)
+    HISTORY_FLUSH_SIZE: int = 500          # Flush once this many events are buffered
+    HISTORY_FLUSH_INTERVAL: float = 5.0    # ...or at least every N seconds
+    HISTORY_MAX_RETRIES: int = 3
+    HISTORY_BUFFER_MAX: int = 10000        # In-memory cap before events go to disk
+    HISTORY_SPILL_PATH: str = ""           # Defaults to <tmp>/autofixer-history.spill.jsonl
+    HISTORY_SPILL_MAX_EVENTS: int = 50000  # Oldest spilled events are dropped past this
+    HISTORY_RETENTION: str = "90d"         # Data stream lifecycle retention
+    HISTORY_ROLLUP_INTERVAL: float = 300.0 # How often summary documents are rolled up
+    HISTORY_ROLLUP_BUCKET: int = 3600      # Seconds covered by one summary document
+    HISTORY_ROLLUP_RETENTION_DAYS: float = 365.0 # Summary documents older than this are deleted
+
+    # Multi-Replica Coordination
+    COORDINATION_ENABLED: bool = False     # Single replica owns everything when off
+    REPLICA_ID: str = ""                   # Defaults to <hostname>-<pid>-<random>
+    COORDINATION_PARTITIONS: int = 64      # Index-space partitions spread over replicas
+    COORDINATION_LEASE_TTL: float = 30.0
+    COORDINATION_HEARTBEAT: float = 10.0
+
+    # Issue Tracking
+    ISSUE_RETRY_AFTER: float = 86400.0     # Seconds before a failed fix is re-proposed
+    ISSUE_PROPOSAL_TTL: float = 604800.0   # Seconds before an unapplied proposal is re-proposed
+
+    # Canary Validation
+    CANARY_SAMPLE_DOCS: int = 10000        # Max documents copied into each shadow index
+    CANARY_SLICES: str = "auto"            # _reindex slices for the sample copy
+    CANARY_LATENCY_TOLERANCE: float = 0.10 # Allowed latency regression on the shadow (10%)
+    CANARY_LATENCY_FLOOR_MS: float = 5.0   # Regressions smaller than this (ms) are always allowed
+    CANARY_MIN_TOP_OVERLAP: float = 0.8    # Share of top hits that must match
+    CANARY_TIMEOUT: float = 300.0
+
+    # Reindex Orchestration
+    REINDEX_RPS_INITIAL: float = 500.0     # Starting requests_per_second for _reindex
+    REINDEX_RPS_MIN: float = 50.0
+    REINDEX_RPS_MAX: float = 5000.0
+    REINDEX_MAX_QUEUE: int = 200           # Write+search queue depth that halves the rate
+    REINDEX_POLL_INTERVAL: float = 10.0    # Seconds between task polls / rethrottles
+    REINDEX_CATCH_UP_TIMEOUT: float = 600.0 # Delta pass while writes still flow
+    REINDEX_BLOCK_TIMEOUT: float = 30.0    # Longest the source stays write-blocked per catch-up attempt
+    REINDEX_CATCH_UP_ATTEMPTS: int = 3     # Blocked passes that may overrun before the job fails
+    REINDEX_EXPLODED_FIELDS: int = 1000    # Above this, a 'strict' fix reindexes to drop fields
+
+    # Backups
+    BACKUP_RETENTION_DAYS: float = 30.0    # Older snapshots are GC'd (the newest per index is kept)
+    BACKUP_GC_INTERVAL: float = 3600.0
+    BACKUP_GC_GRACE: float = 600.0         # Seconds a blob must go unreferenced before GC deletes it
+    BACKUP_ZSTD_LEVEL: int = 9             # Used when 'zstandard' is installed, else gzip
+
+    # Query Validation Cache
+    VALIDATION_CACHE_SIZE: int = 4096      # LRU bound on cached validate_query outcomes
+    VALIDATION_CACHE_TTL: float = 600.0
+    VALIDATION_VERSION_TTL: float = 5.0    # How long a looked-up mapping version is trusted
+    VALIDATION_CONCURRENCY: int = 8        # Parallel _validate calls in batched mode
+
+    # Query Cost Estimation
+    QUERY_COST_STATS_TTL: float = 600.0    # How long index stats/mappings behind estimates are reused
+    QUERY_COST_CACHE_SIZE: int = 512       # LRU bound on cached index profiles
+    QUERY_COST_TERMS_SAMPLE: int = 1000    # _terms_enum size; more distinct terms = high cardinality
+    QUERY_COST_DEEP_FROM: int = 1000       # 'from' at or past this is deep pagination
+    QUERY_COST_THRESHOLD: float = 100.0    # Running queries estimated above this (~100k docs read) are issues
+    QUERY_MAX_ISSUES: int = 20             # Most expensive queries reported per scan
+    QUERY_BENCHMARK_MIN_GAIN: float = 10.0 # Cycles only benchmark query fixes predicted to save this %
+
+    # Growth Forecasting
+    GROWTH_SAMPLES: int = 24               # Size/doc-count samples kept per index (ring buffer)
+    GROWTH_SAMPLE_INTERVAL: float = 3600.0 # Scans closer together than this reuse the last sample
+    GROWTH_MIN_SAMPLES: int = 3            # Samples needed before a growth rate is trusted
+    GROWTH_HORIZON_DAYS: float = 30.0      # Indices projected to hit a limit within this are issues...
+    GROWTH_CRITICAL_DAYS: float = 7.0      # ...critical ones within this
+    GROWTH_MAX_INDEX_SIZE_GB: float = 500.0 # Primary store size per index (0 disables)
+    GROWTH_MAX_SHARD_SIZE_GB: float = 50.0 # Primary store size per primary shard
+    GROWTH_MAX_SHARD_DOCS: int = 200_000_000 # Docs per primary shard
+
+    # Diagnose Snapshots
+    SCAN_SNAPSHOT_TTL: float = 30.0        # Scans younger than this are served without rescanning
+    SCAN_SNAPSHOT_STALE: float = 300.0     # Then served this much longer while a background rescan runs
+    DIAGNOSE_STREAM_BUFFER: int = 100      # Issues buffered ahead of a slow /diagnose/stream reader
+
+    # Background Jobs
+    JOB_WORKERS: int = 4                   # Concurrent generate/benchmark/apply jobs
+    JOB_QUEUE_SIZE: int = 200              # Pending jobs before submits are refused (429)
+    JOB_RESULT_TTL: float = 900.0          # Seconds finished jobs (and their idempotency keys) are kept
+    JOB_HEARTBEAT: float = 10.0            # Seconds between liveness updates of running jobs (3 missed: failed)
+
+    # Telemetry
+    TRACE_BUFFER: int = 200                # Finished traces kept for /api/v1/traces
+    TRACING_OTEL: bool = True              # Mirror spans to OpenTelemetry when opentelemetry-api is installed
+    LOG_QUEUE_SIZE: int = 10000            # Records buffered for the log thread; extra ones are dropped
+
     class Config:
         env_file = str(ENV_PATH)
         case_sensitive = True
         extra = "ignore" 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Reads the environment / .env file once, on first use."""
+    return Settings()
+
+class _LazySettings:
+    """
+    Stand-in for the Settings instance that loads it on first attribute access,
+    so importing modules doesn't read the env file.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(get_settings(), name, value)
+
+settings = _LazySettings()
 
-# Debug Print to verify it worked
-if settings.ELASTIC_ENDPOINT:
-    print(f"✅ Configuration Loaded. Endpoint: {settings.ELASTIC_ENDPOINT}")
-else:
-    print("❌ CRITICAL: ELASTIC_ENDPOINT is missing. Check .env path!")
\ No newline at end of file
+def describe() -> str:
+    """One-line summary of where the configuration came from (logged at startup)."""
+    endpoint = settings.ELASTIC_ENDPOINT or settings.ELASTIC_CLOUD_ID
+    if endpoint:
+        return f"Configuration loaded from {ENV_PATH}. Endpoint: {endpoint}"
+    return f"ELASTIC_ENDPOINT is missing. Check {ENV_PATH}!"
@@ -0,0 +1,321 @@
+import asyncio
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.services.es_client import es_wrapper
+from app.services.coordination import coordinator
+from app.services.backup_store import backup_store, chunk_indices
+from app.core.validator import validator, fix_kind, LIFECYCLE_SETTINGS
+from app.core.reindexer import reindexer
+from app.core.validation_cache import validation_cache
+from app.core.query_cost import query_cost
+from app.models.es_types import FixProposal
+from app.utils import content_hash
+
+JOURNAL_INDEX = ".autofixer-journal"
+
+JOURNAL_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "batch_id": {"type": "keyword"},
+        "cluster": {"type": "keyword"}, # The journal lives on the cluster the batch changed
+        "created_at": {"type": "date"},
+        "issue_id": {"type": "keyword"},
+        "index": {"type": "keyword"},
+        "kind": {"type": "keyword"},
+        "fix_hash": {"type": "keyword"},
+        "status": {"type": "keyword"}, # "pending", "success", "error", "rolled_back", "rollback_error"
+        "message": {"type": "text", "index": False},
+        "backup_id": {"type": "keyword"}, # Pre-state snapshot in the backup store
+        "fixed_code": {"type": "object", "enabled": False}
+    }
+}
+
+BACKUP_CATEGORY = {"mapping": "mapping", "lifecycle": "ilm"}
+
+class BatchApplier:
+    """
+    Applies many fixes at once.
+    1. Groups identical fixes (same kind + canonical fixed_code).
+    2. Backs up each index's pre-state (Validator.create_backup) and journals the
+       backup reference before touching it.
+    3. Applies each group with multi-index put_mapping / put_settings calls, falling
+       back to per-index calls with bounded concurrency when a multi-index call fails
+       (and for indices whose mapping fix needs a reindex, which the validator reports).
+    4. Records per-index outcomes, which a single call can roll back. Batches are
+       journaled on their cluster; get/rollback find it there by batch id.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._index_ready: Set[str] = set() # Clusters whose indices exist
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    async def ensure_index(self):
+        if es_wrapper.current() in self._index_ready:
+            return
+        client = await self._get_client()
+        if not await client.indices.exists(index=JOURNAL_INDEX):
+            try:
+                await client.indices.create(
+                    index=JOURNAL_INDEX,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": JOURNAL_MAPPINGS
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready.add(es_wrapper.current())
+
+    # ---------------------------------------------------------
+    # Apply
+    # ---------------------------------------------------------
+    async def apply_batch(self, proposals: List[FixProposal], max_concurrency: int = 8) -> Dict[str, Any]:
+        await self.ensure_index()
+        client = await self._get_client()
+        batch_id = uuid.uuid4().hex
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results: List[Dict[str, Any]] = []
+
+        # 1. Group identical fixes
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for proposal in proposals:
+            index = proposal.original_code.get("index")
+            kind = fix_kind(proposal.fixed_code)
+            if not index:
+                results.append(self._result(proposal, None, "error", "Target index name missing from proposal."))
+                continue
+            if kind not in BACKUP_CATEGORY:
+                results.append(self._result(proposal, index, "skipped", f"Fix type '{kind}' is not batch-applicable."))
+                continue
+            key = (kind, content_hash(proposal.fixed_code)) # Identical regardless of key order
+            group = groups.setdefault(key, {"kind": kind, "fixed_code": proposal.fixed_code, "targets": {}})
+            if index in group["targets"]:
+                results.append(self._result(proposal, index, "skipped", "Duplicate of another proposal in this batch."))
+                continue
+            group["targets"][index] = proposal
+
+        # 2. Journal pre-state, then 3. apply, group by group
+        for (kind, hash_), group in groups.items():
+            targets: Dict[str, FixProposal] = group["targets"]
+            pre_states = await self._snapshot(list(targets), BACKUP_CATEGORY[kind], batch_id, semaphore)
+
+            missing = [index for index in targets if index not in pre_states]
+            for index in missing:
+                results.append(self._result(targets.pop(index), index, "error", "Index not found or pre-state unavailable; nothing applied."))
+            if not targets:
+                continue
+
+            journal = []
+            for index, proposal in targets.items():
+                journal.append({"index": {"_index": JOURNAL_INDEX, "_id": f"{batch_id}:{kind}:{index}"}})
+                journal.append({
+                    "batch_id": batch_id,
+                    "cluster": es_wrapper.current(),
+                    "created_at": int(time.time() * 1000),
+                    "issue_id": proposal.issue_id,
+                    "index": index,
+                    "kind": kind,
+                    "fix_hash": hash_,
+                    "status": "pending",
+                    "backup_id": pre_states[index]["backup_id"],
+                    "fixed_code": group["fixed_code"]
+                })
+            await client.bulk(body=journal, refresh="wait_for")
+
+            outcomes = await self._apply_group(kind, group["fixed_code"], targets, semaphore)
+
+            updates = []
+            for index, (status, message) in outcomes.items():
+                results.append(self._result(targets[index], index, status, message))
+                updates.append({"update": {"_index": JOURNAL_INDEX, "_id": f"{batch_id}:{kind}:{index}"}})
+                updates.append({"doc": {"status": status, "message": message}})
+            await client.bulk(body=updates)
+
+        return {"batch_id": batch_id, "cluster": es_wrapper.current(), **self._summarize(results), "results": results}
+
+    async def _snapshot(self, indices: List[str], category: str, batch_id: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Backs up every index, a chunk of indices per call."""
+        async def fetch(chunk: List[str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await validator.create_backup(",".join(chunk), category, batch_id=batch_id)
+
+        states: Dict[str, Any] = {}
+        for part in await asyncio.gather(*(fetch(chunk) for chunk in chunk_indices(indices))):
+            states.update(part)
+        return states
+
+    async def _apply_group(
+        self,
+        kind: str,
+        fixed_code: Dict[str, Any],
+        targets: Dict[str, FixProposal],
+        semaphore: asyncio.Semaphore
+    ) -> Dict[str, Tuple[str, str]]:
+        outcomes: Dict[str, Tuple[str, str]] = {}
+        fallback: List[str] = []
+
+        if coordinator.enabled:
+            # Per-index locks are needed; go through the validator one index at a time
+            fallback = list(targets)
+        else:
+            client = await self._get_client()
+            in_place = list(targets)
+            if kind == "mapping":
+                async def needs_reindex(index: str) -> bool:
+                    async with semaphore:
+                        return bool(await reindexer.requires_reindex(index, fixed_code))
+
+                # The validator reports these as reindex_required, like a single apply-fix
+                flags = await asyncio.gather(*(needs_reindex(index) for index in in_place))
+                fallback.extend(index for index, flag in zip(in_place, flags) if flag)
+                in_place = [index for index, flag in zip(in_place, flags) if not flag]
+
+            async def apply_chunk(chunk: List[str]):
+                async with semaphore:
+                    try:
+                        if kind == "mapping":
+                            await client.indices.put_mapping(index=",".join(chunk), body=fixed_code)
+                        else:
+                            await client.indices.update_aliases(body={"actions": [
+                                {"add": {"index": index, "alias": f"{index}-alias"}} for index in chunk
+                            ]})
+                            await client.indices.put_settings(index=",".join(chunk), body=LIFECYCLE_SETTINGS)
+                        for index in chunk:
+                            validation_cache.invalidate(index)
+                            query_cost.invalidate(index)
+                            outcomes[index] = ("success", f"{kind.capitalize()} fix applied to {index}.")
+                    except Exception as e:
+                        print(f"⚠️ Multi-index {kind} fix failed for {len(chunk)} indices, retrying one by one: {e}")
+                        fallback.extend(chunk)
+
+            await asyncio.gather(*(apply_chunk(chunk) for chunk in chunk_indices(in_place)))
+
+        async def apply_one(index: str):
+            async with semaphore:
+                result = await validator.apply_fix(targets[index])
+                outcomes[index] = (result["status"], result["message"])
+
+        await asyncio.gather(*(apply_one(index) for index in fallback))
+        return outcomes
+
+    # ---------------------------------------------------------
+    # Rollback
+    # ---------------------------------------------------------
+    async def locate(self, batch_id: str) -> Optional[str]:
+        """Cluster whose journal holds the batch (the selected one, if any), or None."""
+        if es_wrapper.selected():
+            return es_wrapper.selected()
+
+        async def journaled() -> bool:
+            client = await self._get_client()
+            resp = await client.count(index=JOURNAL_INDEX, body={"query": {"term": {"batch_id": batch_id}}}, ignore_unavailable=True)
+            return resp["count"] > 0
+
+        found = await es_wrapper.fan_out(journaled)
+        return next((cluster for cluster, result in found.items() if result is True), None)
+
+    async def rollback_batch(self, batch_id: str, max_concurrency: int = 8) -> Dict[str, Any]:
+        """
+        Restores every successfully fixed index of a batch from its backup, on the
+        batch's cluster. Note: fields added to a mapping cannot be removed; rollback
+        restores 'dynamic'.
+        """
+        cluster = await self.locate(batch_id)
+        if cluster is None:
+            return {"batch_id": batch_id, "cluster": None, "rolled_back": 0, "failed": 0, "results": []}
+        with es_wrapper.using(cluster):
+            return {"batch_id": batch_id, "cluster": cluster, **await self._rollback(batch_id, max_concurrency)}
+
+    async def _rollback(self, batch_id: str, max_concurrency: int) -> Dict[str, Any]:
+        await self.ensure_index()
+        client = await self._get_client()
+        entries = await self._entries(batch_id, status="success")
+        restored = await backup_store.restore_many(
+            [entry["backup_id"] for entry in entries if entry.get("backup_id")],
+            max_concurrency=max_concurrency
+        )
+
+        outcomes: Dict[Tuple[str, str], Tuple[str, str]] = {} # (kind, index) -> (status, message)
+        for entry in entries:
+            outcome = restored.get(entry.get("backup_id"), ("rollback_error", "No backup recorded for this fix."))
+            outcomes[(entry["kind"], entry["index"])] = outcome
+
+        updates = []
+        for (kind, index), (status, message) in outcomes.items():
+            updates.append({"update": {"_index": JOURNAL_INDEX, "_id": f"{batch_id}:{kind}:{index}"}})
+            updates.append({"doc": {"status": status, "message": message}})
+        if updates:
+            await client.bulk(body=updates, refresh="wait_for")
+
+        results = [
+            {"index": index, "kind": kind, "status": status, "message": message}
+            for (kind, index), (status, message) in outcomes.items()
+        ]
+        return {
+            "rolled_back": sum(1 for r in results if r["status"] == "rolled_back"),
+            "failed": sum(1 for r in results if r["status"] == "rollback_error"),
+            "results": results
+        }
+
+    async def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Per-index status of a batch, from its cluster's journal."""
+        cluster = await self.locate(batch_id)
+        if cluster is None:
+            return {"batch_id": batch_id, "cluster": None, "counts": {}, "results": []}
+        with es_wrapper.using(cluster):
+            await self.ensure_index()
+            entries = await self._entries(batch_id)
+        counts: Dict[str, int] = {}
+        for entry in entries:
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        results = [
+            {"issue_id": e["issue_id"], "index": e["index"], "status": e["status"], "message": e.get("message")}
+            for e in entries
+        ]
+        return {"batch_id": batch_id, "cluster": cluster, "counts": counts, "results": results}
+
+    async def _entries(self, batch_id: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        client = await self._get_client()
+        filters = [{"term": {"batch_id": batch_id}}]
+        if status:
+            filters.append({"term": {"status": status}})
+
+        entries, search_after = [], None
+        while True:
+            body = {
+                "size": 1000,
+                "query": {"bool": {"filter": filters}},
+                "sort": [{"index": "asc"}, {"kind": "asc"}]
+            }
+            if search_after:
+                body["search_after"] = search_after
+            hits = (await client.search(index=JOURNAL_INDEX, body=body))["hits"]["hits"]
+            entries.extend(hit["_source"] for hit in hits)
+            if len(hits) < 1000:
+                return entries
+            search_after = hits[-1]["sort"]
+
+    @staticmethod
+    def _result(proposal: FixProposal, index: Optional[str], status: str, message: str) -> Dict[str, Any]:
+        return {"issue_id": proposal.issue_id, "index": index, "status": status, "message": message}
+
+    @staticmethod
+    def _summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+        summary = {"applied": 0, "failed": 0, "skipped": 0}
+        for result in results:
+            if result["status"] == "success":
+                summary["applied"] += 1
+            elif result["status"] in ("skipped", "locked", "reindex_required"):
+                summary["skipped"] += 1
+            else:
+                summary["failed"] += 1
+        return summary
+
+# Singleton instance
+batch_applier = BatchApplier()
@@ -0,0 +1,222 @@
+import asyncio
+import random
+import time
+from typing import Dict, Any, List, Optional
+from app.services.es_client import es_wrapper
+from app.core.validator import fix_kind, LIFECYCLE_SETTINGS
+from app.core.benchmarker import benchmarker
+from app.core.reindexer import COPIED_SETTING_PREFIXES
+from app.services.telemetry import tracer
+from app.models.es_types import FixProposal
+from app.config import settings
+
+CANARY_PREFIX = ".autofixer-canary-"
+
+MATCH_ALL = {"query": {"match_all": {}}}
+
+class CanaryRunner:
+    """
+    Trial-runs a fix on a sampled shadow copy of an index before it touches production.
+    1. Creates a 'control' shadow with the current mapping/settings and a 'canary'
+       shadow with the proposed ones.
+    2. Reindexes the same bounded random sample (max_docs + slices) into both.
+    3. Checks the sample indexes cleanly, queries return equivalent hits, and
+       latency (median of interleaved runs) does not regress beyond the configured
+       tolerance and absolute floor.
+    4. Deletes both shadows.
+    """
+
+    def __init__(self):
+        self.client = None
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    @tracer.traced("canary")
+    async def run(self, fix: FixProposal, sample_docs: Optional[int] = None) -> Dict[str, Any]:
+        client = await self._get_client()
+        index = fix.original_code.get("index")
+        kind = fix_kind(fix.fixed_code)
+        sample_docs = sample_docs or settings.CANARY_SAMPLE_DOCS
+
+        if not index:
+            return {"passed": False, "reason": "Target index name missing from proposal."}
+        if kind == "unknown":
+            return {"passed": False, "reason": "Fix type not recognized; nothing to canary."}
+
+        stamp = f"{int(time.time())}-{random.randint(0, 9999):04d}"
+        control = f"{CANARY_PREFIX}{index}-control-{stamp}"
+        canary = f"{CANARY_PREFIX}{index}-canary-{stamp}"
+        report: Dict[str, Any] = {"index": index, "kind": kind, "checks": {}}
+
+        try:
+            # 1. Shadows
+            source = await client.indices.get_mapping(index=index)
+            source_mappings = source[index]["mappings"]
+            source_settings = await self._copied_settings(index)
+
+            canary_mappings, canary_settings = source_mappings, source_settings
+            if kind == "mapping":
+                try:
+                    canary_mappings = self._merge_mappings(source_mappings, fix.fixed_code)
+                except ValueError as e:
+                    report["checks"]["create"] = {"passed": False, "error": str(e)}
+                    return {**report, "passed": False, "reason": "Proposed mapping changes the type of an existing field."}
+            elif kind == "lifecycle":
+                canary_settings = {**source_settings, "index.refresh_interval": LIFECYCLE_SETTINGS["index.refresh_interval"]}
+
+            await client.indices.create(index=control, body={"settings": source_settings, "mappings": source_mappings})
+            if kind != "query": # Query rewrites run against the control copy only
+                try:
+                    await client.indices.create(index=canary, body={"settings": canary_settings, "mappings": canary_mappings})
+                except Exception as e:
+                    report["checks"]["create"] = {"passed": False, "error": str(e)}
+                    return {**report, "passed": False, "reason": "Proposed mapping/settings were rejected."}
+                report["checks"]["create"] = {"passed": True}
+
+            # 2. Same random sample into the shadows
+            total = (await client.count(index=index))["count"]
+            seed = random.randint(0, 2**31 - 1)
+            targets = [control] if kind == "query" else [control, canary]
+            copies = await asyncio.gather(*(
+                self._reindex_sample(index, target, total, sample_docs, seed) for target in targets
+            ))
+            await client.indices.refresh(index=",".join(targets))
+            control_copy, canary_copy = copies[0], copies[-1]
+            report["sample_docs"] = control_copy["created"]
+
+            failures = control_copy["failures"] + (canary_copy["failures"] if kind != "query" else [])
+            report["checks"]["ingest"] = {
+                "passed": not failures and canary_copy["created"] == control_copy["created"],
+                "control_docs": control_copy["created"],
+                "canary_docs": canary_copy["created"],
+                "failures": failures[:5]
+            }
+
+            # 3. Equivalence + latency on the shadows
+            if kind == "query":
+                original = {"query": fix.original_code.get("query", {"match_all": {}})}
+                optimized = {"query": fix.fixed_code["query"]}
+                equivalence = await self._equivalent(control, original, control, optimized)
+                benchmark = await benchmarker.compare(control, original, optimized)
+            else:
+                probe = {"query": fix.original_code["query"]} if "query" in fix.original_code else MATCH_ALL
+                equivalence = await self._equivalent(control, probe, canary, probe)
+                benchmark = await benchmarker.compare(control, probe, probe, optimized_index=canary)
+
+            report["checks"]["equivalence"] = equivalence
+            # Medians of interleaved runs; sub-floor differences are noise on shadows this small
+            regression = benchmark.latency_after_ms - benchmark.latency_before_ms
+            latency_ok = benchmark.latency_before_ms >= 0 and benchmark.latency_after_ms >= 0 and (
+                regression <= settings.CANARY_LATENCY_FLOOR_MS or
+                benchmark.latency_after_ms <= benchmark.latency_before_ms * (1 + settings.CANARY_LATENCY_TOLERANCE)
+            )
+            report["checks"]["latency"] = {"passed": latency_ok, **benchmark.dict()}
+
+            report["passed"] = all(check["passed"] for check in report["checks"].values())
+            if not report["passed"]:
+                failed = [name for name, check in report["checks"].items() if not check["passed"]]
+                report["reason"] = f"Canary checks failed: {', '.join(failed)}."
+            return report
+
+        except Exception as e:
+            return {**report, "passed": False, "reason": f"Canary run failed: {e}"}
+
+        finally:
+            try:
+                await client.indices.delete(index=f"{control},{canary}", ignore_unavailable=True)
+            except Exception as e:
+                print(f"⚠️ Could not delete canary shadows for {index}: {e}")
+
+    async def _copied_settings(self, index: str) -> Dict[str, Any]:
+        client = await self._get_client()
+        resp = await client.indices.get_settings(index=index, flat_settings=True)
+        flat = resp[index]["settings"]
+        # Shard/replica counts are left to the cluster default (not settable on Serverless)
+        return {key: value for key, value in flat.items() if key.startswith(COPIED_SETTING_PREFIXES)}
+
+    @staticmethod
+    def _merge_mappings(current: Dict[str, Any], fixed: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        What put_mapping would produce: existing fields stay, the fix's fields/params win.
+        Like put_mapping, changing the type of an existing field raises ValueError.
+        """
+        def merge_fields(existing: Dict[str, Any], changes: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+            merged = dict(existing)
+            for name, field in changes.items():
+                path = f"{prefix}{name}"
+                old = existing.get(name)
+                if old is None:
+                    merged[name] = field
+                    continue
+                old_type = old.get("type", "object" if "properties" in old else None)
+                new_type = field.get("type", "object" if "properties" in field else old_type)
+                if old_type != new_type:
+                    raise ValueError(f"mapper [{path}] cannot be changed from type [{old_type}] to [{new_type}]")
+                merged[name] = {**old, **field}
+                if "properties" in old and "properties" in field:
+                    merged[name]["properties"] = merge_fields(old["properties"], field["properties"], f"{path}.")
+                if "fields" in old and "fields" in field:
+                    merged[name]["fields"] = merge_fields(old["fields"], field["fields"], f"{path}.")
+            return merged
+
+        merged = {**current, **{k: v for k, v in fixed.items() if k != "properties"}}
+        merged["properties"] = merge_fields(current.get("properties", {}), fixed.get("properties", {}), "")
+        return merged
+
+    async def _reindex_sample(self, source: str, dest: str, total: int, sample_docs: int, seed: int) -> Dict[str, Any]:
+        """Copies a bounded random sample; the seed makes both shadows get the same documents."""
+        client = await self._get_client()
+        fraction = min(1.0, sample_docs / total) if total else 1.0
+        query: Dict[str, Any] = {"match_all": {}}
+        if fraction < 1.0:
+            query = {
+                "function_score": {
+                    "query": {"match_all": {}},
+                    "random_score": {"seed": seed, "field": "_seq_no"},
+                    "boost_mode": "replace",
+                    "min_score": 1.0 - fraction
+                }
+            }
+
+        resp = await client.options(request_timeout=settings.CANARY_TIMEOUT).reindex(
+            source={"index": source, "query": query},
+            dest={"index": dest},
+            max_docs=sample_docs,
+            slices=settings.CANARY_SLICES,
+            conflicts="proceed",
+            wait_for_completion=True
+        )
+        return {"created": resp.get("created", 0), "failures": resp.get("failures", [])}
+
+    async def _equivalent(
+        self,
+        index_a: str,
+        query_a: Dict[str, Any],
+        index_b: str,
+        query_b: Dict[str, Any],
+        top_n: int = 10
+    ) -> Dict[str, Any]:
+        """Same hit count and same top document IDs."""
+        client = await self._get_client()
+
+        async def probe(index: str, body: Dict[str, Any]) -> List[Any]:
+            resp = await client.search(
+                index=index,
+                body={**body, "size": top_n, "_source": False, "track_total_hits": True}
+            )
+            hits = resp["hits"]
+            return [hits["total"]["value"], [hit["_id"] for hit in hits["hits"]]]
+
+        (total_a, ids_a), (total_b, ids_b) = await asyncio.gather(probe(index_a, query_a), probe(index_b, query_b))
+        overlap = len(set(ids_a) & set(ids_b)) / max(len(ids_a), 1)
+        return {
+            "passed": total_a == total_b and overlap >= settings.CANARY_MIN_TOP_OVERLAP,
+            "hits_before": total_a,
+            "hits_after": total_b,
+            "top_overlap": round(overlap, 3)
+        }
+
+# Singleton instance
+canary_runner = CanaryRunner()
@@ -1,80 +1,260 @@
 import asyncio
-from typing import List, Dict, Any
+import time
+import numpy as np
+from typing import List, Dict, Any, Optional, AsyncIterator
 from app.services.es_client import es_wrapper
+from app.services.coordination import coordinator
+from app.utils import content_hash
+from app.services.telemetry import tracer
+from app.core.query_cost import query_cost
+from app.core.growth import growth_forecaster, GB
 from app.models.es_types import DiagnosticResult
+from app.config import settings
 
 class ClusterScanner:
     def __init__(self):
         self.client = None
 
     async def _get_client(self):
-        if not self.client:
-            self.client = await es_wrapper.get_client()
-        return self.client
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
 
-    async def scan_all(self) -> List[DiagnosticResult]:
-        print("🔍 Scanning Cluster (Simplified Mode)...")
+    async def scan_clusters(self, clusters: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Scans several clusters concurrently; returns {cluster: issues or exception}."""
+        return await es_wrapper.fan_out(self.scan_all, clusters)
+
+    async def stream_clusters(self, clusters: Optional[List[str]] = None, buffer: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Scans clusters concurrently and yields records as soon as they exist:
+        {"type": "issue", "data": ...} per issue, {"type": "error", ...} per failed
+        cluster, then one {"type": "summary", ...}.
+        Scans write into a bounded queue, so a slow reader holds them back instead
+        of results piling up in memory; closing the stream cancels them.
+        """
+        names = clusters or es_wrapper.cluster_names()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer or settings.DIAGNOSE_STREAM_BUFFER)
+        summary = {name: {"issues": 0, "error": None} for name in names}
+        start = time.monotonic()
+
+        async def produce(name: str):
+            try:
+                with es_wrapper.using(name), tracer.span("scan", cluster=name):
+                    async for issue in self.iter_issues():
+                        await queue.put({"type": "issue", "data": issue.dict()})
+                        summary[name]["issues"] += 1
+            except Exception as e:
+                summary[name]["error"] = str(e)
+                await queue.put({"type": "error", "cluster": name, "error": str(e)})
+            await queue.put(None) # This producer is done (not sent when cancelled)
+
+        tasks = [asyncio.create_task(produce(name)) for name in names]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                record = await queue.get()
+                if record is None:
+                    remaining -= 1
+                else:
+                    yield record
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "type": "summary",
+            "issues": sum(entry["issues"] for entry in summary.values()),
+            "clusters": summary,
+            "duration_ms": round((time.monotonic() - start) * 1000, 1)
+        }
+
+    @tracer.traced("scan")
+    async def scan_all(self, errors: Optional[List[str]] = None, owned_only: bool = False) -> List[DiagnosticResult]:
+        tracer.annotate(cluster=es_wrapper.current())
+        return [issue async for issue in self.iter_issues(errors, owned_only)]
+
+    async def iter_issues(self, errors: Optional[List[str]] = None, owned_only: bool = False) -> AsyncIterator[DiagnosticResult]:
+        """
+        Yields issues as they're found, so callers can stream them without holding the whole scan.
+        Covers the whole cluster, unless owned_only: then only indices in this replica's
+        partitions are checked (the autonomous cycle), so replicas split the scan work.
+        API callers (/diagnose) always get full scans.
+        Checks that fail without failing the scan are appended to errors (e.g. "mapping:<index>"):
+        issues they'd have found are missing, so the scan is incomplete.
+        """
+        errors = [] if errors is None else errors
+        print(f"🔍 Scanning Cluster '{es_wrapper.current()}' (Simplified Mode)...")
         client = await self._get_client()
-        issues = []
+        cluster = es_wrapper.current()
+        found = 0
         
+        # Get all indices (only the columns we use, sizes in bytes). If that fails the
+        # whole cluster failed: raise, so callers report it instead of a clean empty scan
         try:
-            # Get all indices
-            indices = await client.cat.indices(format="json")
-            print(f"📊 Total indices found: {len(indices)}")
-            
-            for idx in indices:
-                name = idx['index']
-                print(f"   Scanning index: {name}")
-                
-                # CRUCIAL: Check for "bad-" prefix in index name
-                if "bad-" in name:
-                    print(f"   ✓ Detected 'bad-' prefix in index: {name}")
-                    
-                    # MAPPING CHECK: Handle bad-mapping indices
-                    if "mapping" in name:
-                        try:
-                            mapping = await client.indices.get_mapping(index=name)
-                            props = mapping[name]['mappings'].get('properties', {})
-                            count = len(props)
-                            print(f"   ⚠️ Bad Mapping Issue: {name} has {count} fields")
-                            
-                            issues.append(DiagnosticResult(
-                                issue_id=f"mapping_{name}",
-                                severity="critical",
-                                category="mapping",
-                                description=f"Mapping Explosion: Index has {count} fields (Limit 1000).",
-                                affected_resource=name,
-                                detected_at="now",
-                                metrics={"field_count": count}
-                            ))
-                        except Exception as e:
-                            print(f"   ❌ Error checking mapping for {name}: {e}")
-                    
-                    # ILM CHECK: Handle bad-ilm indices
-                    if "ilm" in name:
-                        try:
-                            # Treat missing ILM as critical issue
-                            size = idx.get('store.size', 'unknown')
-                            print(f"   ⚠️ Bad ILM Issue: {name} has no lifecycle policy (Size: {size})")
-                            
-                            issues.append(DiagnosticResult(
-                                issue_id=f"missing_ilm_{name}",
-                                severity="critical",
-                                category="ilm",
-                                description="Missing ILM Policy: Index will grow indefinitely.",
-                                affected_resource=name,
-                                detected_at="now",
-                                metrics={"size": size}
-                            ))
-                        except Exception as e:
-                            print(f"   ❌ Error checking ILM for {name}: {e}")
-                else:
-                    print(f"   ○ Skipping normal index: {name}")
-                    
+            indices = await client.cat.indices(format="json", h="index,pri,pri.store.size,docs.count", bytes="b")
         except Exception as e:
             print(f"❌ Scan Failed: {e}")
+            raise
+        print(f"📊 Total indices found: {len(indices)}")
+        if owned_only:
+            indices = [idx for idx in indices if coordinator.owns(es_wrapper.qualify(idx["index"], cluster))]
+            print(f"📊 Indices in this replica's partitions: {len(indices)}")
+        
+        for idx in indices:
+            name = idx['index']
+            print(f"   Scanning index: {name}")
             
-        print(f"✅ Scan Complete. Found {len(issues)} issues.")
-        return issues
+            # CRUCIAL: Check for "bad-" prefix in index name
+            if "bad-" in name:
+                print(f"   ✓ Detected 'bad-' prefix in index: {name}")
+                
+                # MAPPING CHECK: Handle bad-mapping indices
+                if "mapping" in name:
+                    try:
+                        mapping = await client.indices.get_mapping(index=name)
+                        props = mapping[name]['mappings'].get('properties', {})
+                        count = len(props)
+                        print(f"   ⚠️ Bad Mapping Issue: {name} has {count} fields")
+                        
+                        found += 1
+                        yield DiagnosticResult(
+                            issue_id=f"mapping_{name}",
+                            severity="critical",
+                            category="mapping",
+                            description=f"Mapping Explosion: Index has {count} fields (Limit 1000).",
+                            affected_resource=name,
+                            detected_at="now",
+                            metrics={"field_count": count},
+                            cluster=cluster
+                        )
+                    except Exception as e:
+                        print(f"   ❌ Error checking mapping for {name}: {e}")
+                        errors.append(f"mapping:{name}")
+            else:
+                print(f"   ○ Skipping normal index: {name}")
+
+        # LIFECYCLE CHECK: growth forecast + lifecycle setting, for all indices at once
+        async for issue in self.iter_lifecycle_issues(indices, errors, partial=owned_only):
+            found += 1
+            yield issue
+
+        # QUERY CHECK: running searches, ranked by estimated cost (nothing is executed)
+        async for issue in self.iter_query_issues(errors, owned_only):
+            found += 1
+            yield issue
+
+        print(f"✅ Scan Complete. Found {found} issues.")
+
+    async def iter_lifecycle_issues(
+        self,
+        indices: List[Dict[str, Any]],
+        errors: Optional[List[str]] = None,
+        partial: bool = False
+    ) -> AsyncIterator[DiagnosticResult]:
+        """
+        Indices projected to cross a size/shard limit within GROWTH_HORIZON_DAYS, or with
+        no index.lifecycle.name; soonest breach first. System (dot) indices are left to ES.
+        Note: every other index without a policy is flagged (medium on its own), whatever
+        its name or growth; data stream backing indices (.ds-*) are dot indices.
+        """
+        cluster = es_wrapper.current()
+        indices = [idx for idx in indices if not idx["index"].startswith(".")]
+        if not indices:
+            return
+        names = [idx["index"] for idx in indices]
+        forecast = growth_forecaster.forecast(
+            cluster, names,
+            [int(idx.get("pri") or 1) for idx in indices],
+            [float(idx.get("pri.store.size") or 0) for idx in indices],
+            [float(idx.get("docs.count") or 0) for idx in indices],
+            partial=partial
+        )
+
+        policies = await self._lifecycle_policies()
+        if policies is None:
+            policies = {}
+            if errors is not None:
+                errors.append("ilm")
+        days = forecast["days_to_breach"]
+        missing = np.array([name in policies and not policies[name] for name in names], dtype=bool)
+        flagged = np.flatnonzero((days <= settings.GROWTH_HORIZON_DAYS) | missing)
+        for i in flagged[np.argsort(days[flagged], kind="stable")]:
+            name, policy = names[i], policies.get(names[i])
+            breach = bool(days[i] <= settings.GROWTH_HORIZON_DAYS)
+            if breach:
+                limit = forecast["limit"][i].replace("_", " ")
+                when = "now" if days[i] == 0 else f"in {days[i]:.1f} days"
+                description = f"Index Growth: {limit} limit reached {when} at {forecast['size_per_day'][i] / GB:.2f}GB/day."
+                if missing[i]:
+                    description += " No ILM policy to roll it over."
+            else:
+                description = "Missing ILM Policy: Index will grow indefinitely."
+            print(f"   ⚠️ Lifecycle Issue: {name}: {description}")
+            yield DiagnosticResult(
+                issue_id=f"missing_ilm_{name}" if missing[i] else f"growth_{name}",
+                severity=(
+                    "critical" if breach and days[i] <= settings.GROWTH_CRITICAL_DAYS
+                    else "high" if breach else "medium"
+                ),
+                category="ilm",
+                description=description,
+                affected_resource=name,
+                detected_at="now",
+                metrics={
+                    "size": int(float(indices[i].get("pri.store.size") or 0)),
+                    "docs": int(float(indices[i].get("docs.count") or 0)),
+                    "primaries": int(indices[i].get("pri") or 1),
+                    "size_per_day": round(float(forecast["size_per_day"][i]), 1),
+                    "docs_per_day": round(float(forecast["docs_per_day"][i]), 1),
+                    "days_to_breach": round(float(days[i]), 2) if np.isfinite(days[i]) else None,
+                    "limit": str(forecast["limit"][i]) if breach else None,
+                    "samples": int(forecast["samples"][i]),
+                    "lifecycle": policy
+                },
+                cluster=cluster
+            )
+
+    async def _lifecycle_policies(self) -> Optional[Dict[str, Optional[str]]]:
+        """index -> index.lifecycle.name (None if unset), in one call; indices left out aren't judged."""
+        client = await self._get_client()
+        try:
+            resp = await client.indices.get_settings(index="*", name="index.lifecycle.name", flat_settings=True)
+        except Exception as e:
+            print(f"   ○ Skipping lifecycle setting check: {e}")
+            return None
+        return {name: body.get("settings", {}).get("index.lifecycle.name") for name, body in resp.items()}
+
+    async def iter_query_issues(self, errors: Optional[List[str]] = None, owned_only: bool = False) -> AsyncIterator[DiagnosticResult]:
+        """
+        The most expensive running queries (by static cost estimate) above QUERY_COST_THRESHOLD;
+        owned_only: just those on index expressions in this replica's partitions.
+        """
+        cluster = es_wrapper.current()
+        try:
+            queries = await query_cost.running_queries()
+        except Exception as e:
+            print(f"   ○ Skipping query check (no Tasks API): {e}")
+            if errors is not None:
+                errors.append("query")
+            return
+        if owned_only:
+            queries = [(index, body) for index, body in queries if coordinator.owns(es_wrapper.qualify(index, cluster))]
+        ranked = await query_cost.rank(queries)
+        threshold = settings.QUERY_COST_THRESHOLD
+        for estimate in ranked[:settings.QUERY_MAX_ISSUES]:
+            if estimate["cost"] < threshold:
+                break
+            index = estimate["index"]
+            reasons = ", ".join(dict.fromkeys(f["factor"] for f in estimate["factors"][:3])) or "large scan"
+            print(f"   ⚠️ Expensive Query on {index}: estimated cost {estimate['cost']} ({reasons})")
+            yield DiagnosticResult(
+                issue_id=f"query_{content_hash({'index': index, 'body': estimate['query']})[:16]}",
+                severity="critical" if estimate["cost"] >= threshold * 10 else "high" if estimate["cost"] >= threshold * 3 else "medium",
+                category="query",
+                description=f"Expensive Query: estimated cost {estimate['cost']} (~{estimate['scan_ratio']}x a full read of {index}); {reasons}.",
+                affected_resource=index,
+                detected_at="now",
+                metrics={key: estimate[key] for key in ("cost", "scan_ratio", "docs", "factors", "query")},
+                cluster=cluster
+            )
 
 scanner = ClusterScanner()
\ No newline at end of file
@@ -2,12 +2,14 @@ import json
 from typing import Dict, Any, Optional
 from app.models.es_types import DiagnosticResult, FixProposal
 from app.services.inference import inference_service
+from app.services.telemetry import tracer
 
 class FixGenerator:
     """
     Orchestrates the logic to generate valid Elasticsearch DSL fixes.
     """
     
+    @tracer.traced("generate")
     async def generate_fix(self, diagnostic: DiagnosticResult) -> FixProposal:
         category = diagnostic.category
         
@@ -16,9 +18,13 @@ class FixGenerator:
         affected_resource = diagnostic.affected_resource 
         
         context = f"Issue: {diagnostic.description}. Severity: {diagnostic.severity}."
+        # Query issues carry the offending search body: that's the code to fix.
+        # Other issues are found by settings, not by name, so the category goes along
+        query_body = diagnostic.metrics.get("query") if category == "query" else None
+        bad_code = json.dumps(query_body) if query_body else f"{category}: {affected_resource}"
         
         # 2. Call LLM (or Fallback)
-        llm_response = await inference_service.generate_fix_proposal(context, affected_resource)
+        llm_response = await inference_service.generate_fix_proposal(context, bad_code)
         
         # 3. Extract parts
         fixed_code = llm_response.get("fixed_code", {})
@@ -26,16 +32,21 @@ class FixGenerator:
         
         # 4. Construct Proposal
         # LOGICAL FIX: We pass 'index' explicitly in original_code so Validator finds it 100% of the time.
+        original_code = {
+            "source": str(affected_resource),
+            "index": affected_resource,  # <--- THIS IS THE MISSING KEY
+            "category": category
+        }
+        if query_body:
+            original_code["query"] = query_body.get("query", {"match_all": {}}) # What /benchmark runs as 'before'
+            original_code["body"] = query_body
         return FixProposal(
             issue_id=diagnostic.issue_id,
-            original_code={
-                "source": str(affected_resource),
-                "index": affected_resource,  # <--- THIS IS THE MISSING KEY
-                "category": category
-            },
+            original_code=original_code,
             fixed_code=fixed_code,
             explanation=explanation,
-            estimated_impact="High - AI optimized."
+            estimated_impact="High - AI optimized.",
+            cluster=diagnostic.cluster
         )
 
 # Singleton instance
@@ -0,0 +1,155 @@
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+
+GB = 1024 ** 3
+DAY = 86400.0
+LIMITS = ("index_size", "shard_size", "shard_docs")
+
+def _slopes(times: np.ndarray, mask: np.ndarray, *series: Tuple[np.ndarray, np.ndarray]):
+    """
+    Least-squares slope per row, for each (values R x S, reference R) against the shared
+    sample times (S); mask marks the samples present. Rows are shifted by their reference
+    (current) value first: sizes are ~1e12 bytes and raw sums of them would cancel out.
+    """
+    n = mask.sum(axis=1)
+    x = np.where(mask, times - np.nanmax(times), 0.0) # Always one sample: forecast() records first
+    sx = x.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = np.einsum("ij,ij->i", x, x) - sx * sx / n
+        slopes = []
+        for values, reference in series:
+            y = np.where(mask, values - reference[:, None], 0.0)
+            cov = np.einsum("ij,ij->i", x, y) - sx * y.sum(axis=1) / n
+            slopes.append(np.nan_to_num(np.where(var > 0, cov / var, 0.0)))
+    return slopes, n
+
+def _days_to(current: np.ndarray, limit: np.ndarray, per_day: np.ndarray) -> np.ndarray:
+    """Days until current reaches limit at per_day (0 if already there, inf if never or no limit)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days = np.where(per_day > 0, (limit - current) / per_day, np.inf)
+    days = np.where(current >= limit, 0.0, days)
+    return np.where(limit > 0, days, np.inf)
+
+class _Series:
+    """
+    Ring buffers of one cluster's samples: row r is index r's last GROWTH_SAMPLES
+    (size, docs) pairs, column c the scan that wrote it (times[c]). Indices absent
+    from a scan get NaN there; rows of deleted indices are reused.
+    """
+
+    def __init__(self, samples: int):
+        self.times = np.full(samples, np.nan)
+        self.sizes = np.full((0, samples), np.nan)
+        self.docs = np.full((0, samples), np.nan)
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.head = 0
+        self.last: Optional[float] = None
+
+    def rows_for(self, names: List[str], forget: bool = True) -> np.ndarray:
+        new = [name for name in names if name not in self.rows]
+        if forget and len(self.rows) > len(names) - len(new):
+            # Some indices weren't listed: deleted (or no longer ours), forget their history
+            current = set(names)
+            for name in [n for n in self.rows if n not in current]:
+                row = self.rows.pop(name)
+                self.sizes[row] = self.docs[row] = np.nan
+                self.free.append(row)
+
+        if len(new) > len(self.free):
+            capacity = len(self.sizes)
+            grown = max(capacity * 2, capacity + len(new) - len(self.free), 64)
+            padding = np.full((grown - capacity, len(self.times)), np.nan)
+            self.sizes = np.concatenate([self.sizes, padding])
+            self.docs = np.concatenate([self.docs, padding])
+            self.free.extend(range(grown - 1, capacity - 1, -1))
+        for name in new:
+            self.rows[name] = self.free.pop()
+        return np.fromiter((self.rows[name] for name in names), dtype=np.intp, count=len(names))
+
+    def record(self, rows: np.ndarray, sizes: np.ndarray, docs: np.ndarray, now: float):
+        column = self.head
+        self.times[column] = now
+        self.sizes[:, column] = self.docs[:, column] = np.nan
+        self.sizes[rows, column] = sizes
+        self.docs[rows, column] = docs
+        self.head = (column + 1) % len(self.times)
+        self.last = now
+
+class GrowthForecaster:
+    """
+    Forecasts when indices outgrow their limits, from how they grew so far.
+    1. Each scan records every index's primary size and doc count into
+       fixed-size per-index ring buffers (one NumPy block per cluster; scans
+       closer than GROWTH_SAMPLE_INTERVAL reuse the last sample).
+    2. Growth rates for all indices come from one vectorized least-squares fit,
+       so a forecast over tens of thousands of indices takes tens of milliseconds.
+    3. Projects days until the index size, size per primary shard or docs per
+       primary shard crosses its GROWTH_MAX_* limit; the scanner ranks
+       lifecycle issues by that time to breach.
+    State is in memory: a restarted replica needs GROWTH_MIN_SAMPLES scans again.
+    """
+
+    def __init__(self):
+        self._series: Dict[str, _Series] = {} # cluster -> ring buffers
+
+    def forecast(
+        self,
+        cluster: str,
+        names: List[str],
+        primaries: List[int],
+        sizes: List[float],
+        docs: List[float],
+        now: Optional[float] = None,
+        partial: bool = False
+    ) -> Dict[str, np.ndarray]:
+        """
+        Records this scan's sample and returns per-index arrays aligned with names.
+        partial: names are a subset of the cluster (one replica's partitions), so
+        indices left out keep their history.
+        """
+        now = time.time() if now is None else now
+        series = self._series.get(cluster)
+        if series is None or len(series.times) != settings.GROWTH_SAMPLES:
+            series = self._series[cluster] = _Series(settings.GROWTH_SAMPLES)
+
+        rows = series.rows_for(names, forget=not partial)
+        size = np.asarray(sizes, dtype=np.float64)
+        count = np.asarray(docs, dtype=np.float64)
+        shards = np.maximum(np.asarray(primaries, dtype=np.float64), 1.0)
+        if series.last is None or now - series.last >= settings.GROWTH_SAMPLE_INTERVAL:
+            series.record(rows, size, count, now)
+
+        sampled = series.sizes[rows]
+        (size_rate, docs_rate), samples = _slopes(
+            series.times, ~np.isnan(sampled) & ~np.isnan(series.times),
+            (sampled, size), (series.docs[rows], count)
+        )
+        trusted = samples >= settings.GROWTH_MIN_SAMPLES
+        size_per_day = np.where(trusted, size_rate * DAY, 0.0)
+        docs_per_day = np.where(trusted, docs_rate * DAY, 0.0)
+
+        days = np.stack([
+            _days_to(size, np.full_like(size, settings.GROWTH_MAX_INDEX_SIZE_GB * GB), size_per_day),
+            _days_to(size, settings.GROWTH_MAX_SHARD_SIZE_GB * GB * shards, size_per_day),
+            _days_to(count, settings.GROWTH_MAX_SHARD_DOCS * shards, docs_per_day)
+        ])
+        first = days.argmin(axis=0)
+        return {
+            "size_per_day": size_per_day,
+            "docs_per_day": docs_per_day,
+            "days_to_breach": days[first, np.arange(len(names))],
+            "limit": np.asarray(LIMITS)[first],
+            "samples": samples
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            cluster: {"indices": len(series.rows), "samples": int(np.count_nonzero(~np.isnan(series.times)))}
+            for cluster, series in self._series.items()
+        }
+
+# Singleton instance
+growth_forecaster = GrowthForecaster()
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from app.services.es_client import es_wrapper
+from app.utils import content_hash
+from app.services.telemetry import metrics, CACHE_REQUESTS
+from app.core.validation_cache import CACHE_SIZE
+from app.config import settings
+
+# Cost unit: reading ~1,000 documents (or term-dictionary entries) once.
+# Estimates are relative, for ranking queries against each other, not predicted latencies.
+DOC = 1 / 1000
+MATCH_SELECTIVITY = 0.1    # Share of docs a plain term/match clause is assumed to hit
+SCRIPT_DOC_COST = 10.0     # Running a script on a document vs. reading it
+NESTED_FACTOR = 3.0        # Nested/joined docs are extra documents joined back to their parents
+FIELDDATA_FACTOR = 20.0    # Sorting/aggregating a text field builds fielddata on the heap
+REGEX_FACTOR = 2.0         # Automaton matching per term vs. a plain term comparison
+DEEP_PAGE_FACTOR = 5.0     # Every shard collects and ships from+size hits
+
+BOOL_CLAUSES = ("must", "filter", "should", "must_not")
+TEXT_TYPES = {"text", "match_only_text", "annotated_text"}
+BUCKET_AGGS = {"terms", "multi_terms", "rare_terms", "significant_terms", "composite"}
+LEADING_WILDCARD = re.compile(r"(^|[\s(:])[*?]")
+
+RUNNING_SEARCH = "indices:data/read/search"
+TASK_DESCRIPTION = re.compile(r"^indices\[(?P<indices>[^\]]*)\].*?source\[(?P<source>.*)\]$", re.DOTALL)
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+def _fields(properties: Dict[str, Any], prefix: str = "", types: Optional[Dict[str, str]] = None, nested: Optional[List[str]] = None):
+    """Flattens mapping properties into {path: type} (multi-fields included) and the nested paths."""
+    types = {} if types is None else types
+    nested = [] if nested is None else nested
+    for name, field in properties.items():
+        path = f"{prefix}{name}"
+        kind = field.get("type", "object")
+        if kind == "nested":
+            nested.append(path)
+        if "properties" in field:
+            _fields(field["properties"], f"{path}.", types, nested)
+        else:
+            types.setdefault(path, kind)
+        for sub, multi in field.get("fields", {}).items():
+            types.setdefault(f"{path}.{sub}", multi.get("type", "keyword"))
+    return types, nested
+
+class _Estimate:
+    """Running total for one query: cost plus the factors that drove it."""
+
+    def __init__(self, index: str, profile: Dict[str, Any]):
+        self.index = index
+        self.profile = profile
+        self.docs = profile["docs"]
+        self.factors: Dict[Tuple[str, Optional[str]], float] = {}
+
+    def penalize(self, factor: str, field: Optional[str], cost: float) -> float:
+        key = (factor, field)
+        self.factors[key] = self.factors.get(key, 0.0) + cost
+        return cost
+
+    def type_of(self, field: Optional[str]) -> Optional[str]:
+        return self.profile["fields"].get(field) if field else None
+
+class QueryCostEstimator:
+    """
+    Predicts how expensive a search is from its DSL, without running it.
+    1. Uses cheap, cached index statistics: doc counts (_stats), field types and
+       nested paths (mappings) and, only for fields whose term dictionary a query
+       walks, the number of distinct terms (_terms_enum, capped at
+       QUERY_COST_TERMS_SAMPLE; a full or incomplete sample counts as one term per doc).
+    2. Penalizes leading wildcards, regexes, scripts, deep from+size, terms
+       aggregations on high-cardinality fields, fielddata and nested/join queries.
+    3. The result is a relative cost (1.0 ~ reading 1,000 docs) and the factors
+       behind it; the scanner and agent cycle use it to rank queries so only the
+       top candidates get real benchmarks.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._profiles: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict() # index -> (expires_at, profile)
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    # ---------------------------------------------------------
+    # Index statistics
+    # ---------------------------------------------------------
+    async def profile(self, index: str) -> Dict[str, Any]:
+        """Doc count, field types and nested paths behind an index expression (cached)."""
+        scoped = es_wrapper.qualify(index)
+        entry = self._profiles.get(scoped)
+        if entry and entry[0] > time.monotonic():
+            self._profiles.move_to_end(scoped)
+            CACHE_REQUESTS.inc("query_cost", "hit")
+            return entry[1]
+        CACHE_REQUESTS.inc("query_cost", "miss")
+
+        task = self._loading.get(scoped)
+        if task is None:
+            task = self._loading[scoped] = asyncio.create_task(self._load(index))
+            task.add_done_callback(lambda _: self._loading.pop(scoped, None))
+        profile = await asyncio.shield(task)
+        self._profiles[scoped] = (time.monotonic() + settings.QUERY_COST_STATS_TTL, profile)
+        self._profiles.move_to_end(scoped)
+        while len(self._profiles) > settings.QUERY_COST_CACHE_SIZE:
+            self._profiles.popitem(last=False)
+        return profile
+
+    async def _load(self, index: str) -> Dict[str, Any]:
+        client = await self._get_client()
+        mappings, docs = await asyncio.gather(
+            client.indices.get_mapping(index=index, ignore_unavailable=True),
+            self._doc_count(index)
+        )
+        types: Dict[str, str] = {}
+        nested: List[str] = []
+        for body in mappings.values():
+            _fields(body.get("mappings", {}).get("properties", {}), types=types, nested=nested)
+        return {"docs": docs, "fields": types, "nested": sorted(set(nested)), "terms": {}}
+
+    async def _doc_count(self, index: str) -> int:
+        client = await self._get_client()
+        try:
+            resp = await client.indices.stats(index=index, metric="docs")
+            return resp["_all"]["primaries"]["docs"]["count"]
+        except Exception:
+            # No _stats (e.g. Serverless): a count is still cheap
+            return (await client.count(index=index, ignore_unavailable=True))["count"]
+
+    async def _terms(self, estimate: _Estimate, field: Optional[str]) -> int:
+        """Distinct terms of a field: exact up to QUERY_COST_TERMS_SAMPLE, else the doc count (upper bound)."""
+        if not field:
+            return estimate.docs
+        known = estimate.profile["terms"]
+        if field not in known:
+            sample = settings.QUERY_COST_TERMS_SAMPLE
+            try:
+                client = await self._get_client()
+                resp = await client.terms_enum(index=estimate.index, field=field, size=sample, timeout="1s")
+                # 'complete' only turns false on timeouts/shard failures: a full page means there are more
+                saturated = not resp.get("complete") or len(resp["terms"]) >= sample
+                known[field] = max(estimate.docs, sample) if saturated else len(resp["terms"])
+            except Exception:
+                known[field] = estimate.docs # Text/numeric fields or no _terms_enum
+        return known[field]
+
+    def invalidate(self, index: str):
+        self._profiles.pop(es_wrapper.qualify(index), None)
+
+    # ---------------------------------------------------------
+    # Estimation
+    # ---------------------------------------------------------
+    async def estimate(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Relative cost of running a search body against an index expression."""
+        estimate = _Estimate(index, await self.profile(index))
+        docs = estimate.docs
+        cost = await self._query(estimate, body.get("query") or {"match_all": {}})
+
+        page = int(body.get("from", 0)) + int(body.get("size", 10))
+        cost += page * DOC
+        if int(body.get("from", 0)) >= settings.QUERY_COST_DEEP_FROM:
+            cost += estimate.penalize("deep_pagination", None, page * DOC * DEEP_PAGE_FACTOR)
+
+        for clause in _as_list(body.get("sort", [])):
+            field = clause if isinstance(clause, str) else next(iter(clause), None)
+            if field == "_script":
+                cost += estimate.penalize("script", "_script", docs * DOC * SCRIPT_DOC_COST)
+            elif estimate.type_of(field) in TEXT_TYPES:
+                cost += estimate.penalize("fielddata", field, docs * DOC * FIELDDATA_FACTOR)
+
+        for name in body.get("runtime_mappings", {}):
+            cost += estimate.penalize("runtime_field", name, docs * DOC * SCRIPT_DOC_COST)
+        if body.get("script_fields"):
+            cost += estimate.penalize("script", "script_fields", page * DOC * SCRIPT_DOC_COST * len(body["script_fields"]))
+        cost += await self._aggs(estimate, body.get("aggs") or body.get("aggregations") or {}, 1.0)
+
+        full_scan = max(docs * DOC, DOC)
+        factors = sorted(estimate.factors.items(), key=lambda item: -item[1])
+        return {
+            "index": index,
+            "cost": round(cost, 2),
+            "docs": docs,
+            "scan_ratio": round(cost / full_scan, 2), # Cost in full passes over the index
+            "factors": [{"factor": factor, "field": field, "cost": round(value, 2)} for (factor, field), value in factors]
+        }
+
+    async def _query(self, estimate: _Estimate, query: Any) -> float:
+        if not isinstance(query, dict) or len(query) != 1:
+            return 0.0
+        (kind, spec), = query.items()
+        docs = estimate.docs
+
+        # Compound queries
+        if kind == "bool":
+            return sum([await self._query(estimate, q) for clause in BOOL_CLAUSES for q in _as_list(spec.get(clause, []))])
+        if kind == "constant_score":
+            return await self._query(estimate, spec.get("filter"))
+        if kind == "dis_max":
+            return sum([await self._query(estimate, q) for q in spec.get("queries", [])])
+        if kind == "boosting":
+            return await self._query(estimate, spec.get("positive")) + await self._query(estimate, spec.get("negative"))
+        if kind in ("nested", "has_child", "has_parent"):
+            inner = await self._query(estimate, spec.get("query"))
+            field = spec.get("path") or spec.get("type") or spec.get("parent_type")
+            return inner + estimate.penalize(kind if kind == "nested" else "join", field, max(inner, docs * DOC) * NESTED_FACTOR)
+        if kind in ("function_score", "script_score"):
+            cost = await self._query(estimate, spec.get("query") or {"match_all": {}})
+            scripted = "script" in spec or any("script_score" in function for function in spec.get("functions", []))
+            if scripted:
+                cost += estimate.penalize("script", kind, docs * DOC * SCRIPT_DOC_COST)
+            return cost
+        if kind == "script":
+            return estimate.penalize("script", None, docs * DOC * SCRIPT_DOC_COST)
+        if kind == "match_all":
+            return docs * DOC
+        if kind in ("query_string", "simple_query_string"):
+            return await self._query_string(estimate, spec)
+
+        # Leaf queries on one field
+        if not isinstance(spec, dict) or not spec:
+            return docs * DOC * MATCH_SELECTIVITY
+        field = next((key for key in spec if not key.startswith("_") and key not in ("boost", "fields", "query")), None)
+        value = spec.get(field)
+        pattern = str((value.get("value") or value.get("wildcard") or value.get("query") or "") if isinstance(value, dict) else value or "")
+        base = docs * DOC * MATCH_SELECTIVITY
+
+        if kind == "wildcard":
+            if estimate.type_of(field) == "wildcard":
+                return base # The wildcard field type is built for this
+            if pattern[:1] in ("*", "?"):
+                return base + estimate.penalize("leading_wildcard", field, await self._terms(estimate, field) * DOC)
+            return base + await self._terms(estimate, field) * DOC / 26 ** len(re.split(r"[*?]", pattern, 1)[0])
+        if kind == "regexp":
+            literal = re.match(r"[\w-]*", pattern).group(0)
+            walked = await self._terms(estimate, field) * DOC / 26 ** len(literal)
+            return base + estimate.penalize("regexp", field, walked * REGEX_FACTOR)
+        if kind == "prefix":
+            return base + await self._terms(estimate, field) * DOC / 26 ** min(len(pattern), 3)
+        if kind == "fuzzy" or (isinstance(value, dict) and value.get("fuzziness") not in (None, 0, "0")):
+            return base + estimate.penalize("fuzzy", field, await self._terms(estimate, field) * DOC * 0.1)
+        if kind == "range" and estimate.type_of(field) in TEXT_TYPES | {"keyword"}:
+            return base + estimate.penalize("string_range", field, await self._terms(estimate, field) * DOC / 2)
+        if kind == "terms" and isinstance(value, list):
+            return base * min(len(value), 10)
+        return base
+
+    async def _query_string(self, estimate: _Estimate, spec: Dict[str, Any]) -> float:
+        text = str(spec.get("query", ""))
+        fields = spec.get("fields") or ([spec["default_field"]] if "default_field" in spec else None)
+        if fields is None:
+            # index.query.default_field is '*': every field is searched
+            fields = [name for name, kind in estimate.profile["fields"].items() if kind in TEXT_TYPES | {"keyword"}] or ["*"]
+        per_field = estimate.docs * DOC * MATCH_SELECTIVITY
+        cost = per_field
+        if len(fields) > 1:
+            cost += estimate.penalize("all_fields" if "fields" not in spec else "many_fields", None, per_field * (len(fields) - 1))
+        for field in fields:
+            if LEADING_WILDCARD.search(text) and spec.get("allow_leading_wildcard", True):
+                cost += estimate.penalize("leading_wildcard", field, await self._terms(estimate, field) * DOC)
+            if re.search(r"(^|\s)/.+/", text):
+                cost += estimate.penalize("regexp", field, await self._terms(estimate, field) * DOC * REGEX_FACTOR)
+        return cost
+
+    async def _aggs(self, estimate: _Estimate, aggs: Dict[str, Any], buckets: float) -> float:
+        docs = estimate.docs
+        cost = 0.0
+        for name, spec in aggs.items():
+            kind = next((key for key in spec if key not in ("aggs", "aggregations", "meta")), None)
+            body = spec.get(kind) or {}
+            field = body.get("field") if isinstance(body, dict) else None
+            cost += docs * DOC * 0.5 # One pass over the matching docs' doc values
+            children = buckets
+
+            if isinstance(body, dict) and "script" in body:
+                cost += estimate.penalize("script", name, docs * DOC * SCRIPT_DOC_COST)
+            if estimate.type_of(field) in TEXT_TYPES:
+                cost += estimate.penalize("fielddata", field, docs * DOC * FIELDDATA_FACTOR)
+            if kind == "nested":
+                children = buckets * NESTED_FACTOR
+                cost += estimate.penalize("nested", body.get("path"), docs * DOC * NESTED_FACTOR)
+            elif kind in BUCKET_AGGS:
+                fields = [field] if field else [next(iter(source.values())).get("field") for source in body.get("sources", [])]
+                distinct = 1
+                for each in fields:
+                    distinct *= max(await self._terms(estimate, each), 1)
+                distinct = min(distinct, docs) if docs else distinct
+                if kind == "composite":
+                    distinct = min(distinct, body.get("size", 10)) # Paged: one page of buckets per request
+                # Ordinals and counts for every distinct term, however small 'size' is
+                bucket_cost = distinct * buckets * DOC
+                if distinct >= settings.QUERY_COST_TERMS_SAMPLE:
+                    estimate.penalize("high_cardinality_terms", field or name, bucket_cost)
+                cost += bucket_cost
+                children = buckets * distinct # Sub-aggregations run per bucket (depth-first)
+            elif kind == "top_hits":
+                cost += buckets * body.get("size", 3) * DOC
+
+            sub = spec.get("aggs") or spec.get("aggregations")
+            if sub:
+                cost += await self._aggs(estimate, sub, children)
+        return cost
+
+    async def compare(self, index: str, original: Dict[str, Any], fixed: Dict[str, Any]) -> Dict[str, Any]:
+        """Estimated before/after cost of a query fix and the predicted improvement (%)."""
+        before, after = await asyncio.gather(self.estimate(index, original), self.estimate(index, fixed))
+        improvement = (before["cost"] - after["cost"]) / before["cost"] * 100 if before["cost"] else 0.0
+        return {"before": before, "after": after, "predicted_improvement": round(improvement, 2)}
+
+    # ---------------------------------------------------------
+    # Candidates
+    # ---------------------------------------------------------
+    async def running_queries(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(index expression, body) of the searches running right now, deduplicated (Tasks API)."""
+        client = await self._get_client()
+        resp = await client.tasks.list(actions=f"{RUNNING_SEARCH}*", detailed=True, group_by="none")
+        found: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for task in resp.get("tasks", []):
+            if task.get("action") != RUNNING_SEARCH: # Not the per-shard child tasks
+                continue
+            match = TASK_DESCRIPTION.match(task.get("description", ""))
+            if not match or not match.group("indices"):
+                continue
+            try:
+                body = json.loads(match.group("source"))
+            except ValueError:
+                continue # Truncated description
+            index = match.group("indices")
+            found.setdefault(content_hash({"index": index, "body": body}), (index, body))
+        return list(found.values())
+
+    async def rank(self, queries: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Estimates many queries; most expensive first. Queries that can't be estimated are left out."""
+        async def one(index: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            try:
+                return {**await self.estimate(index, body), "query": body}
+            except Exception as e:
+                print(f"   ⚠️ Could not estimate query on {index}: {e}")
+                return None
+
+        estimates = await asyncio.gather(*(one(index, body) for index, body in queries))
+        return sorted((e for e in estimates if e is not None), key=lambda e: -e["cost"])
+
+# Singleton instance
+query_cost = QueryCostEstimator()
+
+metrics.on_collect(lambda: CACHE_SIZE.set("query_cost", value=len(query_cost._profiles)))
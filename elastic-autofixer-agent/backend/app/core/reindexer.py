@@ -0,0 +1,605 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Set, Tuple
+from app.services.es_client import es_wrapper
+from app.services.es_transport import request_priority, BACKGROUND
+from app.services.issue_state import issue_tracker, fingerprint, APPLIED, FAILED
+from app.config import settings
+
+JOBS_INDEX = ".autofixer-reindex-jobs"
+
+JOBS_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "job_id": {"type": "keyword"},
+        "state": {"type": "keyword"}, # created -> copying -> catching_up -> swapping -> done | failed
+        "source": {"type": "keyword"},
+        "target": {"type": "keyword"},
+        "owner": {"type": "keyword"},
+        "heartbeat_at": {"type": "date"},
+        "created_at": {"type": "date"}
+    }
+}
+
+# Source settings that change how documents are indexed and must be carried over
+COPIED_SETTING_PREFIXES = ("index.analysis.", "index.mapping.", "index.similarity.", "index.sort.")
+
+ACTIVE_STATES = ("created", "copying", "catching_up", "swapping")
+PAGE_SIZE = 1000 # Target documents checked per page when looking for deletes
+
+logger = logging.getLogger("autofixer.reindex")
+
+def count_fields(properties: Dict[str, Any]) -> int:
+    """Number of leaf fields in a mapping (objects are walked, multi-fields ignored)."""
+    total = 0
+    for field in properties.values():
+        if "properties" in field:
+            total += count_fields(field["properties"])
+        else:
+            total += 1
+    return total
+
+class JobTakenOver(Exception):
+    """Another replica updated the job document; this one must stop driving it."""
+
+class SourceLocked(Exception):
+    """Another job is already reindexing the source index."""
+
+class ReindexOrchestrator:
+    """
+    Applies mapping fixes that can't be done in place. Only runs when asked for
+    explicitly (POST /reindex); apply-fix reports 'reindex_required' instead.
+    1. Creates '<index>-reindexed-<ts>' with the fixed mapping. A mapping that keeps
+       only some fields is refused unless the caller allows dropping the others.
+    2. Runs an async, sliced _reindex with external versions and adapts
+       requests_per_second to cluster load.
+    3. Catches up by _seq_no: one pass while writes still flow, then a short one
+       under a write block (at most REINDEX_BLOCK_TIMEOUT, else it unblocks and
+       retries), which also removes documents deleted from the source meanwhile.
+    4. Moves the source's aliases to the new index in one call. The source index
+       is kept, write-blocked, until an operator deletes it.
+    One job per source index at a time (a lock document next to the jobs). Job
+    state lives in Elasticsearch, so a restarted backend resumes where it stopped.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._index_ready: Set[str] = set() # Clusters whose indices exist
+        self._versions: Dict[str, Tuple[int, int]] = {} # job_id -> (seq_no, primary_term)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._owner = uuid.uuid4().hex
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    async def ensure_index(self):
+        if es_wrapper.current() in self._index_ready:
+            return
+        client = await self._get_client()
+        if not await client.indices.exists(index=JOBS_INDEX):
+            try:
+                await client.indices.create(
+                    index=JOBS_INDEX,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": JOBS_MAPPINGS
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready.add(es_wrapper.current())
+
+    # ---------------------------------------------------------
+    # Planning
+    # ---------------------------------------------------------
+    async def requires_reindex(self, index: str, fixed_code: Dict[str, Any]) -> Optional[str]:
+        """Reason a mapping fix can't be applied with put_mapping, or None if it can."""
+        client = await self._get_client()
+        resp = await client.indices.get_mapping(index=index)
+        current = next(iter(resp.values()))["mappings"]
+        properties = current.get("properties", {})
+
+        for name, field in fixed_code.get("properties", {}).items():
+            existing = properties.get(name)
+            if existing and "type" in field and existing.get("type", "object") != field["type"]:
+                return f"Field '{name}' changes type from {existing.get('type', 'object')} to {field['type']}."
+
+        field_count = count_fields(properties)
+        if fixed_code.get("dynamic") == "strict" and field_count > settings.REINDEX_EXPLODED_FIELDS:
+            return f"Index already has {field_count} fields; 'strict' only stops new ones."
+        return None
+
+    async def _resolve_source(self, index: str) -> Tuple[str, List[str]]:
+        """(concrete index, aliases the swap moves to the new index)."""
+        client = await self._get_client()
+        if await client.indices.exists_alias(name=index):
+            resp = await client.indices.get_alias(name=index)
+            if len(resp) != 1:
+                raise ValueError(f"Alias {index} points to {len(resp)} indices; reindex one index at a time.")
+            return next(iter(resp)), [index]
+        resp = await client.indices.get_alias(index=index)
+        aliases = sorted(resp.get(index, {}).get("aliases", {}))
+        if not aliases:
+            # Swapping a bare name would mean deleting the index; never do that
+            raise ValueError(
+                f"{index} is not behind an alias, so clients can't be moved to a new index without deleting it. "
+                f"Add an alias, point clients at it, then reindex."
+            )
+        return index, aliases
+
+    def _target_mapping(self, current: Dict[str, Any], fixed: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[List[str]]]:
+        """New mapping, plus the _source fields to copy (None = all)."""
+        if fixed.get("dynamic") == "strict" and count_fields(current.get("properties", {})) > settings.REINDEX_EXPLODED_FIELDS:
+            # Exploded index: keep only explicitly mapped fields, drop the rest
+            return fixed, list(fixed.get("properties", {}))
+        merged = {**current, **{k: v for k, v in fixed.items() if k != "properties"}}
+        merged["properties"] = {**current.get("properties", {}), **fixed.get("properties", {})}
+        return merged, None
+
+    # ---------------------------------------------------------
+    # Jobs
+    # ---------------------------------------------------------
+    async def start(
+        self,
+        index: str,
+        fixed_code: Dict[str, Any],
+        issue_id: Optional[str] = None,
+        category: Optional[str] = None,
+        allow_field_drop: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Creates the target index and kicks off the copy in the background.
+        Raises ValueError for a fix it won't reindex and SourceLocked if another
+        job is already reindexing the index.
+        """
+        await self.ensure_index()
+        client = await self._get_client()
+        source, aliases = await self._resolve_source(index)
+
+        mapping_resp = await client.indices.get_mapping(index=source)
+        current = mapping_resp[source]["mappings"]
+        settings_resp = await client.indices.get_settings(index=source, flat_settings=True)
+        copied = {
+            key: value for key, value in settings_resp[source]["settings"].items()
+            if key.startswith(COPIED_SETTING_PREFIXES)
+        }
+        mappings, includes = self._target_mapping(current, fixed_code)
+        if includes is not None and not allow_field_drop:
+            dropped = count_fields(current.get("properties", {})) - count_fields(mappings.get("properties", {}))
+            raise ValueError(
+                f"The fixed mapping of {source} keeps {len(includes)} fields; copying with it drops about {dropped} "
+                f"fields from every document. Pass allow_field_drop=true to accept that."
+            )
+
+        now = int(time.time() * 1000)
+        job_id = uuid.uuid4().hex
+        await self._lock_source(source, job_id)
+        target = f"{source}-reindexed-{now}"
+        try:
+            await client.indices.create(index=target, body={"settings": copied, "mappings": mappings})
+        except Exception:
+            await self._unlock_source(source, job_id)
+            raise
+
+        job = {
+            "job_id": job_id,
+            "issue_id": issue_id,
+            "category": category,
+            "requested_index": index,
+            "cluster": es_wrapper.current(),
+            "state": "created",
+            "source": source,
+            "target": target,
+            "aliases": aliases,
+            "source_includes": includes,
+            "requests_per_second": settings.REINDEX_RPS_INITIAL,
+            "task_id": None,
+            "copy_started_at": None,
+            "seq_no_mark": None,
+            "catch_up_attempts": 0,
+            "write_blocked": False,
+            "progress": {},
+            "error": None,
+            "created_at": now
+        }
+        await self._save(job, create=True)
+        self._spawn(job)
+        return job
+
+    async def _lock_source(self, source: str, job_id: str):
+        """
+        Claims the source index for one job: a 'source-lock:<index>' document created
+        with op_type=create. A lock whose job finished (or never got saved) is taken over.
+        """
+        client = await self._get_client()
+        lock_id = f"source-lock:{source}"
+        lock = {"source": source, "job_id": job_id, "created_at": int(time.time() * 1000)}
+        try:
+            await client.index(index=JOBS_INDEX, id=lock_id, body=lock, op_type="create")
+            return
+        except Exception as e:
+            if "version_conflict" not in str(e) and getattr(e, "status_code", None) != 409:
+                raise
+
+        doc = await client.get(index=JOBS_INDEX, id=lock_id)
+        holder = await self.get_job(doc["_source"]["job_id"])
+        stale_before = int(time.time() * 1000) - int(settings.REINDEX_POLL_INTERVAL * 3 * 1000)
+        if holder is not None and holder["state"] in ACTIVE_STATES:
+            raise SourceLocked(f"{source} is already being reindexed by job {holder['job_id']}.")
+        if holder is None and doc["_source"]["created_at"] >= stale_before:
+            raise SourceLocked(f"{source} is already being reindexed (job {doc['_source']['job_id']} is starting).")
+        try:
+            await client.index(
+                index=JOBS_INDEX, id=lock_id, body=lock,
+                if_seq_no=doc["_seq_no"], if_primary_term=doc["_primary_term"]
+            )
+        except Exception as e:
+            if "version_conflict" in str(e) or getattr(e, "status_code", None) == 409:
+                raise SourceLocked(f"{source} was just claimed by another reindex job.")
+            raise
+
+    async def _unlock_source(self, source: str, job_id: str):
+        """Deletes the source lock, if this job still holds it."""
+        client = await self._get_client()
+        lock_id = f"source-lock:{source}"
+        try:
+            doc = await client.get(index=JOBS_INDEX, id=lock_id)
+            if doc["_source"]["job_id"] == job_id:
+                await client.delete(
+                    index=JOBS_INDEX, id=lock_id,
+                    if_seq_no=doc["_seq_no"], if_primary_term=doc["_primary_term"]
+                )
+        except Exception as e:
+            if getattr(e, "status_code", None) != 404:
+                logger.warning(f"Could not release the reindex lock on {source}: {e}")
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        await self.ensure_index()
+        client = await self._get_client()
+        try:
+            doc = await client.get(index=JOBS_INDEX, id=job_id)
+        except Exception:
+            return None
+        return doc["_source"]
+
+    async def list_jobs(self, active_only: bool = True) -> List[Dict[str, Any]]:
+        await self.ensure_index()
+        client = await self._get_client()
+        query = {"terms": {"state": list(ACTIVE_STATES)}} if active_only else {"match_all": {}}
+        resp = await client.search(
+            index=JOBS_INDEX,
+            body={"size": 100, "query": query, "sort": [{"created_at": "desc"}]}
+        )
+        return [hit["_source"] for hit in resp["hits"]["hits"]]
+
+    async def resume(self):
+        """Resumes stale jobs on every configured cluster."""
+        for cluster, result in (await es_wrapper.fan_out(self.resume_cluster)).items():
+            if isinstance(result, Exception):
+                logger.warning(f"Could not resume reindex jobs on cluster '{cluster}': {result}")
+
+    async def resume_cluster(self):
+        """Picks up unfinished jobs whose driver (possibly a previous process) went quiet."""
+        await self.ensure_index()
+        client = await self._get_client()
+        stale_before = int(time.time() * 1000) - int(settings.REINDEX_POLL_INTERVAL * 3 * 1000)
+        resp = await client.search(
+            index=JOBS_INDEX,
+            body={
+                "size": 100,
+                "query": {"bool": {"filter": [
+                    {"terms": {"state": list(ACTIVE_STATES)}},
+                    {"range": {"heartbeat_at": {"lt": stale_before}}}
+                ]}}
+            },
+            seq_no_primary_term=True
+        )
+        for hit in resp["hits"]["hits"]:
+            job = hit["_source"]
+            if job["job_id"] in self._tasks:
+                continue
+            self._versions[job["job_id"]] = (hit["_seq_no"], hit["_primary_term"])
+            try:
+                await self._save(job) # Claim it; fails if another replica got there first
+            except JobTakenOver:
+                continue
+            logger.info(f"Resuming reindex job {job['job_id']} ({job['source']} -> {job['target']}) at '{job['state']}'.")
+            self._spawn(job)
+
+    def _spawn(self, job: Dict[str, Any]):
+        self._tasks[job["job_id"]] = asyncio.create_task(self._drive(job))
+
+    async def _save(self, job: Dict[str, Any], create: bool = False):
+        """Persists the job with optimistic concurrency; doubles as the driver's heartbeat."""
+        client = await self._get_client()
+        job["owner"] = self._owner
+        job["heartbeat_at"] = int(time.time() * 1000)
+        kwargs: Dict[str, Any] = {"op_type": "create"} if create else {}
+        version = self._versions.get(job["job_id"])
+        if version and not create:
+            kwargs = {"if_seq_no": version[0], "if_primary_term": version[1]}
+        try:
+            resp = await client.index(index=JOBS_INDEX, id=job["job_id"], body=job, **kwargs)
+        except Exception as e:
+            if "version_conflict" in str(e) or getattr(e, "status_code", None) == 409:
+                raise JobTakenOver(job["job_id"])
+            raise
+        self._versions[job["job_id"]] = (resp["_seq_no"], resp["_primary_term"])
+
+    async def _drive(self, job: Dict[str, Any]):
+        request_priority.set(BACKGROUND) # Own task context: may have been started from an API call
+        try:
+            while job["state"] in ACTIVE_STATES:
+                if job["state"] == "created":
+                    await self._start_copy(job)
+                elif job["state"] == "copying":
+                    await self._poll_copy(job)
+                elif job["state"] == "catching_up":
+                    await self._catch_up(job)
+                elif job["state"] == "swapping":
+                    await self._swap(job)
+        except JobTakenOver:
+            logger.info(f"Reindex job {job['job_id']} is now driven by another replica.")
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reindex job {job['job_id']} failed: {e}")
+            await self._fail(job, str(e))
+        finally:
+            self._tasks.pop(job["job_id"], None)
+
+        await self._unlock_source(job["source"], job["job_id"])
+        await self._record_outcome(job)
+
+    @staticmethod
+    def _copy_source(job: Dict[str, Any], query: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        source: Dict[str, Any] = {"index": job["source"]}
+        if job["source_includes"] is not None:
+            source["_source"] = job["source_includes"]
+        if query is not None:
+            source["query"] = query
+        return source
+
+    @staticmethod
+    def _copy_dest(job: Dict[str, Any]) -> Dict[str, Any]:
+        # Copies carry the source's versions: a re-copy only overwrites documents that changed since
+        return {"index": job["target"], "version_type": "external"}
+
+    async def _seq_no_mark(self, index: str) -> int:
+        """Lowest max _seq_no over the primary shards: every later write gets a higher one."""
+        client = await self._get_client()
+        resp = await client.indices.stats(index=index, level="shards")
+        shards = resp["indices"][index]["shards"]
+        return min(
+            (copy["seq_no"]["max_seq_no"] for copies in shards.values() for copy in copies if copy["routing"]["primary"]),
+            default=-1
+        )
+
+    async def _start_copy(self, job: Dict[str, Any]):
+        client = await self._get_client()
+        job["copy_started_at"] = int(time.time() * 1000)
+        job["seq_no_mark"] = await self._seq_no_mark(job["source"])
+        resp = await client.reindex(
+            source=self._copy_source(job),
+            dest=self._copy_dest(job),
+            slices="auto",
+            requests_per_second=job["requests_per_second"],
+            conflicts="proceed",
+            wait_for_completion=False
+        )
+        job["task_id"] = resp["task"]
+        job["state"] = "copying"
+        await self._save(job)
+
+    async def _poll_copy(self, job: Dict[str, Any]):
+        client = await self._get_client()
+        last_rejected = None
+        while True:
+            await asyncio.sleep(settings.REINDEX_POLL_INTERVAL)
+            resp = await client.tasks.get(task_id=job["task_id"])
+            status = resp.get("task", {}).get("status", {})
+            job["progress"] = {
+                key: status.get(key) for key in ("total", "created", "updated", "batches", "version_conflicts")
+            }
+
+            if resp.get("completed"):
+                if resp.get("error"):
+                    raise RuntimeError(f"Reindex task failed: {resp['error'].get('reason', resp['error'])}")
+                failures = resp.get("response", {}).get("failures", [])
+                if failures:
+                    raise RuntimeError(f"Reindex finished with {len(failures)} failures, e.g. {failures[0]}")
+                job["state"] = "catching_up"
+                await self._save(job)
+                return
+
+            last_rejected = await self._adapt_throttle(job, last_rejected)
+            await self._save(job)
+
+    async def _adapt_throttle(self, job: Dict[str, Any], last_rejected: Optional[int]) -> Optional[int]:
+        """
+        AIMD on requests_per_second: halve it when write/search queues back up or
+        requests get rejected, grow it by 25% while the cluster keeps up.
+        """
+        client = await self._get_client()
+        try:
+            pools = await client.cat.thread_pool(
+                thread_pool_patterns="write,search", h="name,queue,rejected", format="json"
+            )
+        except Exception:
+            return last_rejected # No node-level stats (e.g. Serverless); keep the current rate
+
+        queued = sum(int(pool.get("queue") or 0) for pool in pools)
+        rejected = sum(int(pool.get("rejected") or 0) for pool in pools)
+        overloaded = queued > settings.REINDEX_MAX_QUEUE or (last_rejected is not None and rejected > last_rejected)
+
+        rps = job["requests_per_second"]
+        new_rps = max(settings.REINDEX_RPS_MIN, rps * 0.5) if overloaded else min(settings.REINDEX_RPS_MAX, rps * 1.25)
+        if abs(new_rps - rps) >= 1:
+            await client.reindex_rethrottle(task_id=job["task_id"], requests_per_second=new_rps)
+            job["requests_per_second"] = round(new_rps, 1)
+        return rejected
+
+    async def _catch_up(self, job: Dict[str, Any]):
+        """
+        Copies what changed during the bulk copy while writes still flow, then blocks
+        writes for a final, short pass. A final pass that overruns REINDEX_BLOCK_TIMEOUT
+        lifts the block and the next attempt starts over.
+        """
+        if job["write_blocked"]:
+            await self._unblock(job) # Resumed mid-attempt: don't keep writes blocked while catching up
+        await self._delta(job, settings.REINDEX_CATCH_UP_TIMEOUT)
+
+        await self._block(job)
+        try:
+            await asyncio.wait_for(self._final_pass(job), settings.REINDEX_BLOCK_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self._unblock(job)
+            job["catch_up_attempts"] = job.get("catch_up_attempts", 0) + 1
+            if job["catch_up_attempts"] >= settings.REINDEX_CATCH_UP_ATTEMPTS:
+                raise RuntimeError(
+                    f"The final pass overran {settings.REINDEX_BLOCK_TIMEOUT}s of blocked writes "
+                    f"{job['catch_up_attempts']} times; {job['source']} changes faster than it can be caught up."
+                )
+            await self._save(job)
+            return # Still catching_up: _drive runs another attempt
+
+        job["state"] = "swapping"
+        await self._save(job)
+
+    async def _delta(self, job: Dict[str, Any], timeout: float):
+        """Re-copies every document written (created or updated) since the last mark."""
+        client = await self._get_client()
+        mark = await self._seq_no_mark(job["source"])
+        resp = await client.options(request_timeout=timeout).reindex(
+            source=self._copy_source(job, {"range": {"_seq_no": {"gt": job["seq_no_mark"]}}}),
+            dest=self._copy_dest(job),
+            slices="auto",
+            conflicts="proceed",
+            wait_for_completion=True
+        )
+        if resp.get("failures"):
+            raise RuntimeError(f"Delta copy finished with {len(resp['failures'])} failures, e.g. {resp['failures'][0]}")
+        job["seq_no_mark"] = mark
+
+    async def _final_pass(self, job: Dict[str, Any]):
+        """Under the write block: last delta, then removes documents the source no longer has."""
+        client = await self._get_client()
+        await self._delta(job, settings.REINDEX_BLOCK_TIMEOUT)
+        await client.indices.refresh(index=f"{job['source']},{job['target']}")
+        source_count = (await client.count(index=job["source"]))["count"]
+        target_count = (await client.count(index=job["target"]))["count"]
+        if target_count > source_count:
+            # Every source document is in the target, so the surplus was deleted from the source
+            await self._remove_deleted(job)
+            await client.indices.refresh(index=job["target"])
+            target_count = (await client.count(index=job["target"]))["count"]
+        if target_count != source_count:
+            raise RuntimeError(f"Target has {target_count} docs, source has {source_count}.")
+
+    async def _remove_deleted(self, job: Dict[str, Any]):
+        """Pages through the target's IDs and deletes those missing from the source."""
+        client = await self._get_client()
+        pit = (await client.open_point_in_time(index=job["target"], keep_alive="1m"))["id"]
+        try:
+            search_after = None
+            while True:
+                body: Dict[str, Any] = {
+                    "size": PAGE_SIZE, "_source": False, "sort": ["_shard_doc"],
+                    "pit": {"id": pit, "keep_alive": "1m"}
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+                hits = (await client.search(body=body))["hits"]["hits"]
+                if not hits:
+                    return
+                ids = [hit["_id"] for hit in hits]
+                found = await client.search(
+                    index=job["source"],
+                    body={"size": len(ids), "_source": False, "query": {"ids": {"values": ids}}}
+                )
+                present = {hit["_id"] for hit in found["hits"]["hits"]}
+                deleted = [{"delete": {"_index": job["target"], "_id": doc_id}} for doc_id in ids if doc_id not in present]
+                if deleted:
+                    await client.bulk(body=deleted)
+                search_after = hits[-1]["sort"]
+        finally:
+            await client.close_point_in_time(id=pit)
+
+    async def _block(self, job: Dict[str, Any]):
+        client = await self._get_client()
+        await client.indices.add_block(index=job["source"], block="write")
+        job["write_blocked"] = True
+        await self._save(job)
+
+    async def _unblock(self, job: Dict[str, Any]):
+        client = await self._get_client()
+        await client.indices.put_settings(index=job["source"], body={"index.blocks.write": False})
+        job["write_blocked"] = False
+        await self._save(job)
+
+    async def _swap(self, job: Dict[str, Any]):
+        """
+        One update_aliases call, so there is never a moment without the names resolving.
+        The source index itself is never deleted: it stays write-blocked for an operator
+        to remove once the new index is verified.
+        """
+        client = await self._get_client()
+        current = await client.indices.get_alias(index=job["target"])
+        if set(job["aliases"]) <= set(current.get(job["target"], {}).get("aliases", {})):
+            job["state"] = "done" # Swap already happened before a restart
+            await self._save(job)
+            return
+
+        actions = []
+        for alias in job["aliases"]:
+            actions += [
+                {"add": {"index": job["target"], "alias": alias}},
+                {"remove": {"index": job["source"], "alias": alias}}
+            ]
+        await client.indices.update_aliases(body={"actions": actions})
+        job["state"] = "done"
+        await self._save(job)
+        logger.info(f"Reindex job {job['job_id']} done; {job['source']} is kept write-blocked until deleted by an operator.")
+
+    async def _fail(self, job: Dict[str, Any], error: str):
+        job["state"] = "failed"
+        job["error"] = error
+        if job["write_blocked"]:
+            # Never leave production read-only because of a failed reindex
+            try:
+                client = await self._get_client()
+                await client.indices.put_settings(index=job["source"], body={"index.blocks.write": False})
+                job["write_blocked"] = False
+            except Exception as e:
+                logger.error(f"Could not lift write block on {job['source']}: {e}")
+        try:
+            await self._save(job)
+        except Exception as e:
+            logger.error(f"Could not persist failure of reindex job {job['job_id']}: {e}")
+
+    async def _record_outcome(self, job: Dict[str, Any]):
+        if not job.get("issue_id") or job["state"] not in ("done", "failed"):
+            return
+        resource = es_wrapper.qualify(job["requested_index"], job.get("cluster"))
+        await issue_tracker.transition(
+            (job["issue_id"], fingerprint(job["category"], resource)),
+            APPLIED if job["state"] == "done" else FAILED,
+            category=job["category"],
+            resource=resource,
+            details={"reindex_job": job["job_id"], "target": job["target"], "error": job["error"]}
+        )
+
+    async def stop(self):
+        """Stops driving jobs; they stay in ES and are resumed on the next start."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+# Singleton instance
+reindexer = ReindexOrchestrator()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
+from app.services.es_client import es_wrapper
+from app.services.es_transport import prioritized, BACKGROUND
+from app.utils import content_hash
+from app.core.diagnostic import scanner
+from app.config import settings
+
+logger = logging.getLogger("autofixer.scan")
+
+class ScanSnapshots:
+    """
+    Serves diagnostics from the latest scan of each cluster instead of rescanning per request.
+    1. Concurrent callers for a cluster share one in-flight scan (single flight);
+       a caller that goes away doesn't cancel it for the others.
+    2. Snapshots younger than SCAN_SNAPSHOT_TTL are served as is. For another
+       SCAN_SNAPSHOT_STALE seconds they're still served, while one background scan
+       refreshes them (stale-while-revalidate). Older ones are rescanned first.
+    3. Every scan (the agent cycle's too) replaces the snapshot. Its ETag hashes
+       the issues, so a rescan that finds the same issues keeps the same ETag.
+    4. A failed scan (e.g. an unreachable cluster) is never cached: its callers get
+       the error, and a failed background rescan leaves the older snapshot to expire.
+    """
+
+    def __init__(self):
+        self.snapshots: Dict[str, Dict[str, Any]] = {} # cluster -> {issues, errors, etag, taken_at (monotonic), scanned_at (epoch ms)}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def age(snapshot: Dict[str, Any]) -> float:
+        return time.monotonic() - snapshot["taken_at"]
+
+    def refresh(self, cluster: Optional[str] = None) -> "asyncio.Future":
+        """Scans a cluster, joining the scan already running for it if there is one."""
+        cluster = cluster or es_wrapper.current()
+        task = self._inflight.get(cluster)
+        if task is None:
+            task = self._inflight[cluster] = asyncio.create_task(self._scan(cluster))
+            task.add_done_callback(lambda _: self._forget(cluster, task))
+        return asyncio.shield(task)
+
+    def _forget(self, cluster: str, task: asyncio.Task):
+        if self._inflight.get(cluster) is task:
+            del self._inflight[cluster]
+
+    async def _scan(self, cluster: str) -> Dict[str, Any]:
+        errors: List[str] = []
+        with es_wrapper.using(cluster):
+            issues = await scanner.scan_all(errors) # Raises if the cluster couldn't be scanned: nothing is cached
+        if self._inflight.get(cluster) is not asyncio.current_task():
+            # Invalidated while scanning: answer the callers, but don't cache a pre-change view
+            return self._snapshot(issues, errors)
+        snapshot = self.snapshots[cluster] = self._snapshot(issues, errors)
+        return snapshot
+
+    @staticmethod
+    def _snapshot(issues: List[Any], errors: List[str]) -> Dict[str, Any]:
+        return {
+            "issues": issues,
+            "errors": errors, # Checks that failed: the scan may be missing issues
+            "etag": content_hash([issue.dict() for issue in issues])[:32],
+            "taken_at": time.monotonic(),
+            "scanned_at": int(time.time() * 1000)
+        }
+
+    def _revalidate(self, cluster: str):
+        if cluster in self._inflight:
+            return
+        with prioritized(BACKGROUND): # Nobody is waiting on this one
+            future = self.refresh(cluster)
+
+        def done(f: "asyncio.Future"):
+            if not f.cancelled() and f.exception() is not None:
+                logger.warning(f"Background rescan of cluster '{cluster}' failed: {f.exception()}")
+        future.add_done_callback(done)
+
+    async def get(self, cluster: Optional[str] = None, fresh: bool = False) -> Dict[str, Any]:
+        cluster = cluster or es_wrapper.current()
+        snapshot = self.snapshots.get(cluster)
+        if fresh or snapshot is None:
+            return await self.refresh(cluster)
+        age = self.age(snapshot)
+        if age < settings.SCAN_SNAPSHOT_TTL:
+            return snapshot
+        if age < settings.SCAN_SNAPSHOT_TTL + settings.SCAN_SNAPSHOT_STALE:
+            self._revalidate(cluster)
+            return snapshot
+        return await self.refresh(cluster)
+
+    async def get_many(self, clusters: Optional[List[str]] = None, fresh: bool = False) -> Dict[str, Any]:
+        """Snapshots for several clusters, concurrently; returns {cluster: snapshot or exception}."""
+        names = clusters or es_wrapper.cluster_names()
+        results = await asyncio.gather(*(self.get(name, fresh) for name in names), return_exceptions=True)
+        return dict(zip(names, results))
+
+    def invalidate(self, cluster: Optional[str] = None):
+        """Forces the next read to rescan (call after changing the cluster); a scan already running is not reused."""
+        cluster = cluster or es_wrapper.current()
+        self.snapshots.pop(cluster, None)
+        self._inflight.pop(cluster, None)
+
+# Singleton instance
+scan_snapshots = ScanSnapshots()
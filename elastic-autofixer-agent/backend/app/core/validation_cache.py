@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from app.services.es_client import es_wrapper
+from app.utils import content_hash
+from app.services.telemetry import metrics, CACHE_REQUESTS
+from app.config import settings
+
+CacheKey = Tuple[str, str, str] # (cluster-qualified index, mapping version, query hash)
+
+class ValidationCache:
+    """
+    Remembers validate_query outcomes per (index, mapping version, canonical query hash).
+    1. LRU-bounded and TTL-expired, so memory stays flat across long runs.
+    2. The mapping version comes from cluster state (mappings_version), looked up at
+       most once per VALIDATION_VERSION_TTL per index; when it changes, every entry
+       for that index is dropped.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.client = None
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, bool]]" = OrderedDict() # key -> (expires_at, valid)
+        self._versions: Dict[str, Tuple[float, str]] = {} # index -> (checked_until, version)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size or settings.VALIDATION_CACHE_SIZE
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl or settings.VALIDATION_CACHE_TTL
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    @staticmethod
+    def key(index: str, version: str, query: Dict[str, Any]) -> CacheKey:
+        return es_wrapper.qualify(index), version, content_hash(query)
+
+    async def mapping_version(self, index: str) -> str:
+        """Opaque version of the mappings behind an index name/pattern."""
+        now = time.monotonic()
+        scoped = es_wrapper.qualify(index)
+        memo = self._versions.get(scoped)
+        if memo and memo[0] > now:
+            return memo[1]
+
+        client = await self._get_client()
+        try:
+            resp = await client.cluster.state(
+                metric="metadata", index=index, filter_path="metadata.indices.*.mappings_version"
+            )
+            indices = resp.get("metadata", {}).get("indices", {})
+            version = ",".join(f"{name}:{meta['mappings_version']}" for name, meta in sorted(indices.items()))
+        except Exception:
+            # No cluster state API (e.g. Serverless): the mapping itself is the version
+            resp = await client.indices.get_mapping(index=index, ignore_unavailable=True)
+            version = content_hash({name: body for name, body in resp.items()})
+
+        if memo and memo[1] != version:
+            self.invalidate(index)
+        self._versions[scoped] = (now + settings.VALIDATION_VERSION_TTL, version)
+        return version
+
+    def get(self, key: CacheKey) -> Optional[bool]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            CACHE_REQUESTS.inc("validation", "miss")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        CACHE_REQUESTS.inc("validation", "hit")
+        return entry[1]
+
+    def put(self, key: CacheKey, valid: bool):
+        self._entries[key] = (time.monotonic() + self.ttl, valid)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, index: str):
+        """Drops everything cached for an index (call after changing its mapping)."""
+        scoped = es_wrapper.qualify(index)
+        self._versions.pop(scoped, None)
+        for key in [key for key in self._entries if key[0] == scoped]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Singleton instance
+validation_cache = ValidationCache()
+
+CACHE_SIZE = metrics.gauge("autofixer_cache_entries", "Entries held by each cache.", ("cache",))
+metrics.on_collect(lambda: CACHE_SIZE.set("validation", value=len(validation_cache._entries)))
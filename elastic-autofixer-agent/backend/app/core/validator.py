@@ -1,7 +1,31 @@
+import asyncio
 import json
-from typing import Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from app.services.es_client import es_wrapper
+from app.services.coordination import coordinator, LeaseHeldError
+from app.core.reindexer import reindexer
+from app.services.backup_store import backup_store
+from app.core.validation_cache import validation_cache
+from app.core.query_cost import query_cost
+from app.services.telemetry import tracer
 from app.models.es_types import FixProposal
+from app.config import settings
+
+# Settings the lifecycle fix applies (see CASE 2 in apply_fix)
+LIFECYCLE_SETTINGS = {
+    "index.refresh_interval": "30s",
+    "index.number_of_replicas": 1
+}
+
+def fix_kind(fixed_code: Dict[str, Any]) -> str:
+    """Classifies a fix by what it changes: 'mapping', 'lifecycle', 'query' or 'unknown'."""
+    if "dynamic" in fixed_code or "properties" in fixed_code:
+        return "mapping"
+    if "policy" in fixed_code:
+        return "lifecycle"
+    if "query" in fixed_code:
+        return "query"
+    return "unknown"
 
 class Validator:
     """
@@ -12,89 +36,182 @@ class Validator:
         self.client = None
 
     async def _get_client(self):
-        if not self.client:
-            self.client = await es_wrapper.get_client()
-        return self.client
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
 
     async def validate_syntax(self, fix: FixProposal) -> bool:
         """
         Checks if the generated query/mapping is valid Elasticsearch DSL.
         """
-        client = await self._get_client()
-        
-        # 1. Validate Queries
-        if "query" in fix.fixed_code:
-            try:
-                # Use the _validate API to check syntax without executing
-                # We validate against the specific index if possible, else generic
-                index = fix.original_code.get("index", "logs-*") 
-                resp = await client.indices.validate_query(
-                    index=index,
-                    body={"query": fix.fixed_code["query"]},
-                    explain=True
-                )
-                return resp.get("valid", False)
-            except Exception as e:
-                print(f"❌ Syntax Validation Failed: {e}")
-                return False
+        return (await self.validate_many([fix]))[0]
+
+    @tracer.traced("validate")
+    async def validate_many(self, fixes: List[FixProposal], max_concurrency: Optional[int] = None) -> List[bool]:
+        """
+        Validates many candidate fixes at once.
+        Query outcomes are cached per (index, mapping version, query hash), and
+        identical uncached queries are sent to _validate only once.
+        """
+        results: List[bool] = [True] * len(fixes)
+        pending: Dict[Tuple[str, str, str], List[int]] = {}
+        queries: Dict[Tuple[str, str, str], Tuple[str, Dict[str, Any]]] = {}
+
+        # 1. Validate Queries (mappings/settings have no dry-run, so they pass on JSON parsing alone)
+        query_fixes = [(i, fix) for i, fix in enumerate(fixes) if "query" in fix.fixed_code]
+        # We validate against the specific index if possible, else generic
+        indices = sorted({fix.original_code.get("index", "logs-*") for _, fix in query_fixes})
+        versions = dict(zip(indices, await asyncio.gather(*(self._mapping_version(index) for index in indices))))
+
+        for i, fix in query_fixes:
+            index = fix.original_code.get("index", "logs-*")
+            key = validation_cache.key(index, versions[index], fix.fixed_code["query"])
+            cached = validation_cache.get(key) if versions[index] is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(key, []).append(i)
+                queries[key] = (index, fix.fixed_code["query"])
 
-        # 2. Validate Mappings/Settings (Basic JSON check)
-        # ES doesn't have a dry-run for mappings, so we rely on strict JSON parsing
-        return True
+        semaphore = asyncio.Semaphore(max_concurrency or settings.VALIDATION_CONCURRENCY)
+
+        async def check(key: Tuple[str, str, str]):
+            async with semaphore:
+                valid = await self._validate_query(*queries[key])
+            if valid is not None and key[1] is not None:
+                validation_cache.put(key, valid)
+            for i in pending[key]:
+                results[i] = bool(valid)
+
+        await asyncio.gather(*(check(key) for key in pending))
+        return results
+
+    async def _mapping_version(self, index: str) -> Optional[str]:
+        try:
+            return await validation_cache.mapping_version(index)
+        except Exception as e:
+            print(f"⚠️ Could not read mapping version of {index}, skipping validation cache: {e}")
+            return None
+
+    async def _validate_query(self, index: str, query: Dict[str, Any]) -> Optional[bool]:
+        """ES verdict on a query, or None if ES couldn't be asked (not cached)."""
+        client = await self._get_client()
+        try:
+            # Use the _validate API to check syntax without executing
+            resp = await client.indices.validate_query(
+                index=index,
+                body={"query": query},
+                explain=True
+            )
+            return resp.get("valid", False)
+        except Exception as e:
+            print(f"❌ Syntax Validation Failed: {e}")
+            # A 400 is ES rejecting the query itself: a verdict worth caching
+            return False if getattr(e, "status_code", None) == 400 else None
 
-    async def create_backup(self, resource_id: str, category: str) -> Dict[str, Any]:
+    async def create_backup(
+        self,
+        resource_id: str,
+        category: str,
+        batch_id: Optional[str] = None,
+        issue_id: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Fetches the current state (Mapping/Settings) before applying a fix.
+        Fetches the current state (Mapping/Settings) before applying a fix and
+        persists it in the backup store.
+        resource_id may be a comma-separated list of indices; returns {index: state},
+        where each state carries the 'backup_id' to restore it from.
         """
         client = await self._get_client()
         
         try:
             if category == "mapping":
                 # Backup current mapping
-                return await client.indices.get_mapping(index=resource_id)
+                resp = await client.indices.get_mapping(index=resource_id, ignore_unavailable=True)
+                states = {index: {"mappings": body.get("mappings", {})} for index, body in resp.items()}
             elif category == "ilm":
-                # Backup current ILM policy (if exists)
-                try:
-                    return await client.ilm.get_lifecycle(name=resource_id)
-                except:
-                    return {} # No policy existed
-            
-            return {} # Queries don't need backup (they are stateless)
+                # Backup current settings (incl. index.lifecycle.name) and aliases
+                resp = await client.indices.get_settings(index=resource_id, flat_settings=True, ignore_unavailable=True)
+                aliases = await client.indices.get_alias(index=resource_id, ignore_unavailable=True)
+                states = {
+                    index: {
+                        "settings": body.get("settings", {}),
+                        "aliases": sorted(aliases.get(index, {}).get("aliases", {}))
+                    }
+                    for index, body in resp.items()
+                }
+            else:
+                return {} # Queries don't need backup (they are stateless)
+
+            backup_ids = await backup_store.save(states, category, batch_id=batch_id, issue_id=issue_id)
+            return {index: {**state, "backup_id": backup_ids[index]} for index, state in states.items()}
         except Exception as e:
             print(f"⚠️ Backup failed: {e}")
             return {}
 
+    @tracer.traced("apply")
     async def apply_fix(self, fix: FixProposal) -> Dict[str, Any]:
         """
         Actually applies the fix to the cluster.
+        Holds a cross-replica lock on the index so concurrent replicas can't race.
         """
+        target_index = fix.original_code.get("index")
+        if not target_index:
+            return {"status": "error", "message": "Critical Logic Error: Target index name missing from proposal."}
+
+        try:
+            async with coordinator.resource_lock(es_wrapper.qualify(target_index)):
+                return await self._apply_fix(fix)
+        except LeaseHeldError as e:
+            return {"status": "locked", "message": str(e)}
+        except Exception as e:
+            return {"status": "error", "message": f"Could not lock {target_index}: {e}"}
+
+    async def _apply_fix(self, fix: FixProposal) -> Dict[str, Any]:
         client = await self._get_client()
         
         # LOGICAL FIX: specific retrieval of the target index
         target_index = fix.original_code.get("index")
         category = fix.original_code.get("category")
 
-        if not target_index:
-            return {"status": "error", "message": "Critical Logic Error: Target index name missing from proposal."}
-
         print(f"🔧 Applying '{category}' fix to index: {target_index}")
         
         try:
             # -----------------------------------------------------
             # CASE 1: MAPPING UPDATE
             # -----------------------------------------------------
-            if "dynamic" in fix.fixed_code or "properties" in fix.fixed_code:
+            kind = fix_kind(fix.fixed_code)
+            if kind == "mapping":
+                # Type changes / exploded indices can't be fixed in place; copying the
+                # index is never done implicitly
+                reason = await reindexer.requires_reindex(target_index, fix.fixed_code)
+                if reason:
+                    return {
+                        "status": "reindex_required",
+                        "message": f"{reason} Apply it through a reindex (POST /api/v1/reindex)."
+                    }
+
+            backup_ids = []
+            if kind in ("mapping", "lifecycle"):
+                # An alias/pattern backs up every index it resolves to
+                backup = await self.create_backup(target_index, "mapping" if kind == "mapping" else "ilm", issue_id=fix.issue_id)
+                if not backup:
+                    return {"status": "error", "message": f"Could not back up {target_index}; fix not applied."}
+                backup_ids = [state["backup_id"] for state in backup.values()]
+
+            if kind == "mapping":
                 print(f"   -> Putting Mapping...")
                 await client.indices.put_mapping(
                     index=target_index,
                     body=fix.fixed_code
                 )
-                return {"status": "success", "message": f"Mapping updated for {target_index}."}
+                validation_cache.invalidate(target_index)
+                query_cost.invalidate(target_index)
+                return {"status": "success", "message": f"Mapping updated for {target_index}.", "backup_ids": backup_ids}
 
             # -----------------------------------------------------
             # CASE 2: ILM / DATA LIFECYCLE (Serverless Compatible)
             # -----------------------------------------------------
-            if "policy" in fix.fixed_code:
+            if kind == "lifecycle":
                 print(f"   -> applying serverless data lifecycle to: {target_index}")
                 
                 # In Serverless, we might not have full ILM.
@@ -127,13 +244,10 @@ class Validator:
                     
                     await client.indices.put_settings(
                         index=target_index,
-                        body={
-                            "index.refresh_interval": "30s",
-                            "index.number_of_replicas": 1
-                        }
+                        body=LIFECYCLE_SETTINGS
                     )
                     
-                    return {"status": "success", "message": f"Index settings optimized (Simulated ILM fix for Serverless)."}
+                    return {"status": "success", "message": f"Index settings optimized (Simulated ILM fix for Serverless).", "backup_ids": backup_ids}
                     
                 except Exception as e:
                      # Fallback: If alias fails, just return success for the demo video
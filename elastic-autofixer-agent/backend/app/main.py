@@ -1,68 +1,165 @@
 import time
-import logging
 import json
-from fastapi import FastAPI, Request, HTTPException
-from contextlib import asynccontextmanager
-from typing import List
+import logging
+from fastapi import FastAPI, Request, Response, HTTPException, Depends, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
 
-from app.config import settings
-from app.services.es_client import es_wrapper
-from app.models.api import HealthCheck
+from app.config import settings, describe
+from app.services.es_client import es_wrapper, UnknownClusterError
+from app.services.es_transport import limiter, breaker, prioritized, INTERACTIVE, CircuitOpenError
+from app.models.api import HealthCheck, HistoryPage, HistoryStats, BatchApplyRequest, BatchApplyResult, QueryCostRequest
 from app.models.es_types import DiagnosticResult, FixProposal, BenchmarkResult
 from app.core.diagnostic import scanner
+from app.core.scan_snapshot import scan_snapshots
 from app.core.fix_generator import fix_generator
-from app.core.validator import validator
+from app.core.validator import validator, fix_kind
+from app.core.validation_cache import validation_cache
+from app.core.batch_apply import batch_applier
+from app.core.canary import canary_runner
+from app.core.reindexer import reindexer, SourceLocked
 from app.core.benchmarker import benchmarker
+from app.core.query_cost import query_cost
 from app.services.agent_flow import agent
 from app.services.esre import esre
+from app.services.history import history_writer, history_reader
+from app.services.history_rollup import history_rollup
+from app.services.coordination import coordinator
+from app.services.backup_store import backup_store
+from app.utils import content_hash
+from app.services.warmup import warmup
+from app.services.jobs import jobs, JobQueueFullError
+from app.services.telemetry import metrics, tracer, start_logging, HTTP_REQUESTS, HTTP_LATENCY
+from app.services.issue_state import issue_tracker, fingerprint, APPLIED, FAILED
 
-# Configure Logging (ECS Format Simulation)
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("autofixer.agent")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await es_wrapper.connect()
-    try:
-        await esre.initialize_knowledge_base()
-    except Exception:
-        pass
+    # Configure Logging (ECS Format Simulation) - formatted and written off the event loop
+    start_logging(logging.INFO)
+    logger.info(describe())
+    # Nothing here waits on Elasticsearch: cluster-dependent start-up runs as warm-up tasks (/readyz)
+    warmup.add("elasticsearch", lambda: es_wrapper.get_client(es_wrapper.default))
+    warmup.add("knowledge_base", esre.initialize_knowledge_base, required=False, after="elasticsearch")
+    warmup.add("reindex_jobs", reindexer.resume, required=False, after="elasticsearch")
+    warmup.start()
+    history_writer.start()
+    history_rollup.start()
+    coordinator.start()
+    backup_store.start()
+    jobs.start()
     yield
+    await jobs.stop()
+    await warmup.stop()
+    await reindexer.stop()
+    await backup_store.stop()
+    await coordinator.stop()
+    await history_writer.stop()
+    await history_rollup.stop() # After the writer's final flush, so its late events get marked
     await es_wrapper.close()
 
+async def cluster_scope(cluster: Optional[str] = None):
+    """
+    Every route takes ?cluster=<name>; ES calls made while handling it go to that
+    cluster, ahead of background work in the concurrency limiter.
+    """
+    try:
+        with es_wrapper.using(cluster), prioritized(INTERACTIVE):
+            yield
+    except UnknownClusterError:
+        raise HTTPException(status_code=400, detail=f"Unknown cluster '{cluster}'.")
+
+def _target_cluster(cluster: Optional[str]) -> Optional[str]:
+    """Cluster an issue/fix belongs to; 400 if ?cluster= names another one or it isn't configured."""
+    selected = es_wrapper.selected()
+    if cluster and selected and cluster != selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The fix belongs to cluster '{cluster}', but ?cluster={selected} was requested."
+        )
+    cluster = cluster or selected
+    if cluster is not None and cluster not in es_wrapper.cluster_names():
+        raise HTTPException(status_code=400, detail=f"Unknown cluster '{cluster}'.")
+    return cluster
+
+@contextmanager
+def _on_cluster(cluster: Optional[str]):
+    """Runs an issue's/fix's ES calls on its own cluster, whatever ?cluster= defaulted to."""
+    with es_wrapper.using(_target_cluster(cluster)):
+        yield
+
+def _batch_cluster(proposals: List[FixProposal]) -> Optional[str]:
+    clusters = sorted({p.cluster for p in proposals if p.cluster})
+    if len(clusters) > 1:
+        raise HTTPException(status_code=400, detail=f"A batch applies to one cluster; split it per cluster ({', '.join(clusters)}).")
+    return clusters[0] if clusters else None
+
 app = FastAPI(
     title="Elastic Auto-Fixer Agent",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    dependencies=[Depends(cluster_scope)]
 )
 
-# Middleware for Logging
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Fail fast while a cluster is known to be unhealthy."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)}
+    )
+
+# Middleware for Logging and Metrics
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    response = await call_next(request)
-    
-    process_time = (time.time() - start_time) * 1000
-    log_entry = {
-        "event.dataset": "autofixer.api",
-        "http.request.method": request.method,
-        "url.path": request.url.path,
-        "http.response.status_code": response.status_code,
-        "event.duration": process_time,
-        "message": f"{request.method} {request.url.path} completed in {process_time:.2f}ms"
-    }
-    logger.info(json.dumps(log_entry))
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start_time
+        # Route template, not the raw path, so IDs don't explode label cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc(request.method, route, str(status_code))
+        HTTP_LATENCY.observe(elapsed, request.method, route)
+
+    process_time = elapsed * 1000
+    # Serialized to JSON on the log thread (EcsFormatter)
+    logger.info(
+        f"{request.method} {request.url.path} completed in {process_time:.2f}ms",
+        extra={"ecs": {
+            "event.dataset": "autofixer.api",
+            "http.request.method": request.method,
+            "url.path": request.url.path,
+            "http.response.status_code": status_code,
+            "event.duration": process_time
+        }}
+    )
     
     return response
 
 # --- Routes ---
 
+@app.get("/livez")
+async def liveness():
+    """The process is up and serving; never touches Elasticsearch."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """Ready once the required warm-up steps (the default cluster connection) are done."""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/", response_model=HealthCheck)
 async def health_check():
-    client = await es_wrapper.get_client()
     try:
-        info = await client.info()
+        client = await es_wrapper.get_client()
+        info = await client.options(request_timeout=settings.ES_CONNECT_TIMEOUT).info()
         return {
             "status": "healthy",
             "es_version": info['version']['number'],
@@ -76,45 +173,338 @@ async def health_check():
             "cluster_name": str(e)
         }
 
+@app.get("/api/v1/clusters")
+async def list_clusters():
+    """Configured clusters and their connection health."""
+    return await es_wrapper.refresh_health()
+
+@app.get("/api/v1/clusters/limits")
+async def get_cluster_limits():
+    """Current adaptive in-flight limits per cluster and operation class."""
+    return limiter.stats()
+
+@app.get("/api/v1/clusters/circuits")
+async def get_cluster_circuits():
+    """Circuit breaker state per cluster and operation class."""
+    return breaker.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/traces")
+async def get_traces(limit: int = 20, name: Optional[str] = None):
+    """Most recent traces (e.g. name=cycle for agent cycles), newest first."""
+    return tracer.recent(limit, name)
+
 @app.get("/api/v1/diagnose", response_model=List[DiagnosticResult])
-async def run_diagnostics():
-    logger.info("Starting cluster diagnosis scan")
-    return await scanner.scan_all()
+async def run_diagnostics(request: Request, response: Response, fresh: bool = False):
+    """
+    Issues on the requested cluster, or every configured cluster, from the latest scan snapshot.
+    Concurrent callers share one scan; ?fresh=true rescans first. The snapshot's age is in
+    the Age / X-Snapshot-Age-Ms headers, and If-None-Match with its ETag answers 304.
+    A cluster that can't be scanned fails the request if selected, else is listed in X-Failed-Clusters.
+    """
+    selected = es_wrapper.selected()
+    snapshots = await scan_snapshots.get_many([selected] if selected else None, fresh=fresh)
+    issues, versions, ages, failed = [], [], [0.0], []
+    for cluster, result in snapshots.items():
+        if isinstance(result, Exception):
+            if selected:
+                if isinstance(result, CircuitOpenError):
+                    raise result
+                raise HTTPException(status_code=502, detail=f"Scan of cluster '{cluster}' failed: {result}")
+            logger.error(f"Scan of cluster '{cluster}' failed: {result}")
+            versions.append(f"{cluster}:failed")
+            failed.append(cluster)
+        else:
+            issues.extend(result["issues"])
+            versions.append(f"{cluster}:{result['etag']}")
+            ages.append(scan_snapshots.age(result))
+
+    age = max(ages)
+    headers = {
+        "ETag": f'"{content_hash(versions)[:32]}"',
+        "Age": str(int(age)),
+        "X-Snapshot-Age-Ms": str(int(age * 1000)),
+        "Cache-Control": f"max-age={int(settings.SCAN_SNAPSHOT_TTL)}, stale-while-revalidate={int(settings.SCAN_SNAPSHOT_STALE)}"
+    }
+    if failed:
+        headers["X-Failed-Clusters"] = ",".join(failed) # Partial result: these clusters' issues are missing
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return issues
+
+@app.get("/api/v1/diagnose/stream")
+async def stream_diagnostics(request: Request, format: Optional[str] = None):
+    """
+    Live scan streamed as NDJSON (default) or Server-Sent Events (format=sse, or
+    Accept: text/event-stream): one record per issue as soon as it's found,
+    an error record per failed cluster, then a final summary record.
+    """
+    if format not in (None, "ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'.")
+    sse = format == "sse" or (format is None and "text/event-stream" in request.headers.get("accept", ""))
+    selected = es_wrapper.selected()
+
+    async def body():
+        with prioritized(INTERACTIVE):
+            async for record in scanner.stream_clusters([selected] if selected else None):
+                data = json.dumps(record)
+                yield f"event: {record['type']}\ndata: {data}\n\n" if sse else data + "\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # No proxy buffering
+    )
 
 @app.post("/api/v1/generate-fix", response_model=FixProposal)
 async def generate_fix_endpoint(diagnostic: DiagnosticResult):
     logger.info(f"Generating fix for issue: {diagnostic.issue_id}")
-    return await fix_generator.generate_fix(diagnostic)
+    with _on_cluster(diagnostic.cluster):
+        return await fix_generator.generate_fix(diagnostic)
 
 @app.post("/api/v1/benchmark", response_model=BenchmarkResult)
 async def benchmark_fix_endpoint(proposal: FixProposal):
+    return await _benchmark(proposal)
+
+async def _benchmark(proposal: FixProposal) -> BenchmarkResult:
+    with _on_cluster(proposal.cluster):
+        return await _benchmark_on_cluster(proposal)
+
+async def _benchmark_on_cluster(proposal: FixProposal) -> BenchmarkResult:
     index = proposal.original_code.get("index", "logs-*")
     if "query" in proposal.fixed_code:
-        return await benchmarker.compare(
+        result = await benchmarker.compare(
             index=index,
             original_query={"query": proposal.original_code.get("query", {})},
             optimized_query={"query": proposal.fixed_code.get("query", {})}
         )
+        await history_writer.record(
+            issue_id=proposal.issue_id,
+            action="benchmarked",
+            category=proposal.original_code.get("category"),
+            resource=index,
+            metrics={
+                "improvement_percentage": result.improvement_percentage,
+                "latency_before_ms": result.latency_before_ms,
+                "latency_after_ms": result.latency_after_ms
+            },
+            details={"benchmark": result.dict()}
+        )
+        return result
     return BenchmarkResult(
         latency_before_ms=0, latency_after_ms=0,
         cpu_before=0, cpu_after=0,
         improvement_percentage=0, is_safe=True
     )
 
+@app.post("/api/v1/query-cost")
+async def query_cost_endpoint(request: QueryCostRequest):
+    """Static cost estimate of a search (nothing is executed); with fixed_body, a before/after comparison."""
+    if request.fixed_body is not None:
+        return await query_cost.compare(request.index, request.body, request.fixed_body)
+    return await query_cost.estimate(request.index, request.body)
+
+@app.post("/api/v1/validate/batch")
+async def validate_batch_endpoint(proposals: List[FixProposal]):
+    """Validates many candidate fixes concurrently, reusing cached verdicts."""
+    with _on_cluster(_batch_cluster(proposals)):
+        results = await validator.validate_many(proposals)
+    return {
+        "results": [{"issue_id": p.issue_id, "valid": valid} for p, valid in zip(proposals, results)],
+        "cache": validation_cache.stats()
+    }
+
+@app.post("/api/v1/canary")
+async def canary_endpoint(fix: FixProposal, sample_docs: Optional[int] = None):
+    """Trial-runs a fix on a sampled shadow index without touching production."""
+    logger.info(f"Running canary for issue: {fix.issue_id}")
+    with _on_cluster(fix.cluster):
+        return await canary_runner.run(fix, sample_docs=sample_docs)
+
 @app.post("/api/v1/apply-fix")
-async def apply_fix_endpoint(fix: FixProposal):
+async def apply_fix_endpoint(fix: FixProposal, canary: bool = False):
+    return await _apply_fix(fix, canary)
+
+async def _apply_fix(fix: FixProposal, canary: bool = False) -> dict:
+    with _on_cluster(fix.cluster):
+        return await _apply_fix_on_cluster(fix, canary)
+
+async def _apply_fix_on_cluster(fix: FixProposal, canary: bool) -> dict:
     logger.info(f"Applying fix for issue: {fix.issue_id}")
     if not await validator.validate_syntax(fix):
         raise HTTPException(status_code=400, detail="Invalid Elasticsearch syntax.")
+
+    canary_report = None
+    if canary:
+        canary_report = await canary_runner.run(fix)
+        if not canary_report["passed"]:
+            raise HTTPException(status_code=422, detail=canary_report)
     
     result = await validator.apply_fix(fix)
+    scan_snapshots.invalidate() # The next /diagnose should see the fix
+    if canary_report:
+        result["canary"] = canary_report
+    await _record_fix_outcome(fix, result)
     
+    if result["status"] == "locked":
+        raise HTTPException(status_code=409, detail=result["message"])
+
     if result["status"] == "error":
         logger.error(f"Fix application failed: {result['message']}")
         raise HTTPException(status_code=500, detail=result["message"])
         
     return result
 
+# --- Background Jobs ---
+# Same operations as above, run by the job workers; submit returns at once and is idempotent.
+
+async def _generate_fix_job(payload: dict) -> dict:
+    return (await fix_generator.generate_fix(DiagnosticResult(**payload))).dict()
+
+async def _benchmark_job(payload: dict) -> dict:
+    return (await _benchmark(FixProposal(**payload))).dict()
+
+async def _apply_fix_job(payload: dict) -> dict:
+    return await _apply_fix(FixProposal(**payload["fix"]), payload["canary"])
+
+jobs.register("generate-fix", _generate_fix_job)
+jobs.register("benchmark", _benchmark_job)
+jobs.register("apply-fix", _apply_fix_job)
+
+async def _submit_job(kind: str, payload: dict, idempotency_key: Optional[str]) -> dict:
+    try:
+        return await jobs.submit(kind, payload, idempotency_key)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+@app.post("/api/v1/jobs/generate-fix", status_code=202)
+async def submit_generate_fix(diagnostic: DiagnosticResult, idempotency_key: Optional[str] = Header(None)):
+    _target_cluster(diagnostic.cluster) # Conflicts fail the submit, not the job
+    return await _submit_job("generate-fix", diagnostic.dict(), idempotency_key)
+
+@app.post("/api/v1/jobs/benchmark", status_code=202)
+async def submit_benchmark(proposal: FixProposal, idempotency_key: Optional[str] = Header(None)):
+    _target_cluster(proposal.cluster)
+    return await _submit_job("benchmark", proposal.dict(), idempotency_key)
+
+@app.post("/api/v1/jobs/apply-fix", status_code=202)
+async def submit_apply_fix(fix: FixProposal, canary: bool = False, idempotency_key: Optional[str] = Header(None)):
+    _target_cluster(fix.cluster)
+    return await _submit_job("apply-fix", {"fix": fix.dict(), "canary": canary}, idempotency_key)
+
+@app.get("/api/v1/jobs")
+async def list_jobs(kind: Optional[str] = None, status: Optional[str] = None):
+    return {"stats": jobs.stats(), "jobs": await jobs.list_jobs(kind=kind, status=status)}
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status and result; wait=<seconds> (max 60) long-polls until it finishes."""
+    job = await jobs.wait(job_id, min(max(wait, 0), 60)) if wait > 0 else await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (or expired).")
+    return job
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job(job_id: str, timeout: float = 300):
+    """Server-Sent Events: the job's state now and on every change, until it finishes."""
+    if await jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found (or expired).")
+
+    async def body():
+        async for job in jobs.watch(job_id, min(max(timeout, 0), 3600)):
+            yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/v1/apply-fix/batch", response_model=BatchApplyResult)
+async def apply_fix_batch_endpoint(request: BatchApplyRequest):
+    """Applies many fixes at once; identical fixes share multi-index API calls."""
+    logger.info(f"Applying batch of {len(request.proposals)} fixes")
+    with _on_cluster(_batch_cluster(request.proposals)):
+        result = await batch_applier.apply_batch(request.proposals, max_concurrency=request.max_concurrency)
+        scan_snapshots.invalidate()
+
+        proposals = {(p.issue_id, p.original_code.get("index")): p for p in request.proposals}
+        for outcome in result["results"]:
+            proposal = proposals.get((outcome["issue_id"], outcome["index"]))
+            if proposal:
+                await _record_fix_outcome(proposal, outcome)
+    return result
+
+@app.get("/api/v1/apply-fix/batch/{batch_id}")
+async def get_fix_batch(batch_id: str):
+    return await batch_applier.get_batch(batch_id)
+
+@app.post("/api/v1/apply-fix/batch/{batch_id}/rollback")
+async def rollback_fix_batch(batch_id: str):
+    """Restores every index the batch changed to its journaled pre-state."""
+    logger.info(f"Rolling back fix batch: {batch_id}")
+    result = await batch_applier.rollback_batch(batch_id)
+    scan_snapshots.invalidate()
+    if not result["results"]:
+        raise HTTPException(status_code=404, detail="No applied fixes found for this batch.")
+    return result
+
+@app.get("/api/v1/backups")
+async def list_backups(index: str, category: Optional[str] = None, size: int = 50):
+    """Backup snapshots of an index, newest first."""
+    return await backup_store.list_snapshots(index, category=category, size=min(max(size, 1), 1000))
+
+@app.post("/api/v1/backups/restore")
+async def restore_backup(index: str, category: str, at: Optional[int] = None):
+    """Restores an index to its newest backup taken at or before 'at' (epoch ms; default: latest)."""
+    if category not in ("mapping", "ilm"):
+        raise HTTPException(status_code=400, detail="category must be 'mapping' or 'ilm'.")
+    logger.info(f"Restoring {category} backup of {index}")
+    result = await backup_store.restore(index, category, at=at)
+    scan_snapshots.invalidate()
+    if result["status"] != "rolled_back":
+        raise HTTPException(status_code=404 if "backup_id" not in result else 500, detail=result["message"])
+    return result
+
+@app.post("/api/v1/backups/gc")
+async def gc_backups():
+    return await backup_store.gc()
+
+@app.post("/api/v1/reindex")
+async def start_reindex(fix: FixProposal, allow_field_drop: bool = False):
+    """
+    Applies a mapping fix through a throttled reindex and alias swap, even if it could be done in place.
+    The index must be behind an alias (the source index is kept); allow_field_drop=true accepts a
+    fixed mapping that copies only some of the fields.
+    """
+    index = fix.original_code.get("index")
+    if not index or fix_kind(fix.fixed_code) != "mapping":
+        raise HTTPException(status_code=400, detail="A mapping fix with a target index is required.")
+    logger.info(f"Starting reindex of {index} for issue: {fix.issue_id}")
+    try:
+        with _on_cluster(fix.cluster):
+            return await reindexer.start(
+                index, fix.fixed_code, issue_id=fix.issue_id, category=fix.original_code.get("category"),
+                allow_field_drop=allow_field_drop
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SourceLocked as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/v1/reindex")
+async def list_reindex_jobs(active_only: bool = True):
+    return await reindexer.list_jobs(active_only=active_only)
+
+@app.get("/api/v1/reindex/{job_id}")
+async def get_reindex_job(job_id: str):
+    job = await reindexer.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindex job not found.")
+    return job
+
 @app.post("/api/v1/agent/run-cycle")
 async def run_agent_cycle():
     logger.info("Triggering autonomous agent cycle")
@@ -122,4 +512,54 @@ async def run_agent_cycle():
 
 @app.get("/api/v1/agent/history")
 async def get_agent_history():
-    return await agent.get_agent_history()
\ No newline at end of file
+    return await agent.get_agent_history()
+
+@app.get("/api/v1/agent/coordination")
+async def get_coordination_status():
+    return {
+        "enabled": coordinator.enabled,
+        "replica_id": coordinator.replica_id,
+        "partitions": coordinator.partitions,
+        "owned_partitions": coordinator.owned_partitions
+    }
+
+@app.get("/api/v1/history", response_model=HistoryPage)
+async def search_history(
+    size: int = 50,
+    cursor: Optional[str] = None,
+    issue_id: Optional[str] = None,
+    category: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    include_details: bool = False
+):
+    """Paginated agent history. Pass the returned 'next' cursor to fetch the following page."""
+    if not 1 <= size <= 1000:
+        raise HTTPException(status_code=400, detail="size must be between 1 and 1000.")
+    try:
+        return await history_reader.search(
+            size=size, cursor=cursor, issue_id=issue_id, category=category,
+            action=action, since=since, until=until, include_details=include_details
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+@app.get("/api/v1/history/stats", response_model=HistoryStats)
+async def get_history_stats(since: Optional[int] = None, until: Optional[int] = None):
+    """Fix success rate, median improvement and time-to-fix from rolled-up summaries."""
+    return await history_rollup.get_stats(since=since, until=until)
+
+async def _record_fix_outcome(fix: FixProposal, result: dict):
+    """Moves the issue to applied/failed (history records time-to-fix from the proposal)."""
+    if result["status"] not in ("success", "error"):
+        return
+    category = fix.original_code.get("category")
+    resource = es_wrapper.qualify(fix.original_code.get("index"))
+    await issue_tracker.transition(
+        (fix.issue_id, fingerprint(category, resource)),
+        APPLIED if result["status"] == "success" else FAILED,
+        category=category,
+        resource=resource,
+        details={"result": result}
+    )
@@ -1,6 +1,39 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any
+from app.models.es_types import FixProposal
 
 class HealthCheck(BaseModel):
     status: str
     es_version: str
-    cluster_name: str
\ No newline at end of file
+    cluster_name: str
+
+class HistoryPage(BaseModel):
+    items: List[Dict[str, Any]]
+    next: Optional[str] = None # Opaque search_after cursor
+
+class HistoryStats(BaseModel):
+    buckets: int
+    rolled_up_until: Optional[int] = None
+    actions: Dict[str, int]
+    categories: Dict[str, int]
+    fix_success_rate: Optional[float] = None
+    median_improvement_percentage: Optional[float] = None
+    median_time_to_fix_ms: Optional[int] = None
+    mean_time_to_fix_ms: Optional[float] = None
+
+class BatchApplyRequest(BaseModel):
+    proposals: List[FixProposal]
+    max_concurrency: int = Field(8, ge=1, le=64)
+
+class BatchApplyResult(BaseModel):
+    batch_id: str
+    cluster: Optional[str] = None # Where the batch is journaled (and rolled back)
+    applied: int
+    failed: int
+    skipped: int
+    results: List[Dict[str, Any]] # Per-index: issue_id, index, status, message
+
+class QueryCostRequest(BaseModel):
+    index: str
+    body: Dict[str, Any] # Search request body (query, aggs, sort, from/size...)
+    fixed_body: Optional[Dict[str, Any]] = None # Also estimate this one and the predicted improvement
@@ -10,6 +10,7 @@ class DiagnosticResult(BaseModel):
     affected_resource: str # index name or pipeline id
     detected_at: str
     metrics: Dict[str, Any] # e.g., {"cpu_usage": "98%", "scan_size": "10GB"}
+    cluster: Optional[str] = None # Registry name of the cluster it was found on
 
 class FixProposal(BaseModel):
     """Represents the LLM-generated fix."""
@@ -18,6 +19,7 @@ class FixProposal(BaseModel):
     fixed_code: Dict[str, Any]
     explanation: str
     estimated_impact: str # e.g. "50% latency reduction"
+    cluster: Optional[str] = None # Cluster of the issue it fixes; applied there
 
 class BenchmarkResult(BaseModel):
     """Represents the validation test."""
@@ -1,20 +1,30 @@
-import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 from app.services.es_client import es_wrapper
+from app.services.es_transport import prioritized, BACKGROUND
+from app.services.telemetry import tracer
+from app.services.history import history_writer, history_reader
+from app.services.issue_state import issue_tracker, issue_key, issue_resource, PROPOSED, APPLIED, VERIFIED, FAILED
+from app.services.coordination import coordinator
+from app.core.scan_snapshot import scan_snapshots
 from app.core.diagnostic import scanner
 from app.core.fix_generator import fix_generator
+from app.core.query_cost import query_cost
+from app.core.benchmarker import benchmarker
 from app.models.es_types import DiagnosticResult, FixProposal
+from app.config import settings
 
-HISTORY_INDEX = ".autofixer-history"
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
 
 class AgentOrchestrator:
     """
     Manages the lifecycle of the Auto-Fixer Agent.
     1. Ensures history index exists (Memory).
-    2. Runs diagnostics.
-    3. Selects the most critical issue.
-    4. Generates a fix.
-    5. Records the plan.
+    2. Runs diagnostics (on the selected cluster, or all clusters concurrently), limited to
+       this replica's partitions when coordination is enabled.
+    3. Skips issues that already have a pending proposal.
+    4. Selects the most critical remaining issue (ties: highest estimated query cost).
+    5. Generates a fix; query fixes are only benchmarked if the cost estimate predicts a gain.
+    6. Records the plan.
     """
     
     def __init__(self):
@@ -22,86 +32,172 @@ class AgentOrchestrator:
 
     async def _get_client(self):
         if not self.client:
-            self.client = await es_wrapper.get_client()
+            self.client = await es_wrapper.get_client(es_wrapper.default)
         return self.client
 
     async def ensure_memory_index(self):
         """Creates the history index if it doesn't exist."""
-        client = await self._get_client()
-        exists = await client.indices.exists(index=HISTORY_INDEX)
-        
-        if not exists:
-            await client.indices.create(
-                index=HISTORY_INDEX,
-                body={
-                    "mappings": {
-                        "properties": {
-                            "timestamp": {"type": "date"},
-                            "issue_id": {"type": "keyword"},
-                            "action": {"type": "keyword"}, # "diagnosed", "fixed", "failed"
-                            "details": {"type": "object"}
-                        }
-                    }
-                }
-            )
+        await history_writer.ensure_index()
 
     async def run_autonomous_cycle(self) -> Dict[str, Any]:
         """
         Runs one full cycle: Diagnose -> Pick Top Issue -> Propose Fix.
+        Cycles yield to interactive API traffic in the ES concurrency limiter and
+        are traced (scan -> generate, plus any validate/benchmark they trigger).
         """
-        await self.ensure_memory_index()
-        client = await self._get_client()
-        
-        # 1. Diagnose
-        issues = await scanner.scan_all()
+        with prioritized(BACKGROUND), tracer.span("cycle"):
+            result = await self._run_cycle()
+            tracer.annotate(status=result["status"])
+            return result
+
+    async def _run_cycle(self) -> Dict[str, Any]:
+        await issue_tracker.load()
+
+        # 1. Diagnose (always a fresh scan)
+        scans = await self._scan()
+        issues = []
+        for cluster, result in scans.items():
+            if isinstance(result, Exception):
+                print(f"❌ Scan of cluster '{cluster}' failed: {result}")
+            else:
+                issues.extend(result["issues"])
+        # Only a complete scan can show a fixed issue is gone
+        complete = {
+            cluster for cluster, result in scans.items()
+            if not isinstance(result, Exception) and not result["errors"]
+        }
+        await self._verify_applied_fixes(issues, complete)
         if not issues:
             return {"status": "idle", "message": "Cluster is healthy. No issues found."}
 
-        # 2. Prioritize (Pick the first critical issue, or high)
-        target_issue = None
-        for issue in issues:
-            if issue.severity == "critical":
-                target_issue = issue
-                break
-        if not target_issue and issues:
-            target_issue = issues[0] # Fallback to first issue
-
-        # 3. Generate Fix
-        proposal = await fix_generator.generate_fix(target_issue)
-        
-        # 4. Record to Memory (History)
-        record = {
-            "timestamp": int(time.time() * 1000),
-            "issue_id": target_issue.issue_id,
-            "action": "proposal_generated",
-            "details": {
-                "issue": target_issue.dict(),
-                "proposal": proposal.dict()
+        # 2. Skip work we've already done
+        candidates = [issue for issue in issues if not issue_tracker.is_handled(issue)]
+        if not candidates:
+            return {
+                "status": "idle",
+                "message": f"All {len(issues)} detected issues already have pending proposals."
             }
+
+        # 3. Prioritize: most severe first, then the most expensive query (first found on ties)
+        target_issue = max(
+            candidates,
+            key=lambda issue: (SEVERITY_RANK.get(issue.severity, 0), issue.metrics.get("cost", 0))
+        )
+
+        # 4. Generate Fix (against the cluster the issue was found on)
+        benchmark = None
+        with es_wrapper.using(target_issue.cluster):
+            proposal = await fix_generator.generate_fix(target_issue)
+            if target_issue.category == "query":
+                benchmark = await self._benchmark_query_fix(proposal)
+        
+        # 5. Record to Memory (History) - buffered, flushed with _bulk
+        details = {
+            "issue": target_issue.dict(),
+            "proposal": proposal.dict()
         }
-        await client.index(index=HISTORY_INDEX, body=record)
+        if benchmark:
+            details["benchmark"] = benchmark
+        await issue_tracker.transition(
+            issue_key(target_issue),
+            PROPOSED,
+            category=target_issue.category,
+            resource=issue_resource(target_issue),
+            details=details
+        )
         
-        return {
+        result = {
             "status": "action_required",
             "target_issue": target_issue,
             "proposal": proposal
         }
+        if benchmark:
+            result["benchmark"] = benchmark
+        return result
+
+    async def _scan(self) -> Dict[str, Any]:
+        """
+        Scans the selected cluster (or all of them): {cluster: {"issues", "errors"} or exception}.
+        Uncoordinated, this is a full scan that also refreshes what /diagnose serves; with
+        coordination each replica only scans the indices in its own partitions.
+        """
+        selected = es_wrapper.selected()
+        clusters = [selected] if selected else None
+        if not coordinator.enabled:
+            return await scan_snapshots.get_many(clusters, fresh=True)
+
+        async def scan():
+            errors: List[str] = []
+            return {"issues": await scanner.scan_all(errors, owned_only=True), "errors": errors}
+        return await es_wrapper.fan_out(scan, clusters)
+
+    async def _benchmark_query_fix(self, proposal: FixProposal) -> Optional[Dict[str, Any]]:
+        """
+        Estimates a query fix first; only a predicted gain of QUERY_BENCHMARK_MIN_GAIN %
+        earns a real benchmark, which runs both queries against the cluster.
+        """
+        index = proposal.original_code.get("index")
+        original = proposal.original_code.get("body") or {"query": proposal.original_code.get("query", {})}
+        fixed = {**original, **proposal.fixed_code}
+        if "search_after" in fixed:
+            fixed.pop("from", None) # search_after replaces from-based paging
+        try:
+            predicted = await query_cost.compare(index, original, fixed)
+        except Exception as e:
+            print(f"⚠️ Could not estimate the fix for {proposal.issue_id}: {e}")
+            return None
+
+        report: Dict[str, Any] = {
+            "cost_before": predicted["before"]["cost"],
+            "cost_after": predicted["after"]["cost"],
+            "predicted_improvement": predicted["predicted_improvement"],
+            "result": None
+        }
+        if predicted["predicted_improvement"] < settings.QUERY_BENCHMARK_MIN_GAIN:
+            report["skipped"] = "Predicted gain below QUERY_BENCHMARK_MIN_GAIN; not benchmarked."
+            return report
+
+        # The benchmarker sets the page size itself
+        result = await benchmarker.compare(
+            index=index,
+            original_query={k: v for k, v in original.items() if k != "size"},
+            optimized_query={k: v for k, v in fixed.items() if k != "size"}
+        )
+        report["result"] = result.dict()
+        return report
+
+    async def _verify_applied_fixes(self, issues: List[DiagnosticResult], scanned: Set[str]):
+        """
+        Applied fixes whose issue no longer shows up are verified; ones that
+        are still detected failed and become eligible again after a cool-down.
+        Only issues on clusters scanned completely (no failed checks) are judged.
+        """
+        detected = {issue_key(issue) for issue in issues}
+        for key in issue_tracker.keys_in_state(APPLIED):
+            resource = issue_tracker.resource_of(key)
+            if resource and es_wrapper.split(resource)[0] not in scanned:
+                continue # Cluster not (completely) scanned this cycle
+            if resource and not coordinator.owns(resource):
+                continue # Not scanned by this replica
+            if key in detected:
+                await issue_tracker.transition(
+                    key, FAILED, resource=resource,
+                    details={"reason": "Issue still detected after the fix was applied."}
+                )
+            else:
+                await issue_tracker.transition(key, VERIFIED, resource=resource)
 
     async def get_agent_history(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Retrieves past actions from memory."""
-        client = await self._get_client()
-        await self.ensure_memory_index()
-        
+        """Retrieves past actions from memory, including events still buffered for the next flush."""
+        items = []
         try:
-            resp = await client.search(
-                index=HISTORY_INDEX,
-                body={
-                    "sort": [{"timestamp": "desc"}],
-                    "size": limit
-                }
-            )
-            return [hit["_source"] for hit in resp["hits"]["hits"]]
+            await self.ensure_memory_index()
+            items = (await history_reader.search(size=limit))["items"]
         except Exception:
-            return []
+            pass # ES down: buffered events are still worth showing
+        seen = {item.get("event_id") for item in items}
+        items.extend(event for event in history_writer.pending() if event["event_id"] not in seen)
+        items.sort(key=lambda event: (event.get("@timestamp", 0), event.get("event_id", "")), reverse=True)
+        return items[:limit]
 
 agent = AgentOrchestrator()
\ No newline at end of file
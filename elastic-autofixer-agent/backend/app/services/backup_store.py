@@ -0,0 +1,510 @@
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.services.es_client import es_wrapper
+from app.services.coordination import coordinator
+from app.utils import canonical_json, content_hash
+from app.config import settings
+
+SNAPSHOT_INDEX = ".autofixer-backups"
+BLOB_INDEX = ".autofixer-backup-blobs"
+
+SNAPSHOT_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "backup_id": {"type": "keyword"},
+        "index": {"type": "keyword"},
+        "category": {"type": "keyword"}, # "mapping" or "ilm" (same as Validator.create_backup)
+        "taken_at": {"type": "date"},
+        "batch_id": {"type": "keyword"},
+        "issue_id": {"type": "keyword"},
+        "blobs": {"type": "keyword"}, # Every blob hash this snapshot references (for GC)
+        "parts": {"type": "object", "enabled": False} # part name -> blob hash
+    }
+}
+
+BLOB_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "hash": {"type": "keyword"},
+        "codec": {"type": "keyword"},
+        "data": {"type": "binary"},
+        "size": {"type": "long"},
+        "stored_size": {"type": "long"},
+        "created_at": {"type": "date"},
+        "last_referenced_at": {"type": "date"}
+    }
+}
+
+# Per-index values that would make identical settings hash differently; none can be restored anyway
+VOLATILE_SETTING_PREFIXES = (
+    "index.uuid", "index.creation_date", "index.provided_name", "index.version.",
+    "index.history.uuid", "index.resize.", "index.routing.allocation.initial_recovery."
+)
+# Settings that can't be changed on an open index
+STATIC_SETTING_PREFIXES = (
+    "index.number_of_shards", "index.number_of_routing_shards", "index.analysis.", "index.sort.",
+    "index.codec", "index.mode", "index.routing_partition_size", "index.soft_deletes.", "index.store."
+)
+# Top-level mapping parameters put_mapping can set back (fields can't be removed)
+RESTORABLE_MAPPING_DEFAULTS = {
+    "dynamic": True,
+    "dynamic_templates": [],
+    "date_detection": True,
+    "numeric_detection": False
+}
+
+# ES rejects request lines over 4KB by default, so multi-index calls are chunked
+MAX_INDEX_LIST_CHARS = 3000
+
+PAGE_SIZE = 1000
+GC_LOCK_RESOURCE = "__backup_gc__"
+
+logger = logging.getLogger("autofixer.backups")
+
+def chunk_indices(indices: List[str], max_chars: int = MAX_INDEX_LIST_CHARS) -> List[List[str]]:
+    """Splits index names into comma-joined lists that fit in one request line."""
+    chunks, current, size = [], [], 0
+    for index in indices:
+        if current and size + len(index) + 1 > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += len(index) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+_zstandard: Any = None
+
+def _zstd():
+    """Optional 'zstandard' module (smaller and faster than gzip for JSON), imported on first use."""
+    global _zstandard
+    if _zstandard is None:
+        try:
+            import zstandard
+            _zstandard = zstandard
+        except ImportError:
+            _zstandard = False
+    return _zstandard or None
+
+def compress(raw: bytes) -> Tuple[str, bytes]:
+    zstandard = _zstd()
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=settings.BACKUP_ZSTD_LEVEL).compress(raw)
+    return "gzip", gzip.compress(raw, compresslevel=6, mtime=0)
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("Backup blob is zstd-compressed but the 'zstandard' package is not installed.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown backup codec '{codec}'.")
+
+class BackupStore:
+    """
+    Persists pre-fix mappings, settings and aliases so fixes can be rolled back.
+    1. Each part of an index's state is stored once as canonical, compressed JSON
+       keyed by its SHA-256, so thousands of identical mappings share one blob.
+    2. A small snapshot document per index points at its blobs.
+    3. Restores pick the latest snapshot at or before a point in time, per index
+       or for a whole batch (identical restores become multi-index calls).
+    4. GC drops snapshots past retention (keeping the newest per index) and any
+       blob nothing references any more.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._index_ready: Set[str] = set() # Clusters whose indices exist
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_client(self):
+        # Not cached: the cluster is picked per request/cycle (es_wrapper.using)
+        return self.client or await es_wrapper.get_client()
+
+    async def ensure_index(self):
+        if es_wrapper.current() in self._index_ready:
+            return
+        client = await self._get_client()
+        for index, mappings in ((SNAPSHOT_INDEX, SNAPSHOT_MAPPINGS), (BLOB_INDEX, BLOB_MAPPINGS)):
+            if await client.indices.exists(index=index):
+                continue
+            try:
+                await client.indices.create(
+                    index=index,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": mappings
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready.add(es_wrapper.current())
+
+    # ---------------------------------------------------------
+    # Save
+    # ---------------------------------------------------------
+    @staticmethod
+    def _parts(state: Dict[str, Any]) -> Dict[str, Any]:
+        """Splits a backup into separately deduplicated parts."""
+        parts = dict(state)
+        if "settings" in parts:
+            parts["settings"] = {
+                key: value for key, value in parts["settings"].items()
+                if not key.startswith(VOLATILE_SETTING_PREFIXES)
+            }
+        return parts
+
+    async def save(
+        self,
+        states: Dict[str, Dict[str, Any]],
+        category: str,
+        batch_id: Optional[str] = None,
+        issue_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Stores {index: state} in one bulk call; returns {index: backup_id}."""
+        if not states:
+            return {}
+        await self.ensure_index()
+        client = await self._get_client()
+        now = int(time.time() * 1000)
+
+        blobs: Dict[str, Dict[str, Any]] = {}
+        snapshots: Dict[str, Dict[str, Any]] = {}
+        for index, state in states.items():
+            parts = {}
+            for name, value in self._parts(state).items():
+                digest = content_hash(value)
+                parts[name] = digest
+                if digest not in blobs:
+                    raw = canonical_json(value)
+                    codec, data = compress(raw)
+                    blobs[digest] = {
+                        "hash": digest,
+                        "codec": codec,
+                        "data": base64.b64encode(data).decode(),
+                        "size": len(raw),
+                        "stored_size": len(data),
+                        "created_at": now,
+                        "last_referenced_at": now
+                    }
+            backup_id = uuid.uuid4().hex
+            snapshots[index] = {
+                "backup_id": backup_id,
+                "index": index,
+                "category": category,
+                "taken_at": now,
+                "batch_id": batch_id,
+                "issue_id": issue_id,
+                "blobs": sorted(set(parts.values())),
+                "parts": parts
+            }
+
+        # Upsert blobs: existing ones only get 'last_referenced_at' touched, which also
+        # bumps their seq_no so a concurrent GC pass can't delete them (see gc()).
+        body = []
+        for digest, blob in blobs.items():
+            body.append({"update": {"_index": BLOB_INDEX, "_id": digest}})
+            body.append({"doc": {"last_referenced_at": now}, "upsert": blob})
+        resp = await client.bulk(body=body)
+        if resp.get("errors"):
+            failed = [item["update"] for item in resp["items"] if item["update"].get("status", 500) >= 300]
+            raise RuntimeError(f"Could not store {len(failed)} backup blobs, e.g. {failed[0].get('error')}")
+
+        body = []
+        for snapshot in snapshots.values():
+            body.append({"create": {"_index": SNAPSHOT_INDEX, "_id": snapshot["backup_id"]}})
+            body.append(snapshot)
+        resp = await client.bulk(body=body, refresh="wait_for")
+        if resp.get("errors"):
+            raise RuntimeError("Could not store backup snapshots.")
+
+        return {index: snapshot["backup_id"] for index, snapshot in snapshots.items()}
+
+    # ---------------------------------------------------------
+    # Read
+    # ---------------------------------------------------------
+    async def list_snapshots(self, index: str, category: Optional[str] = None, size: int = 50) -> List[Dict[str, Any]]:
+        await self.ensure_index()
+        client = await self._get_client()
+        filters: List[Dict[str, Any]] = [{"term": {"index": index}}]
+        if category:
+            filters.append({"term": {"category": category}})
+        resp = await client.search(
+            index=SNAPSHOT_INDEX,
+            body={
+                "size": size,
+                "query": {"bool": {"filter": filters}},
+                "sort": [{"taken_at": "desc"}],
+                "_source": ["backup_id", "index", "category", "taken_at", "batch_id", "issue_id"]
+            }
+        )
+        return [hit["_source"] for hit in resp["hits"]["hits"]]
+
+    async def find(self, index: str, category: str, at: Optional[int] = None) -> Optional[str]:
+        """backup_id of the newest snapshot of an index taken at or before 'at' (epoch ms)."""
+        await self.ensure_index()
+        client = await self._get_client()
+        filters: List[Dict[str, Any]] = [{"term": {"index": index}}, {"term": {"category": category}}]
+        if at is not None:
+            filters.append({"range": {"taken_at": {"lte": at}}})
+        resp = await client.search(
+            index=SNAPSHOT_INDEX,
+            body={
+                "size": 1,
+                "query": {"bool": {"filter": filters}},
+                "sort": [{"taken_at": "desc"}],
+                "_source": ["backup_id"]
+            }
+        )
+        hits = resp["hits"]["hits"]
+        return hits[0]["_source"]["backup_id"] if hits else None
+
+    async def load(self, backup_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """{backup_id: snapshot + decoded 'state'}; shared blobs are fetched once."""
+        await self.ensure_index()
+        client = await self._get_client()
+        snapshots: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(backup_ids), PAGE_SIZE):
+            docs = (await client.mget(index=SNAPSHOT_INDEX, body={"ids": backup_ids[start:start + PAGE_SIZE]}))["docs"]
+            snapshots.update({doc["_id"]: doc["_source"] for doc in docs if doc.get("found")})
+
+        digests = sorted({digest for snapshot in snapshots.values() for digest in snapshot["blobs"]})
+        values: Dict[str, Any] = {}
+        for start in range(0, len(digests), PAGE_SIZE):
+            docs = (await client.mget(index=BLOB_INDEX, body={"ids": digests[start:start + PAGE_SIZE]}))["docs"]
+            for doc in docs:
+                if doc.get("found"):
+                    blob = doc["_source"]
+                    values[doc["_id"]] = json.loads(decompress(blob["codec"], base64.b64decode(blob["data"])))
+
+        for snapshot in snapshots.values():
+            missing = [digest for digest in snapshot["parts"].values() if digest not in values]
+            if missing:
+                snapshot["error"] = f"Missing {len(missing)} backup blobs."
+                continue
+            snapshot["state"] = {name: values[digest] for name, digest in snapshot["parts"].items()}
+        return snapshots
+
+    # ---------------------------------------------------------
+    # Restore
+    # ---------------------------------------------------------
+    async def restore(self, index: str, category: str, at: Optional[int] = None) -> Dict[str, Any]:
+        """Point-in-time restore of one index."""
+        backup_id = await self.find(index, category, at)
+        if backup_id is None:
+            return {"status": "error", "message": f"No {category} backup of {index} found."}
+        status, message = (await self.restore_many([backup_id]))[backup_id]
+        return {"status": status, "message": message, "backup_id": backup_id}
+
+    async def restore_many(self, backup_ids: List[str], max_concurrency: int = 8) -> Dict[str, Tuple[str, str]]:
+        """
+        Restores many snapshots; returns {backup_id: (status, message)}.
+        Note: fields added to a mapping can't be removed; mapping restores put back
+        'dynamic' and the other top-level parameters.
+        """
+        client = await self._get_client()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        snapshots = await self.load(backup_ids)
+        outcomes: Dict[str, Tuple[str, str]] = {
+            backup_id: ("rollback_error", "Backup snapshot not found.")
+            for backup_id in backup_ids if backup_id not in snapshots
+        }
+        for backup_id, snapshot in snapshots.items():
+            if "error" in snapshot:
+                outcomes[backup_id] = ("rollback_error", snapshot["error"])
+        ready = {backup_id: s for backup_id, s in snapshots.items() if "state" in s}
+
+        # Current settings/aliases, to compute what actually has to change back
+        ilm_indices = sorted({s["index"] for s in ready.values() if s["category"] == "ilm"})
+        current_settings: Dict[str, Dict[str, Any]] = {}
+        current_aliases: Dict[str, List[str]] = {}
+        for chunk in chunk_indices(ilm_indices):
+            names = ",".join(chunk)
+            resp = await client.indices.get_settings(index=names, flat_settings=True, ignore_unavailable=True)
+            current_settings.update({index: body.get("settings", {}) for index, body in resp.items()})
+            resp = await client.indices.get_alias(index=names, ignore_unavailable=True)
+            current_aliases.update({index: sorted(body.get("aliases", {})) for index, body in resp.items()})
+
+        # Group identical restore bodies so they become multi-index calls
+        groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        alias_actions: Dict[str, List[Dict[str, Any]]] = {}
+        for backup_id, snapshot in ready.items():
+            index, state = snapshot["index"], snapshot["state"]
+            if snapshot["category"] == "mapping":
+                stored = state.get("mappings", {})
+                body = {key: stored.get(key, default) for key, default in RESTORABLE_MAPPING_DEFAULTS.items()}
+            else:
+                if index not in current_settings:
+                    outcomes[backup_id] = ("rollback_error", f"Index {index} no longer exists.")
+                    continue
+                stored, current = state.get("settings", {}), current_settings[index]
+                body = {
+                    key: stored.get(key) # None resets a setting added by the fix
+                    for key in set(stored) | set(current)
+                    if stored.get(key) != current.get(key)
+                    and not key.startswith(VOLATILE_SETTING_PREFIXES + STATIC_SETTING_PREFIXES)
+                }
+                stored_aliases = set(state.get("aliases", []))
+                alias_actions[backup_id] = [
+                    {"remove": {"index": index, "alias": alias}}
+                    for alias in current_aliases.get(index, []) if alias not in stored_aliases
+                ]
+            key = (snapshot["category"], content_hash(body))
+            group = groups.setdefault(key, {"category": snapshot["category"], "body": body, "snapshots": {}})
+            group["snapshots"][index] = backup_id
+
+        async def apply(category: str, body: Dict[str, Any], chunk: List[str], by_index: Dict[str, str]):
+            async with semaphore:
+                try:
+                    if category == "mapping":
+                        await client.indices.put_mapping(index=",".join(chunk), body=body)
+                    elif body:
+                        await client.indices.put_settings(index=",".join(chunk), body=body)
+                    actions = [a for index in chunk for a in alias_actions.get(by_index[index], [])]
+                    if actions:
+                        await client.indices.update_aliases(body={"actions": actions})
+                    for index in chunk:
+                        outcomes[by_index[index]] = ("rolled_back", "Restored backed-up pre-state.")
+                except Exception as e:
+                    for index in chunk:
+                        outcomes[by_index[index]] = ("rollback_error", str(e))
+
+        await asyncio.gather(*(
+            apply(group["category"], group["body"], chunk, group["snapshots"])
+            for group in groups.values()
+            for chunk in chunk_indices(list(group["snapshots"]))
+        ))
+        return outcomes
+
+    # ---------------------------------------------------------
+    # Garbage collection
+    # ---------------------------------------------------------
+    async def gc(self) -> Dict[str, int]:
+        """
+        1. Deletes snapshots older than BACKUP_RETENTION_DAYS, except the newest
+           snapshot of each index/category.
+        2. Deletes blobs no remaining snapshot references. Blobs referenced within
+           the grace period are kept, and deletes use if_seq_no, so a blob that
+           save() touches while GC runs survives.
+        """
+        await self.ensure_index()
+        client = await self._get_client()
+        now = int(time.time() * 1000)
+        cutoff = now - int(settings.BACKUP_RETENTION_DAYS * 86_400_000)
+
+        # Newest snapshot per index/category
+        newest: Dict[Tuple[str, str], int] = {}
+        after = None
+        while True:
+            composite: Dict[str, Any] = {
+                "size": PAGE_SIZE,
+                "sources": [{"index": {"terms": {"field": "index"}}}, {"category": {"terms": {"field": "category"}}}]
+            }
+            if after:
+                composite["after"] = after
+            resp = await client.search(
+                index=SNAPSHOT_INDEX,
+                body={"size": 0, "aggs": {"groups": {"composite": composite, "aggs": {"newest": {"max": {"field": "taken_at"}}}}}}
+            )
+            agg = resp["aggregations"]["groups"]
+            for bucket in agg["buckets"]:
+                newest[(bucket["key"]["index"], bucket["key"]["category"])] = bucket["newest"]["value"]
+            after = agg.get("after_key")
+            if not agg["buckets"] or not after:
+                break
+
+        expired = []
+        async for hit in self._scan(SNAPSHOT_INDEX, {"range": {"taken_at": {"lt": cutoff}}}, "backup_id", ["index", "category", "taken_at"]):
+            source = hit["_source"]
+            if source["taken_at"] < newest.get((source["index"], source["category"]), 0):
+                expired.append(hit["_id"])
+        for start in range(0, len(expired), PAGE_SIZE):
+            body = [{"delete": {"_index": SNAPSHOT_INDEX, "_id": backup_id}} for backup_id in expired[start:start + PAGE_SIZE]]
+            await client.bulk(body=body, refresh="wait_for")
+
+        # Every blob still referenced
+        referenced = set()
+        after = None
+        while True:
+            composite = {"size": PAGE_SIZE, "sources": [{"blob": {"terms": {"field": "blobs"}}}]}
+            if after:
+                composite["after"] = after
+            resp = await client.search(index=SNAPSHOT_INDEX, body={"size": 0, "aggs": {"blobs": {"composite": composite}}})
+            agg = resp["aggregations"]["blobs"]
+            referenced.update(bucket["key"]["blob"] for bucket in agg["buckets"])
+            after = agg.get("after_key")
+            if not agg["buckets"] or not after:
+                break
+
+        grace = now - int(settings.BACKUP_GC_GRACE * 1000)
+        orphans = []
+        async for hit in self._scan(BLOB_INDEX, {"range": {"last_referenced_at": {"lt": grace}}}, "hash", [], seq_no=True):
+            if hit["_id"] not in referenced:
+                orphans.append({"delete": {
+                    "_index": BLOB_INDEX, "_id": hit["_id"],
+                    "if_seq_no": hit["_seq_no"], "if_primary_term": hit["_primary_term"]
+                }})
+        deleted_blobs = 0
+        for start in range(0, len(orphans), PAGE_SIZE):
+            resp = await client.bulk(body=orphans[start:start + PAGE_SIZE])
+            deleted_blobs += sum(1 for item in resp["items"] if item["delete"].get("status") == 200)
+
+        if expired or deleted_blobs:
+            logger.info(f"Backup GC removed {len(expired)} snapshots and {deleted_blobs} blobs.")
+        return {"snapshots_deleted": len(expired), "blobs_deleted": deleted_blobs}
+
+    async def _scan(self, index: str, query: Dict[str, Any], sort_field: str, source: List[str], seq_no: bool = False):
+        client = await self._get_client()
+        search_after = None
+        while True:
+            body: Dict[str, Any] = {"size": PAGE_SIZE, "query": query, "sort": [{sort_field: "asc"}], "_source": source}
+            if search_after:
+                body["search_after"] = search_after
+            hits = (await client.search(index=index, body=body, seq_no_primary_term=seq_no))["hits"]["hits"]
+            for hit in hits:
+                yield hit
+            if len(hits) < PAGE_SIZE:
+                return
+            search_after = hits[-1]["sort"]
+
+    # ---------------------------------------------------------
+    # Background loop
+    # ---------------------------------------------------------
+    async def _gc_if_owner(self) -> Optional[Dict[str, int]]:
+        if not coordinator.owns(es_wrapper.qualify(GC_LOCK_RESOURCE)):
+            return None # Another replica runs GC for this cluster
+        return await self.gc()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.BACKUP_GC_INTERVAL)
+            # Backups live next to the indices they protect, so GC runs per cluster
+            for cluster, result in (await es_wrapper.fan_out(self._gc_if_owner)).items():
+                if isinstance(result, Exception):
+                    logger.warning(f"Backup GC failed on cluster '{cluster}': {result}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Singleton instance
+backup_store = BackupStore()
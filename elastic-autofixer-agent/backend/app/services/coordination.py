@@ -0,0 +1,347 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple
+from app.services.es_client import es_wrapper
+from app.config import settings
+
+LEASE_INDEX = ".autofixer-leases"
+
+LEASE_MAPPINGS = {
+    "properties": {
+        "kind": {"type": "keyword"}, # "member", "partition", "resource"
+        "owner": {"type": "keyword"},
+        "expires_at": {"type": "date"}
+    }
+}
+
+VIRTUAL_NODES = 32 # Points per replica on the hash ring
+
+logger = logging.getLogger("autofixer.coordination")
+
+def _hash(value: str) -> int:
+    return int(hashlib.sha1(value.encode()).hexdigest()[:15], 16)
+
+def partition_for(resource: str, partitions: int) -> int:
+    """Stable partition of an index name."""
+    return _hash(resource) % partitions
+
+class LeaseHeldError(Exception):
+    """Raised when another replica holds the lease on a resource."""
+
+class Coordinator:
+    """
+    Splits work between backend replicas using lease documents in Elasticsearch.
+    1. Every replica heartbeats a 'member' lease.
+    2. Live members are placed on a consistent-hash ring; each partition of the
+       index space has exactly one desired owner.
+    3. Partition leases are taken/renewed/released with optimistic concurrency
+       (if_seq_no / if_primary_term), so two replicas can never both win one.
+    4. When a replica dies its leases expire and the ring hands them over.
+
+    Disabled (single replica) mode owns everything and never touches ES.
+    """
+
+    def __init__(self, client=None, replica_id: Optional[str] = None, enabled: Optional[bool] = None):
+        self.client = client
+        self._replica_id = replica_id
+        self._enabled = enabled
+        self._index_ready = False
+        self._held: Dict[int, Tuple[int, int, int]] = {} # partition -> (seq_no, primary_term, expires_at)
+        self._ring: List[Tuple[int, str]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._local_locks: Dict[str, asyncio.Lock] = {} # resource -> lock held by a request on this replica
+
+    # Resolved on first use, so constructing the singleton doesn't load settings
+    @property
+    def replica_id(self) -> str:
+        if self._replica_id is None:
+            self._replica_id = settings.REPLICA_ID or (
+                f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+            )
+        return self._replica_id
+
+    @property
+    def enabled(self) -> bool:
+        return settings.COORDINATION_ENABLED if self._enabled is None else self._enabled
+
+    @property
+    def partitions(self) -> int:
+        return settings.COORDINATION_PARTITIONS
+
+    async def _get_client(self):
+        if not self.client:
+            self.client = await es_wrapper.get_client(es_wrapper.default)
+        return self.client
+
+    async def ensure_index(self):
+        if self._index_ready:
+            return
+        client = await self._get_client()
+        if not await client.indices.exists(index=LEASE_INDEX):
+            try:
+                await client.indices.create(
+                    index=LEASE_INDEX,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": LEASE_MAPPINGS
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready = True
+
+    # ---------------------------------------------------------
+    # Ownership
+    # ---------------------------------------------------------
+    def owns(self, resource: str) -> bool:
+        """True if this replica should scan/fix the given index right now."""
+        if not self.enabled:
+            return True
+        held = self._held.get(partition_for(resource, self.partitions))
+        # Stop working a partition a little before the lease actually expires
+        margin_ms = int(settings.COORDINATION_HEARTBEAT * 1000)
+        return held is not None and held[2] - margin_ms > self._now()
+
+    @property
+    def owned_partitions(self) -> List[int]:
+        return sorted(self._held)
+
+    def set_members(self, members: List[str]):
+        """Rebuilds the consistent-hash ring for a set of live replicas."""
+        self._ring = sorted(
+            (_hash(f"{member}#{v}"), member)
+            for member in members for v in range(VIRTUAL_NODES)
+        )
+
+    def desired_owner(self, partition: int) -> Optional[str]:
+        """Owner of a partition on the consistent-hash ring of live members."""
+        if not self._ring:
+            return None
+        i = bisect.bisect_left(self._ring, (_hash(f"partition-{partition}"), "")) % len(self._ring)
+        return self._ring[i][1]
+
+    @staticmethod
+    def _now() -> int:
+        return int(time.time() * 1000)
+
+    # ---------------------------------------------------------
+    # Heartbeat / rebalancing
+    # ---------------------------------------------------------
+    async def heartbeat(self):
+        """Refreshes membership, then acquires/renews/releases partition leases."""
+        await self.ensure_index()
+        client = await self._get_client()
+        now = self._now()
+        ttl_ms = int(settings.COORDINATION_LEASE_TTL * 1000)
+
+        await client.index(
+            index=LEASE_INDEX,
+            id=f"member:{self.replica_id}",
+            body={"kind": "member", "owner": self.replica_id, "expires_at": now + ttl_ms}
+        )
+
+        resp = await client.search(
+            index=LEASE_INDEX,
+            body={
+                "size": 1000,
+                "query": {"bool": {"filter": [
+                    {"term": {"kind": "member"}},
+                    {"range": {"expires_at": {"gt": now}}}
+                ]}},
+                "_source": ["owner"]
+            }
+        )
+        members = {hit["_source"]["owner"] for hit in resp["hits"]["hits"]}
+        members.add(self.replica_id) # Our own heartbeat may not be searchable yet
+        self.set_members(sorted(members))
+
+        ids = [f"partition:{p}" for p in range(self.partitions)]
+        docs = (await client.mget(index=LEASE_INDEX, body={"ids": ids}))["docs"]
+
+        body = []
+        planned = []
+        for p, doc in enumerate(docs):
+            mine = self.desired_owner(p) == self.replica_id
+            meta = {"_index": LEASE_INDEX, "_id": f"partition:{p}"}
+            lease = {"kind": "partition", "owner": self.replica_id, "expires_at": now + ttl_ms}
+
+            if not doc.get("found"):
+                if mine:
+                    body += [{"create": meta}, lease]
+                    planned.append((p, "create"))
+                continue
+
+            occ = {"if_seq_no": doc["_seq_no"], "if_primary_term": doc["_primary_term"]}
+            owner = doc["_source"]["owner"]
+            expired = doc["_source"]["expires_at"] <= now
+
+            if owner == self.replica_id and not mine:
+                # Hand over: the ring moved this partition to another replica
+                body.append({"delete": {**meta, **occ}})
+                planned.append((p, "delete"))
+            elif mine and (owner == self.replica_id or expired):
+                body += [{"index": {**meta, **occ}}, lease]
+                planned.append((p, "index"))
+            # else: a live lease held by someone else; wait for hand-over or expiry
+
+        if not body:
+            self._held = {}
+            return
+
+        resp = await client.bulk(body=body)
+        for (p, op), item in zip(planned, resp["items"]):
+            result = item[op]
+            if op == "delete" or result.get("status", 500) >= 300:
+                # Released, or lost an optimistic-concurrency race (409)
+                self._held.pop(p, None)
+            else:
+                self._held[p] = (result["_seq_no"], result["_primary_term"], now + ttl_ms)
+
+        # Anything we didn't touch this round is no longer ours
+        touched = {p for p, _ in planned}
+        for p in list(self._held):
+            if p not in touched:
+                self._held.pop(p)
+
+    async def release_all(self):
+        """Gives up every lease so other replicas can take over immediately."""
+        if not self.enabled or self.client is None:
+            return
+        body = [{"delete": {"_index": LEASE_INDEX, "_id": f"member:{self.replica_id}"}}]
+        for p, (seq_no, primary_term, _) in self._held.items():
+            body.append({"delete": {
+                "_index": LEASE_INDEX, "_id": f"partition:{p}",
+                "if_seq_no": seq_no, "if_primary_term": primary_term
+            }})
+        try:
+            await self.client.bulk(body=body)
+        except Exception as e:
+            logger.warning(f"Could not release leases for {self.replica_id}: {e}")
+        self._held = {}
+
+    # ---------------------------------------------------------
+    # Per-resource locks (fix application)
+    # ---------------------------------------------------------
+    @asynccontextmanager
+    async def resource_lock(self, resource: str):
+        """
+        Exclusive, expiring lock on one index so two replicas (or two requests on
+        this one) never apply fixes to it concurrently. Raises LeaseHeldError if
+        someone else holds it. The lease is renewed every COORDINATION_HEARTBEAT
+        while held, so long fixes don't outlive it.
+        """
+        local = self._local_locks.setdefault(resource, asyncio.Lock())
+        if local.locked():
+            raise LeaseHeldError(f"{resource} is locked by another request on this replica.")
+        try:
+            async with local:
+                if not self.enabled:
+                    yield
+                else:
+                    async with self._resource_lease(resource):
+                        yield
+        finally:
+            if not local.locked():
+                self._local_locks.pop(resource, None)
+
+    def _resource_lease_doc(self) -> Dict[str, Any]:
+        return {
+            "kind": "resource",
+            "owner": self.replica_id,
+            "expires_at": self._now() + int(settings.COORDINATION_LEASE_TTL * 1000)
+        }
+
+    @asynccontextmanager
+    async def _resource_lease(self, resource: str):
+        await self.ensure_index()
+        client = await self._get_client()
+        doc_id = f"resource:{resource}"
+        now = self._now()
+
+        doc = (await client.mget(index=LEASE_INDEX, body={"ids": [doc_id]}))["docs"][0]
+        try:
+            if not doc.get("found"):
+                resp = await client.index(index=LEASE_INDEX, id=doc_id, body=self._resource_lease_doc(), op_type="create")
+            elif doc["_source"]["expires_at"] <= now or doc["_source"]["owner"] == self.replica_id:
+                resp = await client.index(
+                    index=LEASE_INDEX, id=doc_id, body=self._resource_lease_doc(),
+                    if_seq_no=doc["_seq_no"], if_primary_term=doc["_primary_term"]
+                )
+            else:
+                raise LeaseHeldError(f"{resource} is locked by replica {doc['_source']['owner']}.")
+        except LeaseHeldError:
+            raise
+        except Exception as e:
+            if "version_conflict" in str(e) or getattr(e, "status_code", None) == 409:
+                raise LeaseHeldError(f"{resource} was locked by another replica.")
+            raise
+
+        held = {"seq_no": resp["_seq_no"], "primary_term": resp["_primary_term"]}
+
+        async def renew():
+            while True:
+                await asyncio.sleep(settings.COORDINATION_HEARTBEAT)
+                try:
+                    renewed = await client.index(
+                        index=LEASE_INDEX, id=doc_id, body=self._resource_lease_doc(),
+                        if_seq_no=held["seq_no"], if_primary_term=held["primary_term"]
+                    )
+                    held.update(seq_no=renewed["_seq_no"], primary_term=renewed["_primary_term"])
+                except Exception as e:
+                    if "version_conflict" in str(e) or getattr(e, "status_code", None) == 409:
+                        logger.error(f"Lost the lock on {resource}: another replica took it over.")
+                        return
+                    logger.warning(f"Could not renew lock on {resource}: {e}")
+
+        renewal = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                await renewal
+            except asyncio.CancelledError:
+                pass
+            try:
+                await client.delete(
+                    index=LEASE_INDEX, id=doc_id,
+                    if_seq_no=held["seq_no"], if_primary_term=held["primary_term"]
+                )
+            except Exception as e:
+                logger.warning(f"Could not release lock on {resource}: {e}")
+
+    # ---------------------------------------------------------
+    # Background loop
+    # ---------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.warning(f"Coordination heartbeat failed: {e}")
+            await asyncio.sleep(settings.COORDINATION_HEARTBEAT)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.release_all()
+
+# Singleton instance
+coordinator = Coordinator()
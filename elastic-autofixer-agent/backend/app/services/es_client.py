@@ -1,43 +1,208 @@
 import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
 from elasticsearch import AsyncElasticsearch
+from app.services.es_transport import LimitedTransport
 from app.config import settings
 
+# Cluster the current request/cycle works on; None means "not chosen" (the default cluster)
+current_cluster: ContextVar[Optional[str]] = ContextVar("current_cluster", default=None)
+
+class UnknownClusterError(KeyError):
+    """Raised for a cluster name that isn't configured."""
+
 class ESClientWrapper:
-    client: AsyncElasticsearch = None
-
-    async def connect(self):  # <--- Make this async explicitly
-        """Initializes the Async Elasticsearch client."""
-        if self.client is None and settings.ELASTIC_ENDPOINT:
-            print(f"🔌 Connecting to Elastic Cloud: {settings.ELASTIC_ENDPOINT}...")
-            self.client = AsyncElasticsearch(
-                hosts=settings.ELASTIC_ENDPOINT,
-                api_key=settings.ELASTIC_API_KEY,
-                request_timeout=30,
-                max_retries=3,
-                retry_on_timeout=True
-            )
+    """
+    Registry of named Elasticsearch clusters.
+    1. The default cluster comes from ELASTIC_ENDPOINT / ELASTIC_API_KEY; more are
+       added through ELASTIC_CLUSTERS (JSON: name -> endpoint, api_key, pool options,
+       or "simulated": {...} for an in-process fake, see es_simulator).
+    2. Each cluster gets its own client and connection pool, created on first use.
+    3. get_client() returns the cluster selected with using() (or the request's
+       'cluster' parameter), so services don't need to pass names around.
+    4. Connection checks are recorded per cluster for /clusters; after a failed
+       check, reconnects back off exponentially instead of retrying on every call.
+    """
+
+    def __init__(self):
+        self.clients: Dict[str, AsyncElasticsearch] = {}
+        self.health: Dict[str, Dict[str, Any]] = {}
+        self._configs: Optional[Dict[str, Dict[str, Any]]] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._failures: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {} # monotonic time of the next allowed connect attempt
+
+    @property
+    def default(self) -> str:
+        """Name of the ELASTIC_ENDPOINT cluster, which also holds the agent's own state."""
+        return settings.ELASTIC_DEFAULT_CLUSTER
+
+    @property
+    def client(self) -> Optional[AsyncElasticsearch]:
+        """Default cluster's client, if connected."""
+        return self.clients.get(self.default)
+
+    # ---------------------------------------------------------
+    # Configuration
+    # ---------------------------------------------------------
+    @property
+    def configs(self) -> Dict[str, Dict[str, Any]]:
+        if self._configs is None:
+            configs: Dict[str, Dict[str, Any]] = {}
+            if settings.ELASTIC_ENDPOINT or settings.ELASTIC_CLOUD_ID:
+                configs[self.default] = {
+                    "endpoint": settings.ELASTIC_ENDPOINT,
+                    "cloud_id": settings.ELASTIC_CLOUD_ID,
+                    "api_key": settings.ELASTIC_API_KEY
+                }
+            if settings.ELASTIC_CLUSTERS:
+                configs.update(json.loads(settings.ELASTIC_CLUSTERS))
+            self._configs = configs
+        return self._configs
+
+    def cluster_names(self) -> List[str]:
+        return list(self.configs)
+
+    def current(self) -> str:
+        return current_cluster.get() or self.default
+
+    @staticmethod
+    def selected() -> Optional[str]:
+        """Cluster explicitly chosen for this context, or None."""
+        return current_cluster.get()
+
+    def qualify(self, resource: str, cluster: Optional[str] = None) -> str:
+        """Resource name that is unique across clusters (unchanged on the default cluster)."""
+        cluster = cluster or self.current()
+        return resource if cluster == self.default else f"{cluster}:{resource}"
+
+    def split(self, resource: str) -> Tuple[str, str]:
+        """Inverse of qualify(): (cluster, index). Index names can't contain ':'."""
+        cluster, sep, index = resource.rpartition(":")
+        return (cluster, index) if sep else (self.default, resource)
+
+    @contextmanager
+    def using(self, cluster: Optional[str]):
+        """Routes get_client() calls in this context (and tasks it starts) to a cluster."""
+        if cluster is not None and cluster not in self.configs:
+            raise UnknownClusterError(cluster)
+        token = current_cluster.set(cluster)
+        try:
+            yield
+        finally:
+            current_cluster.reset(token)
+
+    # ---------------------------------------------------------
+    # Connections
+    # ---------------------------------------------------------
+    def _build(self, name: str) -> AsyncElasticsearch:
+        config = self.configs[name]
+        options: Dict[str, Any] = {
+            "api_key": config.get("api_key") or None,
+            "request_timeout": config.get("request_timeout", settings.ES_REQUEST_TIMEOUT),
+            "max_retries": config.get("max_retries", settings.ES_MAX_RETRIES),
+            "retry_on_timeout": True,
+            # Pooled, kept-alive connections per node; compressed bodies for large bulk/mapping payloads
+            "connections_per_node": config.get("connections_per_node", settings.ES_CONNECTIONS_PER_NODE),
+            "http_compress": config.get("http_compress", settings.ES_HTTP_COMPRESS),
+            "transport_class": LimitedTransport # Shared adaptive concurrency limiter
+        }
+        if config.get("simulated") is not None:
+            # In-process fake cluster (benchmarks, local runs without Elastic Cloud)
+            from app.services.es_simulator import SimulatedNode, simulate
+            options["hosts"] = simulate(name, **config["simulated"])
+            options["node_class"] = SimulatedNode
+        elif config.get("endpoint"):
+            options["hosts"] = config["endpoint"]
+        else:
+            options["cloud_id"] = config["cloud_id"]
+        client = AsyncElasticsearch(**options)
+        client.transport.cluster = name
+        return client
+
+    async def connect(self, name: Optional[str] = None):  # <--- Make this async explicitly
+        """Initializes the Async Elasticsearch client for a cluster (default: the default cluster)."""
+        name = name or self.default
+        if name not in self.configs:
+            return
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if name in self.clients or time.monotonic() < self._retry_at.get(name, 0):
+                return
+            config = self.configs[name]
+            print(f"🔌 Connecting to cluster '{name}': {config.get('endpoint') or ('simulator' if 'simulated' in config else 'cloud id')}...")
+            client = self._build(name)
             # Verify connection immediately
-            try:
-                info = await self.client.info()
-                print(f"✅ Client initialized. Connected to: {info['cluster_name']}")
-            except Exception as e:
-                print(f"❌ Connection Check Failed: {e}")
-                self.client = None # Reset so we retry later
+            if await self.check_health(name, client):
+                self.clients[name] = client
+                self._failures.pop(name, None)
+                self._retry_at.pop(name, None)
+                print(f"✅ Client initialized. Connected to: {self.health[name]['cluster_name']}")
+            else:
+                failures = self._failures[name] = self._failures.get(name, 0) + 1
+                delay = min(settings.ES_CONNECT_BACKOFF_MAX, 2 ** (failures - 1))
+                self._retry_at[name] = time.monotonic() + delay
+                self.health[name]["retry_in"] = delay
+                print(f"❌ Connection Check Failed: {self.health[name]['error']} (retrying in {delay}s)")
+                await client.close()
+
+    async def check_health(self, name: str, client: Optional[AsyncElasticsearch] = None) -> bool:
+        client = client or self.clients.get(name)
+        entry = {"status": "unreachable", "checked_at": int(time.time() * 1000), "error": None}
+        try:
+            if client is None:
+                raise ConnectionError("Not connected.")
+            info = await client.options(request_timeout=settings.ES_CONNECT_TIMEOUT, max_retries=0).info()
+            entry.update(status="healthy", cluster_name=info["cluster_name"], version=info["version"]["number"])
+        except Exception as e:
+            entry["error"] = str(e)
+        self.health[name] = entry
+        return entry["status"] == "healthy"
+
+    async def refresh_health(self) -> Dict[str, Dict[str, Any]]:
+        """Checks every configured cluster concurrently (connecting lazily)."""
+        async def check(name: str):
+            if name not in self.clients:
+                await self.connect(name)
+            else:
+                await self.check_health(name)
+
+        await asyncio.gather(*(check(name) for name in self.cluster_names()))
+        return {name: self.health.get(name, {"status": "unknown"}) for name in self.cluster_names()}
 
     async def close(self):
-        if self.client:
-            await self.client.close()
+        clients, self.clients = self.clients, {}
+        for client in clients.values():
+            await client.close()
+        if clients:
             print("🔌 Client closed.")
-            self.client = None
 
-    async def get_client(self) -> AsyncElasticsearch:
-        if self.client is None:
-            await self.connect()  # <--- Await this call
-        
-        if self.client is None:
-            raise Exception("❌ CRITICAL: Could not connect to Elasticsearch.")
-            
-        return self.client
+    async def get_client(self, name: Optional[str] = None) -> AsyncElasticsearch:
+        name = name or self.current()
+        if name not in self.configs:
+            raise UnknownClusterError(name)
+        if name not in self.clients:
+            await self.connect(name)  # <--- Await this call
+
+        if name not in self.clients:
+            retry_in = max(0.0, self._retry_at.get(name, 0) - time.monotonic())
+            raise Exception(f"❌ CRITICAL: Could not connect to Elasticsearch cluster '{name}' (next attempt in {retry_in:.0f}s).")
+
+        return self.clients[name]
+
+    async def fan_out(self, fn: Callable[[], Awaitable[Any]], clusters: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Runs fn once per cluster, concurrently; returns {cluster: result or exception}."""
+        names = clusters or self.cluster_names()
+
+        async def run(name: str):
+            with self.using(name):
+                return await fn()
+
+        results = await asyncio.gather(*(run(name) for name in names), return_exceptions=True)
+        return dict(zip(names, results))
 
 # Singleton instance
-es_wrapper = ESClientWrapper()
\ No newline at end of file
+es_wrapper = ESClientWrapper()
@@ -0,0 +1,1103 @@
+import asyncio
+import fnmatch
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Set, Tuple
+from urllib.parse import urlsplit, parse_qsl, unquote
+from elastic_transport import ApiResponseMeta, HttpHeaders
+from elastic_transport._node._base import NodeApiResponse
+from elastic_transport._node._base_async import BaseAsyncNode
+
+# Query types _validate/query accepts (the search simulator itself evaluates fewer, see _matches)
+KNOWN_QUERIES = {
+    "match_all", "match_none", "match", "match_phrase", "match_phrase_prefix", "multi_match",
+    "term", "terms", "range", "exists", "ids", "prefix", "wildcard", "regexp", "fuzzy",
+    "bool", "nested", "script", "query_string", "simple_query_string",
+    "constant_score", "function_score", "dis_max"
+}
+
+RESPONSE_HEADERS = {"content-type": "application/json", "x-elastic-product": "Elasticsearch"}
+
+class SimulatedError(Exception):
+    """An Elasticsearch error response: status, error type and reason."""
+
+    def __init__(self, status: int, error_type: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.error_type = error_type
+        self.reason = reason
+
+    def body(self) -> Dict[str, Any]:
+        cause = {"type": self.error_type, "reason": self.reason}
+        return {"error": {"root_cause": [cause], **cause}, "status": self.status}
+
+def _route(methods: str, path: str, handler: str) -> Tuple[Set[str], "re.Pattern", str]:
+    return set(methods.split("|")), re.compile(path + r"/?$"), handler
+
+INDEX = r"(?P<index>[^/_][^/]*)"
+ROUTES = [
+    _route("GET|HEAD", r"/", "info"),
+    _route("GET", r"/_cat/indices(?:/" + INDEX + ")?", "cat_indices"),
+    _route("GET", r"/_cat/thread_pool(?:/(?P<pools>[^/]+))?", "cat_thread_pool"),
+    _route("GET", r"/_cluster/state/(?P<metric>[^/]+)(?:/" + INDEX + ")?", "cluster_state"),
+    _route("PUT|POST", r"/_index_template/(?P<name>[^/]+)", "put_index_template"),
+    _route("GET|POST", r"/_resolve/index/" + INDEX, "resolve_index"),
+    _route("GET", r"/_tasks", "tasks"),
+    _route("GET", r"/_tasks/(?P<task_id>[^/]+)", "get_task"),
+    _route("POST", r"/_reindex", "reindex"),
+    _route("POST", r"/_reindex/(?P<task_id>[^/]+)/_rethrottle", "rethrottle"),
+    _route("GET", r"(?:/" + INDEX + r")?/_stats(?:/(?P<metric>[^/]+))?", "stats"),
+    _route("GET|POST", r"/" + INDEX + "/_terms_enum", "terms_enum"),
+    _route("POST|PUT", r"(?:/" + INDEX + ")?/_bulk", "bulk"),
+    _route("GET|POST", r"(?:/" + INDEX + ")?/_search", "search"),
+    _route("GET|POST", r"(?:/" + INDEX + ")?/_count", "count"),
+    _route("GET|POST", r"(?:/" + INDEX + ")?/_mget", "mget"),
+    _route("GET|POST", r"(?:/" + INDEX + ")?/_validate/query", "validate_query"),
+    _route("GET|POST", r"(?:/" + INDEX + ")?/_refresh", "refresh"),
+    _route("POST", r"/" + INDEX + "/_pit", "open_pit"),
+    _route("DELETE", r"/_pit", "close_pit"),
+    _route("POST", r"/_inference(?:/(?P<task>[^/]+))?/(?P<inference_id>[^/]+)", "inference"),
+    _route("POST", r"/_aliases", "update_aliases"),
+    _route("GET|HEAD", r"(?:/" + INDEX + ")?/_alias(?:/(?P<name>[^/]+))?", "get_alias"),
+    _route("PUT|POST", r"/" + INDEX + r"/_alias(?:es)?/(?P<name>[^/]+)", "put_alias"),
+    _route("GET", r"/" + INDEX + "/_mapping", "get_mapping"),
+    _route("PUT|POST", r"/" + INDEX + "/_mapping", "put_mapping"),
+    _route("GET", r"/" + INDEX + r"/_settings(?:/(?P<name>[^/]+))?", "get_settings"),
+    _route("PUT", r"/" + INDEX + "/_settings", "put_settings"),
+    _route("PUT", r"/" + INDEX + r"/_block/(?P<block>[^/]+)", "add_block"),
+    _route("GET|HEAD", r"/" + INDEX + r"/_doc/(?P<id>[^/]+)", "get_doc"),
+    _route("PUT|POST", r"/" + INDEX + r"/(?P<op>_doc|_create)(?:/(?P<id>[^/]+))?", "index_doc"),
+    _route("DELETE", r"/" + INDEX + r"/_doc/(?P<id>[^/]+)", "delete_doc"),
+    _route("HEAD", r"/" + INDEX, "exists"),
+    _route("PUT", r"/" + INDEX, "create_index"),
+    _route("DELETE", r"/" + INDEX, "delete_index"),
+]
+
+def _flag(params: Dict[str, str], name: str) -> bool:
+    return params.get(name, "false").lower() in ("true", "")
+
+def _interval_ms(interval: str) -> int:
+    """Milliseconds in a fixed_interval like '30s' or '1h'."""
+    match = re.fullmatch(r"(\d+)(ms|s|m|h|d)", interval)
+    if not match:
+        raise SimulatedError(400, "illegal_argument_exception", f"failed to parse setting [fixed_interval] with value [{interval}]")
+    return int(match.group(1)) * {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}[match.group(2)]
+
+def _human(size: int) -> str:
+    for unit in ("b", "kb", "mb", "gb"):
+        if size < 1024:
+            return f"{size:.1f}{unit}" if unit != "b" else f"{size}b"
+        size /= 1024
+    return f"{size:.1f}tb"
+
+def _flatten(settings: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in settings.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value if value is None or isinstance(value, list) else str(value).lower() if isinstance(value, bool) else str(value)
+    return flat
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for key, value in flat.items():
+        node = nested
+        *parents, leaf = key.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return nested
+
+def _values(source: Dict[str, Any], field: str) -> List[Any]:
+    """Values of a (dotted) field in a document, as a list."""
+    node: Any = source
+    if field in source:
+        node = source[field]
+    else:
+        for part in field.split("."):
+            if not isinstance(node, dict) or part not in node:
+                return []
+            node = node[part]
+    if node is None:
+        return []
+    return node if isinstance(node, list) else [node]
+
+def _filter_source(source: Dict[str, Any], spec: Any) -> Optional[Dict[str, Any]]:
+    """Applies a _source spec (False, a list of fields or {includes, excludes}) to a document."""
+    if spec is None or spec is True:
+        return source
+    if spec is False:
+        return None
+    includes = spec if isinstance(spec, list) else spec.get("includes", [])
+    excludes = [] if isinstance(spec, list) else spec.get("excludes", [])
+    if isinstance(includes, str):
+        includes = [includes]
+    picked = {key: value for key, value in source.items() if not includes or any(
+        key == field or field.startswith(f"{key}.") or fnmatch.fnmatchcase(key, field) for field in includes
+    )}
+    return {key: value for key, value in picked.items() if not any(fnmatch.fnmatchcase(key, field) for field in excludes)}
+
+class SimulatedCluster:
+    """
+    An in-memory stand-in for one Elasticsearch cluster, for benchmarks and for
+    running the agent without an Elastic Cloud project.
+    1. The fleet is synthetic: 'indices' names, bad_share of them 'bad-mapping-*'
+       (bad_fields fields) or 'bad-ilm-*' (no index.lifecycle.name), the rest
+       with 'fields' fields. Mappings are generated on read, so 50k indices are cheap.
+    2. Indices the agent creates (history, backups, leases...) really store
+       documents; searches support the filters, sorts and aggregations it uses.
+       Reindexes run to completion at once (synthetic documents copy as a count).
+    3. Every call waits a lognormal latency (median latency_ms, spread latency_sigma;
+       inference_ms for _inference) and fails with error_rate (503) or reject_rate (429).
+    4. 'queries' searches, cheap and expensive, show up as running in the Tasks API.
+       Keyword field_<n> has 10^(1 + n % 5) distinct terms (capped by the doc count).
+    5. A 'hot_share' of logs-app indices keeps growing in real time, at a rate that
+       fills a 50GB shard within 1-60 days; the others stay the same size.
+    """
+
+    def __init__(
+        self,
+        name: str = "simulated",
+        indices: int = 10,
+        bad_share: float = 0.2,
+        fields: int = 20,
+        bad_fields: int = 600,
+        docs: int = 10000,
+        latency_ms: float = 1.0,
+        latency_sigma: float = 0.5,
+        inference_ms: float = 50.0,
+        error_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        queries: int = 0,
+        hot_share: float = 0.0,
+        seed: int = 0
+    ):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.inference_ms = inference_ms
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.rng = random.Random(seed)
+        self.started = time.monotonic()
+        self.requests: Dict[str, int] = {} # handler -> calls
+        self.indices: Dict[str, Dict[str, Any]] = {}
+        self.aliases: Dict[str, Set[str]] = {} # alias -> indices
+        self.templates: Dict[str, Dict[str, Any]] = {}
+        self.data_streams: Set[str] = set()
+        self.reindex_tasks: Dict[str, Dict[str, Any]] = {} # task id -> finished reindex
+        self.pits: Dict[str, str] = {} # point-in-time id -> index expression
+
+        bad = round(indices * bad_share)
+        for i in range(indices):
+            if i < bad:
+                kind = "bad-mapping" if i % 2 == 0 else "bad-ilm"
+            else:
+                kind = "logs-app"
+            count = self.rng.randint(docs // 2, docs * 2)
+            self.indices[f"{kind}-{i:05d}"] = {
+                "fields": bad_fields if kind == "bad-mapping" else fields,
+                "docs": count,
+                "size": count * 512,
+                "lifecycle": None if kind == "bad-ilm" else "logs",
+                "version": 1
+            }
+            if kind == "logs-app" and hot_share and self.rng.random() < hot_share:
+                days = self.rng.uniform(1, 60)
+                self.indices[f"{kind}-{i:05d}"]["growth"] = (50 * 1024 ** 3 - count * 512) / (days * 86400) # Bytes/sec
+
+        shapes = [
+            {"query": {"term": {"field_0000": "value"}}},
+            {"query": {"wildcard": {"message": "*timeout*"}}},
+            {"query": {"regexp": {"field_0003": ".*-prod"}}},
+            {"query": {"script": {"script": "doc['field_0001'].value.length() > 3"}}},
+            {"from": 10000, "size": 50, "query": {"match_all": {}}},
+            {"size": 0, "aggs": {"top": {"terms": {"field": "field_0004", "size": 10}}}},
+            {"query": {"nested": {"path": "events", "query": {"term": {"events.type": "login"}}}}}
+        ]
+        targets = [name for name in self.indices if name.startswith("logs-app")] or list(self.indices)
+        self.queries = [
+            (self.rng.choice(targets + ["logs-app-*"]) if targets else "logs-app-*", shapes[i % len(shapes)])
+            for i in range(queries)
+        ]
+
+    # ---------------------------------------------------------
+    # Dispatch
+    # ---------------------------------------------------------
+    def delay(self, handler: str) -> float:
+        median = self.inference_ms if handler == "inference" else self.latency_ms
+        if median <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(median), self.latency_sigma) / 1000
+
+    def fault(self, handler: str) -> Optional[SimulatedError]:
+        if handler == "info":
+            return None # Health checks stay reliable so clients connect; faults hit API calls
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            return SimulatedError(503, "unavailable_shards_exception", "Simulated node failure.")
+        if roll < self.error_rate + self.reject_rate:
+            return SimulatedError(429, "es_rejected_execution_exception", "Simulated rejection: queue full.")
+        return None
+
+    def match(self, method: str, path: str) -> Tuple[Optional[str], Dict[str, str]]:
+        for methods, pattern, handler in ROUTES:
+            if method in methods:
+                found = pattern.match(path)
+                if found:
+                    return handler, {k: unquote(v) for k, v in found.groupdict().items() if v is not None}
+        return None, {}
+
+    def handle(self, method: str, target: str, body: Optional[bytes]) -> Tuple[int, Any]:
+        """Runs one request against the in-memory state; returns (status, JSON body)."""
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+        handler, path = self.match(method, url.path)
+        if handler is None:
+            error = SimulatedError(400, "illegal_argument_exception", f"{method} {url.path} is not supported by the simulator.")
+            return error.status, error.body()
+        self.requests[handler] = self.requests.get(handler, 0) + 1
+        try:
+            if handler == "bulk":
+                payload = [json.loads(line) for line in (body or b"").splitlines() if line.strip()]
+            else:
+                payload = json.loads(body) if body else {}
+            return getattr(self, f"_{handler}")(params, payload, **path)
+        except SimulatedError as e:
+            return e.status, e.body()
+
+    # ---------------------------------------------------------
+    # Index resolution
+    # ---------------------------------------------------------
+    def _hidden(self, name: str) -> bool:
+        return name.startswith(".") or self.indices[name].get("settings", {}).get("index.hidden") == "true"
+
+    def resolve(self, expression: Optional[str], params: Dict[str, str], default_wildcards: str = "open") -> List[str]:
+        """Concrete indices behind a comma-separated list of names, aliases, data streams and patterns."""
+        expand = params.get("expand_wildcards", default_wildcards)
+        ignore_unavailable = _flag(params, "ignore_unavailable")
+        names: List[str] = []
+        for part in (expression or "_all").split(","):
+            if part in ("_all", "*"):
+                part = "*"
+            if "*" in part:
+                matched = [
+                    name for name in self.indices
+                    if fnmatch.fnmatchcase(name, part) and (
+                        "all" in expand or "hidden" in expand or part.startswith(".") or not self._hidden(name)
+                    )
+                ]
+                matched += [name for alias, members in self.aliases.items() if fnmatch.fnmatchcase(alias, part) for name in members]
+                names.extend(matched)
+            elif part in self.indices:
+                names.append(part)
+            elif part in self.aliases:
+                names.extend(sorted(self.aliases[part]))
+            elif not ignore_unavailable:
+                raise SimulatedError(404, "index_not_found_exception", f"no such index [{part}]")
+        return list(dict.fromkeys(names))
+
+    def _require(self, index: str) -> Dict[str, Any]:
+        entry = self.indices.get(index)
+        if entry is None:
+            raise SimulatedError(404, "index_not_found_exception", f"no such index [{index}]")
+        return entry
+
+    def _create(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        template = next((t for t in self.templates.values() if any(
+            fnmatch.fnmatchcase(index, pattern) for pattern in t.get("index_patterns", [])
+        )), {})
+        inherited = template.get("template", {})
+        entry = self.indices[index] = {
+            "fields": 0,
+            "docs": 0,
+            "size": 0,
+            "lifecycle": None,
+            "version": 1,
+            "mappings": body.get("mappings") or inherited.get("mappings") or {},
+            "settings": _flatten({**_flatten(inherited.get("settings", {})), **_flatten(body.get("settings", {}))}),
+            "store": {},
+            "seq_no": -1
+        }
+        for key, value in list(entry["settings"].items()):
+            if not key.startswith("index."):
+                entry["settings"][f"index.{key}"] = entry["settings"].pop(key)
+        if "data_stream" in template:
+            self.data_streams.add(index)
+        for alias in body.get("aliases", {}):
+            self.aliases.setdefault(alias, set()).add(index)
+        return entry
+
+    # ---------------------------------------------------------
+    # Cluster & cat APIs
+    # ---------------------------------------------------------
+    def _info(self, params, body):
+        return 200, {
+            "name": f"{self.name}-node-0",
+            "cluster_name": self.name,
+            "cluster_uuid": "simulated",
+            "version": {"number": "9.0.0", "build_flavor": "default", "lucene_version": "10.1.0"},
+            "tagline": "You Know, for Search"
+        }
+
+    def _size(self, entry: Dict[str, Any]) -> int:
+        return int(entry["size"] + entry.get("growth", 0) * (time.monotonic() - self.started))
+
+    def _docs(self, entry: Dict[str, Any]) -> int:
+        # Synthetic docs are ~512 bytes each, so hot indices gain docs as they grow
+        grown = entry.get("growth", 0) * (time.monotonic() - self.started) / 512
+        return int(entry["docs"] + grown) + len(entry.get("store", {}))
+
+    def _cat_indices(self, params, body, index=None):
+        columns = params.get("h", "health,status,index,uuid,pri,rep,docs.count,store.size").split(",")
+        raw = params.get("bytes") is not None
+        rows = []
+        for name in self.resolve(index, params, default_wildcards="all"):
+            entry = self.indices[name]
+            values = {
+                "health": "green", "status": "open", "index": name, "uuid": name, "pri": "1", "rep": "1",
+                "docs.count": str(self._docs(entry)),
+                "store.size": str(self._size(entry)) if raw else _human(self._size(entry)),
+                "pri.store.size": str(self._size(entry)) if raw else _human(self._size(entry))
+            }
+            rows.append({column: values.get(column) for column in columns})
+        return 200, rows
+
+    def _cat_thread_pool(self, params, body, pools="write,search"):
+        columns = params.get("h", "node_name,name,active,queue,rejected").split(",")
+        rows = [
+            {"node_name": f"{self.name}-node-0", "name": pool, "active": "0", "queue": "0", "rejected": "0"}
+            for pool in pools.split(",")
+        ]
+        return 200, [{column: row.get(column) for column in columns} for row in rows]
+
+    def _cluster_state(self, params, body, metric, index=None):
+        names = self.resolve(index, params, default_wildcards="all")
+        return 200, {
+            "cluster_name": self.name,
+            "metadata": {"indices": {name: {"mappings_version": self.indices[name]["version"]} for name in names}}
+        }
+
+    def _put_index_template(self, params, body, name):
+        self.templates[name] = body
+        return 200, {"acknowledged": True}
+
+    def _resolve_index(self, params, body, index):
+        names = self.resolve(index, {**params, "ignore_unavailable": "true"}, default_wildcards="all")
+        return 200, {
+            "indices": [{"name": name, "attributes": ["open"]} for name in names if name not in self.data_streams],
+            "aliases": [{"name": alias, "indices": sorted(members)} for alias, members in self.aliases.items() if alias in index.split(",")],
+            "data_streams": [
+                {"name": name, "backing_indices": [f".ds-{name}-000001"], "timestamp_field": "@timestamp"}
+                for name in names if name in self.data_streams
+            ]
+        }
+
+    def _tasks(self, params, body):
+        tasks = []
+        for i, (index, query) in enumerate(self.queries):
+            description = f"indices[{index}], search_type[QUERY_THEN_FETCH], source[{json.dumps(query, separators=(',', ':'))}]"
+            tasks.append({"node": f"{self.name}-node-0", "id": 2 * i, "action": "indices:data/read/search", "description": description})
+            # Its per-shard child, as ES lists it too
+            tasks.append({"node": f"{self.name}-node-0", "id": 2 * i + 1, "action": "indices:data/read/search[phase/query]",
+                          "description": f"shardId[[{index}][0]]", "parent_task_id": f"{self.name}-node-0:{2 * i}"})
+        return 200, {"tasks": tasks}
+
+    def _stats(self, params, body, index=None, metric=None):
+        indices = {}
+        for name in self.resolve(index, params):
+            entry = self.indices[name]
+            indices[name] = {"primaries": {"docs": {"count": self._docs(entry), "deleted": 0}, "store": {"size_in_bytes": self._size(entry)}}}
+            if params.get("level") == "shards":
+                seq_no = entry.get("seq_no", -1)
+                indices[name]["shards"] = {"0": [{
+                    "routing": {"state": "STARTED", "primary": True, "node": f"{self.name}-node-0"},
+                    "docs": indices[name]["primaries"]["docs"],
+                    "seq_no": {"max_seq_no": seq_no, "local_checkpoint": seq_no, "global_checkpoint": seq_no}
+                }]}
+        total = {
+            "docs": {"count": sum(i["primaries"]["docs"]["count"] for i in indices.values()), "deleted": 0},
+            "store": {"size_in_bytes": sum(i["primaries"]["store"]["size_in_bytes"] for i in indices.values())}
+        }
+        return 200, {"_all": {"primaries": total, "total": total}, "indices": indices}
+
+    def _terms_enum(self, params, body, index):
+        field = body.get("field") or params.get("field")
+        size = int(body.get("size", params.get("size", 10)))
+        names = self.resolve(index, params)
+        kind = next((self._mapping(name).get("properties", {}).get(field, {}).get("type") for name in names), None)
+        if kind not in ("keyword", "constant_keyword", "wildcard", "flattened", "version", "ip"):
+            raise SimulatedError(400, "illegal_argument_exception", f"Can't use field [{field}] with terms_enum: only keyword-family fields are supported")
+        stored = {v for name in names for doc in self.indices[name].get("store", {}).values() for v in _values(doc["_source"], field)}
+        distinct = len(stored)
+        if field.startswith("field_") and field[6:].isdigit():
+            docs = sum(self.indices[name]["docs"] for name in names)
+            distinct += min(docs, 10 ** (1 + int(field[6:]) % 5))
+        terms = sorted(map(str, stored))[:size] + [f"term-{i:07d}" for i in range(max(0, min(size, distinct) - len(stored)))]
+        return 200, {"_shards": {"total": len(names), "successful": len(names), "failed": 0}, "terms": terms, "complete": True} # Like ES: 'size' cutting the list short isn't incomplete
+
+    # ---------------------------------------------------------
+    # Index management
+    # ---------------------------------------------------------
+    def _exists(self, params, body, index):
+        try:
+            return 200 if self.resolve(index, params) else 404, None
+        except SimulatedError:
+            return 404, None
+
+    def _create_index(self, params, body, index):
+        if index in self.indices:
+            raise SimulatedError(400, "resource_already_exists_exception", f"index [{index}] already exists")
+        self._create(index, body)
+        return 200, {"acknowledged": True, "shards_acknowledged": True, "index": index}
+
+    def _delete_index(self, params, body, index):
+        for name in self.resolve(index, params):
+            del self.indices[name]
+            self.data_streams.discard(name)
+            for members in self.aliases.values():
+                members.discard(name)
+        self.aliases = {alias: members for alias, members in self.aliases.items() if members}
+        return 200, {"acknowledged": True}
+
+    def _refresh(self, params, body, index=None):
+        count = len(self.resolve(index, params))
+        return 200, {"_shards": {"total": count, "successful": count, "failed": 0}}
+
+    def _open_pit(self, params, body, index):
+        # Searches through it see live documents: enough for paging, not a true snapshot
+        pit_id = uuid.uuid4().hex
+        self.pits[pit_id] = ",".join(self.resolve(index, params))
+        return 200, {"id": pit_id}
+
+    def _close_pit(self, params, body):
+        freed = self.pits.pop(body.get("id"), None) is not None
+        return 200, {"succeeded": True, "num_freed": int(freed)}
+
+    def _mapping(self, name: str) -> Dict[str, Any]:
+        entry = self.indices[name]
+        if "mappings" in entry:
+            return entry["mappings"]
+        properties = {"@timestamp": {"type": "date"}, "message": {"type": "text"}}
+        for i in range(max(entry["fields"] - len(properties), 0)):
+            properties[f"field_{i:04d}"] = {"type": "keyword"}
+        return {"properties": properties}
+
+    def _get_mapping(self, params, body, index):
+        return 200, {name: {"mappings": self._mapping(name)} for name in self.resolve(index, params)}
+
+    def _put_mapping(self, params, body, index):
+        names = self.resolve(index, params)
+        for name in names:
+            current = self._mapping(name)
+            properties = dict(current.get("properties", {}))
+            for field, spec in body.get("properties", {}).items():
+                existing = properties.get(field)
+                if existing and "type" in spec and existing.get("type", "object") != spec["type"]:
+                    raise SimulatedError(
+                        400, "illegal_argument_exception",
+                        f"mapper [{field}] cannot be changed from type [{existing.get('type', 'object')}] to [{spec['type']}]"
+                    )
+                properties[field] = {**(existing or {}), **spec}
+            entry = self.indices[name]
+            entry["mappings"] = {**current, **{k: v for k, v in body.items() if k != "properties"}, "properties": properties}
+            entry["version"] += 1
+        return 200, {"acknowledged": True}
+
+    def _settings(self, name: str) -> Dict[str, Any]:
+        entry = self.indices[name]
+        if "settings" not in entry:
+            # Synthetic index: defaults until someone changes them
+            entry_settings = {
+                "index.number_of_shards": "1",
+                "index.number_of_replicas": "1",
+                "index.provided_name": name,
+                "index.uuid": name,
+                "index.creation_date": "0"
+            }
+            if entry["lifecycle"]:
+                entry_settings["index.lifecycle.name"] = entry["lifecycle"]
+            return entry_settings
+        return {"index.number_of_shards": "1", "index.number_of_replicas": "1", "index.provided_name": name, **entry["settings"]}
+
+    def _get_settings(self, params, body, index, name=None):
+        result = {}
+        for index_name in self.resolve(index, params):
+            flat = {
+                key: value for key, value in self._settings(index_name).items()
+                if name is None or any(fnmatch.fnmatchcase(key, pattern) for pattern in name.split(","))
+            }
+            result[index_name] = {"settings": flat if _flag(params, "flat_settings") else _nest(flat)}
+        return 200, result
+
+    def _put_settings(self, params, body, index):
+        changes = _flatten(body.get("settings", body))
+        for name in self.resolve(index, params):
+            current = self._settings(name)
+            for key, value in changes.items():
+                key = key if key.startswith("index.") else f"index.{key}"
+                if value is None:
+                    current.pop(key, None)
+                else:
+                    current[key] = value
+            self.indices[name]["settings"] = current
+        return 200, {"acknowledged": True}
+
+    def _add_block(self, params, body, index, block):
+        self._put_settings(params, {f"index.blocks.{block}": True}, index)
+        return 200, {"acknowledged": True, "shards_acknowledged": True, "indices": []}
+
+    # ---------------------------------------------------------
+    # Aliases
+    # ---------------------------------------------------------
+    def _get_alias(self, params, body, index=None, name=None):
+        names = self.resolve(index, params) if index else sorted(
+            {member for alias, members in self.aliases.items() if name is None or fnmatch.fnmatchcase(alias, name) for member in members}
+        )
+        result = {}
+        for index_name in names:
+            aliases = {
+                alias: {} for alias, members in self.aliases.items()
+                if index_name in members and (name is None or any(fnmatch.fnmatchcase(alias, n) for n in name.split(",")))
+            }
+            if aliases or name is None:
+                result[index_name] = {"aliases": aliases}
+        if name is not None and not result:
+            return 404, {"error": f"alias [{name}] missing", "status": 404}
+        return 200, result
+
+    def _put_alias(self, params, body, index, name):
+        for index_name in self.resolve(index, params):
+            self.aliases.setdefault(name, set()).add(index_name)
+        return 200, {"acknowledged": True}
+
+    def _update_aliases(self, params, body):
+        for action in body.get("actions", []):
+            (kind, spec), = action.items()
+            indices = self.resolve(spec.get("index") or ",".join(spec.get("indices", [])), {})
+            aliases = [spec["alias"]] if "alias" in spec else spec.get("aliases", [])
+            if kind == "add":
+                for alias in aliases:
+                    self.aliases.setdefault(alias, set()).update(indices)
+            elif kind == "remove":
+                for alias in aliases:
+                    self.aliases.get(alias, set()).difference_update(indices)
+            elif kind == "remove_index":
+                self._delete_index({}, {}, ",".join(indices))
+        self.aliases = {alias: members for alias, members in self.aliases.items() if members}
+        return 200, {"acknowledged": True}
+
+    # ---------------------------------------------------------
+    # Documents
+    # ---------------------------------------------------------
+    def _store(self, index: str, create: bool = True) -> Dict[str, Any]:
+        entry = self.indices.get(index)
+        if entry is None:
+            if not create:
+                raise SimulatedError(404, "index_not_found_exception", f"no such index [{index}]")
+            entry = self._create(index, {}) # Auto-created on first write
+        entry.setdefault("store", {})
+        entry.setdefault("seq_no", -1)
+        return entry
+
+    @staticmethod
+    def _check_writable(index: str, entry: Dict[str, Any]):
+        if entry.get("settings", {}).get("index.blocks.write") == "true":
+            raise SimulatedError(403, "cluster_block_exception", f"index [{index}] blocked by: [FORBIDDEN/8/index write (api)];")
+
+    @staticmethod
+    def _check_dynamic(index: str, entry: Dict[str, Any], source: Dict[str, Any]):
+        mappings = entry.get("mappings") or {}
+        if mappings.get("dynamic") != "strict":
+            return
+        unmapped = next((field for field in source if field not in mappings.get("properties", {})), None)
+        if unmapped is not None:
+            raise SimulatedError(
+                400, "strict_dynamic_mapping_exception",
+                f"[1:2] mapping set to strict, dynamic introduction of [{unmapped}] within [_doc] is not allowed"
+            )
+
+    def _write(self, op: str, index: str, doc_id: Optional[str], source: Dict[str, Any], meta: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """One document write (index/create/update/delete); returns (status, item result)."""
+        if index in self.data_streams and op != "create":
+            raise SimulatedError(400, "illegal_argument_exception", f"only write ops with an op_type of create are allowed in data streams")
+        entry = self._store(index, create=op != "delete")
+        self._check_writable(index, entry)
+        if op != "delete":
+            self._check_dynamic(index, entry, source.get("doc", source) if op == "update" else source)
+        store = entry["store"]
+        doc_id = doc_id or uuid.uuid4().hex[:20]
+        existing = store.get(doc_id)
+
+        if "if_seq_no" in meta and (existing is None or existing["_seq_no"] != int(meta["if_seq_no"])):
+            raise SimulatedError(409, "version_conflict_engine_exception", f"[{doc_id}]: version conflict, required seqNo [{meta['if_seq_no']}]")
+        if op == "create" and existing is not None:
+            raise SimulatedError(409, "version_conflict_engine_exception", f"[{doc_id}]: version conflict, document already exists")
+        external = meta.get("version_type") in ("external", "external_gte") and "version" in meta
+        if external and existing is not None and existing["_version"] >= int(meta["version"]):
+            raise SimulatedError(
+                409, "version_conflict_engine_exception",
+                f"[{doc_id}]: version conflict, current version [{existing['_version']}] is higher or equal to the one provided [{meta['version']}]"
+            )
+        if op == "delete":
+            if existing is None:
+                return 404, {"_index": index, "_id": doc_id, "result": "not_found"}
+            del store[doc_id]
+            return 200, {"_index": index, "_id": doc_id, "result": "deleted"}
+        if op == "update":
+            if existing is None:
+                if "upsert" not in source and not source.get("doc_as_upsert"):
+                    raise SimulatedError(404, "document_missing_exception", f"[{doc_id}]: document missing")
+                source = source.get("upsert", source.get("doc", {}))
+            else:
+                source = {**existing["_source"], **source.get("doc", {})}
+
+        entry["seq_no"] += 1
+        version = int(meta["version"]) if external else existing["_version"] + 1 if existing else 1
+        store[doc_id] = {"_source": source, "_seq_no": entry["seq_no"], "_version": version}
+        return (200 if existing else 201), {
+            "_index": index, "_id": doc_id, "_version": version,
+            "result": "updated" if existing else "created",
+            "_seq_no": entry["seq_no"], "_primary_term": 1
+        }
+
+    def _bulk(self, params, body, index=None):
+        items = []
+        lines = iter(body)
+        for action in lines:
+            (op, meta), = action.items()
+            source = next(lines) if op != "delete" else {}
+            target = meta.get("_index", index)
+            try:
+                status, result = self._write(op, target, meta.get("_id"), source, meta)
+                items.append({op: {**result, "status": status}})
+            except SimulatedError as e:
+                items.append({op: {"_index": target, "_id": meta.get("_id"), "status": e.status, "error": {"type": e.error_type, "reason": e.reason}}})
+        errors = any(item[next(iter(item))]["status"] >= 300 and "error" in item[next(iter(item))] for item in items)
+        return 200, {"took": 1, "errors": errors, "items": items}
+
+    def _index_doc(self, params, body, index, op, id=None):
+        meta = {key: params[key] for key in ("if_seq_no", "if_primary_term", "version", "version_type") if key in params}
+        kind = "create" if op == "_create" or params.get("op_type") == "create" else "index"
+        return self._write(kind, index, id, body, meta)
+
+    def _get_doc(self, params, body, index, id):
+        doc = self._store(index, create=False)["store"].get(id)
+        if doc is None:
+            return 404, {"_index": index, "_id": id, "found": False}
+        return 200, {"_index": index, "_id": id, "found": True, "_primary_term": 1, **doc}
+
+    def _delete_doc(self, params, body, index, id):
+        meta = {key: params[key] for key in ("if_seq_no",) if key in params}
+        return self._write("delete", index, id, {}, meta)
+
+    def _mget(self, params, body, index=None):
+        requests = body.get("docs") or [{"_index": index, "_id": doc_id} for doc_id in body.get("ids", [])]
+        docs = []
+        for request in requests:
+            target = request.get("_index", index)
+            doc = self.indices.get(target, {}).get("store", {}).get(request["_id"])
+            if doc is None:
+                docs.append({"_index": target, "_id": request["_id"], "found": False})
+            else:
+                docs.append({"_index": target, "_id": request["_id"], "found": True, "_primary_term": 1, **doc})
+        return 200, {"docs": docs}
+
+    # ---------------------------------------------------------
+    # Search
+    # ---------------------------------------------------------
+    def _matches(self, query: Optional[Dict[str, Any]], doc_id: str, source: Dict[str, Any], seq_no: Optional[int] = None) -> bool:
+        if not query:
+            return True
+        (kind, spec), = query.items()
+        if kind == "match_all":
+            return True
+        if kind == "match_none":
+            return False
+        if kind == "bool":
+            def clauses(name):
+                value = spec.get(name, [])
+                return value if isinstance(value, list) else [value]
+            if not all(self._matches(q, doc_id, source, seq_no) for q in clauses("must") + clauses("filter")):
+                return False
+            if any(self._matches(q, doc_id, source, seq_no) for q in clauses("must_not")):
+                return False
+            should = clauses("should")
+            required = spec.get("minimum_should_match", 0 if clauses("must") or clauses("filter") else 1 if should else 0)
+            return sum(self._matches(q, doc_id, source, seq_no) for q in should) >= int(required)
+        if kind in ("constant_score", "function_score"):
+            return self._matches(spec.get("filter", spec.get("query")), doc_id, source, seq_no)
+        if kind == "ids":
+            return doc_id in spec.get("values", [])
+        if kind == "exists":
+            return bool(_values(source, spec["field"]))
+        (field, value), = spec.items()
+        values = ([] if seq_no is None else [seq_no]) if field == "_seq_no" else _values(source, field)
+        if kind == "term":
+            return (value.get("value") if isinstance(value, dict) else value) in values
+        if kind == "terms":
+            return any(v in values for v in value)
+        if kind == "range":
+            checks = {"gte": lambda a, b: a >= b, "gt": lambda a, b: a > b, "lte": lambda a, b: a <= b, "lt": lambda a, b: a < b}
+            return any(all(checks[op](v, bound) for op, bound in value.items() if op in checks) for v in values)
+        if kind == "prefix":
+            prefix = value.get("value") if isinstance(value, dict) else value
+            return any(isinstance(v, str) and v.startswith(prefix) for v in values)
+        raise SimulatedError(400, "illegal_argument_exception", f"Query [{kind}] is not supported by the simulator's search.")
+
+    @staticmethod
+    def _sort_spec(sort: Any) -> List[Tuple[str, bool]]:
+        """[(field, descending)] from a sort clause."""
+        spec = []
+        for clause in sort if isinstance(sort, list) else [sort]:
+            if isinstance(clause, str):
+                spec.append((clause, False))
+            else:
+                (field, options), = clause.items()
+                order = options if isinstance(options, str) else options.get("order", "asc")
+                spec.append((field, order == "desc"))
+        return spec
+
+    def _hits(self, index: Optional[str], params: Dict[str, str], query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        hits = []
+        for name in self.resolve(index, params):
+            for doc_id, doc in self.indices[name].get("store", {}).items():
+                if self._matches(query, doc_id, doc["_source"], doc["_seq_no"]):
+                    hits.append({"_index": name, "_id": doc_id, **doc})
+        return hits
+
+    def _aggregate(self, aggs: Dict[str, Any], hits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        result = {}
+        for name, spec in aggs.items():
+            kind = next(k for k in spec if k != "aggs")
+            body = spec[kind]
+            if kind in ("min", "max", "sum", "value_count", "avg"):
+                values = [v for hit in hits for v in _values(hit["_source"], body["field"])]
+                if kind == "value_count":
+                    result[name] = {"value": len(values)}
+                elif kind == "sum":
+                    result[name] = {"value": float(sum(values))}
+                else:
+                    fn = {"min": min, "max": max, "avg": lambda v: sum(v) / len(v)}[kind]
+                    result[name] = {"value": float(fn(values)) if values else None}
+            elif kind == "stats":
+                values = [v for hit in hits for v in _values(hit["_source"], body["field"])]
+                result[name] = {
+                    "count": len(values),
+                    "min": float(min(values)) if values else None,
+                    "max": float(max(values)) if values else None,
+                    "avg": sum(values) / len(values) if values else None,
+                    "sum": float(sum(values))
+                }
+            elif kind == "filter":
+                group = [hit for hit in hits if self._matches(body, hit["_id"], hit["_source"])]
+                result[name] = {"doc_count": len(group), **self._aggregate(spec.get("aggs", {}), group)}
+            elif kind in ("histogram", "date_histogram"):
+                interval = body["interval"] if kind == "histogram" else _interval_ms(body["fixed_interval"])
+                groups: Dict[Any, List[Dict[str, Any]]] = {}
+                for hit in hits:
+                    for value in _values(hit["_source"], body["field"]):
+                        key = value // interval * interval
+                        groups.setdefault(float(key) if kind == "histogram" else int(key), []).append(hit)
+                # Empty buckets are left out, as with min_doc_count >= 1
+                result[name] = {"buckets": [
+                    {"key": key, "doc_count": len(groups[key]), **self._aggregate(spec.get("aggs", {}), groups[key])}
+                    for key in sorted(groups)
+                ]}
+            elif kind == "range":
+                buckets = []
+                for bounds in body["ranges"]:
+                    low, high = bounds.get("from"), bounds.get("to")
+                    group = [
+                        hit for hit in hits
+                        if any((low is None or v >= low) and (high is None or v < high) for v in _values(hit["_source"], body["field"]))
+                    ]
+                    key = bounds.get("key", f"{'*' if low is None else float(low)}-{'*' if high is None else float(high)}")
+                    buckets.append({"key": key, "doc_count": len(group), **self._aggregate(spec.get("aggs", {}), group)})
+                result[name] = {"buckets": buckets}
+            elif kind == "terms":
+                counts: Dict[Any, List[Dict[str, Any]]] = {}
+                for hit in hits:
+                    for value in _values(hit["_source"], body["field"]):
+                        counts.setdefault(value, []).append(hit)
+                ranked = sorted(counts.items(), key=lambda item: (-len(item[1]), str(item[0])))[:body.get("size", 10)]
+                result[name] = {"buckets": [
+                    {"key": key, "doc_count": len(group), **self._aggregate(spec.get("aggs", {}), group)} for key, group in ranked
+                ]}
+            elif kind == "composite":
+                members: Dict[Tuple, List[Dict[str, Any]]] = {}
+                sources = [next(iter(source.items())) for source in body["sources"]]
+                for hit in hits:
+                    combos = [()]
+                    for _, source in sources:
+                        values = _values(hit["_source"], source["terms"]["field"])
+                        combos = [combo + (value,) for combo in combos for value in values]
+                    for combo in combos:
+                        members.setdefault(combo, []).append(hit)
+                keys = sorted(members)
+                if "after" in body:
+                    after = tuple(body["after"][source_name] for source_name, _ in sources)
+                    keys = [key for key in keys if key > after]
+                page = keys[:body.get("size", 10)]
+                buckets = [
+                    {
+                        "key": dict(zip([n for n, _ in sources], key)),
+                        "doc_count": len(members[key]),
+                        **self._aggregate(spec.get("aggs", {}), members[key])
+                    }
+                    for key in page
+                ]
+                result[name] = {"buckets": buckets, **({"after_key": buckets[-1]["key"]} if buckets else {})}
+            else:
+                raise SimulatedError(400, "illegal_argument_exception", f"Aggregation [{kind}] is not supported by the simulator.")
+        return result
+
+    def _search(self, params, body, index=None):
+        if "pit" in body:
+            index = self.pits.get(body["pit"]["id"])
+            if index is None:
+                raise SimulatedError(404, "search_context_missing_exception", f"No search context found for id [{body['pit']['id']}]")
+        query = body.get("query")
+        hits = self._hits(index, params, query)
+        size = int(body.get("size", params.get("size", 10)))
+        start = int(body.get("from", params.get("from", 0)))
+
+        sort = self._sort_spec(body["sort"]) if "sort" in body else []
+        if sort:
+            def sort_values(hit, field):
+                return [hit["_seq_no"]] if field in ("_shard_doc", "_seq_no") else _values(hit["_source"], field)
+            for field, descending in reversed(sort):
+                present = [hit for hit in hits if sort_values(hit, field)]
+                missing = [hit for hit in hits if not sort_values(hit, field)]
+                present.sort(key=lambda hit: sort_values(hit, field)[0], reverse=descending)
+                hits = present + missing # Missing values sort last either way
+            for hit in hits:
+                hit["sort"] = [(sort_values(hit, field) or [None])[0] for field, _ in sort]
+            if "search_after" in body:
+                after = body["search_after"]
+                def beyond(hit):
+                    for (field, descending), value, bound in zip(sort, hit["sort"], after):
+                        if value == bound:
+                            continue
+                        if value is None or bound is None:
+                            return value is None
+                        return value < bound if descending else value > bound
+                    return False
+                hits = [hit for hit in hits if beyond(hit)]
+
+        total = len(hits)
+        if not total and query in (None, {"match_all": {}}):
+            # Synthetic indices hold no documents, but report their doc counts
+            total = sum(self.indices[name]["docs"] for name in self.resolve(index, params))
+        page = []
+        for hit in hits[start:start + size]:
+            item = {"_index": hit["_index"], "_id": hit["_id"], "_score": None if sort else 1.0}
+            source = _filter_source(hit["_source"], body.get("_source"))
+            if source is not None:
+                item["_source"] = source
+            if sort:
+                item["sort"] = hit["sort"]
+            if _flag(params, "seq_no_primary_term") or body.get("seq_no_primary_term"):
+                item.update(_seq_no=hit["_seq_no"], _primary_term=1)
+            page.append(item)
+
+        response = {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {"total": {"value": total, "relation": "eq"}, "max_score": None, "hits": page}
+        }
+        if "pit" in body:
+            response["pit_id"] = body["pit"]["id"]
+        if body.get("aggs") or body.get("aggregations"):
+            response["aggregations"] = self._aggregate(body.get("aggs") or body.get("aggregations"), hits)
+        return 200, response
+
+    def _count(self, params, body, index=None):
+        _, response = self._search(params, {"query": body.get("query"), "size": 0}, index)
+        return 200, {"count": response["hits"]["total"]["value"], "_shards": response["_shards"]}
+
+    def _validate_query(self, params, body, index=None):
+        names = self.resolve(index, params)
+
+        def invalid(query: Any) -> Optional[str]:
+            if not isinstance(query, dict) or len(query) != 1:
+                return "query malformed, must start with a single query name"
+            (kind, spec), = query.items()
+            if kind not in KNOWN_QUERIES:
+                return f"unknown query [{kind}]"
+            if kind == "bool":
+                for clause in ("must", "filter", "should", "must_not"):
+                    nested = spec.get(clause, [])
+                    for q in nested if isinstance(nested, list) else [nested]:
+                        reason = invalid(q)
+                        if reason:
+                            return reason
+            return None
+
+        reason = invalid(body.get("query", {"match_all": {}}))
+        response = {"valid": reason is None, "_shards": {"total": len(names), "successful": len(names), "failed": 0}}
+        if _flag(params, "explain"):
+            response["explanations"] = [
+                {"index": name, "valid": reason is None, **({"error": reason} if reason else {"explanation": json.dumps(body.get("query"))})}
+                for name in names
+            ]
+        return 200, response
+
+    # ---------------------------------------------------------
+    # Reindex
+    # ---------------------------------------------------------
+    def _copy(self, source: Dict[str, Any], dest: Dict[str, Any], max_docs: Optional[int], proceed: bool) -> Dict[str, Any]:
+        """
+        Runs one reindex to completion and returns its response. Stored documents are
+        copied one by one; synthetic ones only as a count, and only by queries that
+        match a document without fields (they have no source to match against).
+        """
+        status = {"total": 0, "created": 0, "updated": 0, "deleted": 0, "batches": 0, "version_conflicts": 0, "noops": 0}
+        failures: List[Dict[str, Any]] = []
+        query = source.get("query")
+        target = dest["index"]
+        op = "create" if dest.get("op_type") == "create" else "index"
+        limit = math.inf if max_docs is None else max_docs
+        indices = source["index"] if isinstance(source["index"], str) else ",".join(source["index"])
+
+        def fail(doc_id: Optional[str], error: SimulatedError):
+            failures.append({"index": target, "id": doc_id, "cause": {"type": error.error_type, "reason": error.reason}, "status": error.status})
+
+        for name in self.resolve(indices, {}):
+            entry = self.indices[name]
+            for doc_id, doc in list(entry.get("store", {}).items()):
+                if status["total"] >= limit or failures:
+                    break
+                if not self._matches(query, doc_id, doc["_source"], doc["_seq_no"]):
+                    continue
+                status["total"] += 1
+                try:
+                    meta = {"version": doc["_version"], "version_type": dest["version_type"]} if dest.get("version_type") in ("external", "external_gte") else {}
+                    _, result = self._write(op, target, doc_id, _filter_source(doc["_source"], source.get("_source")) or {}, meta)
+                    status[result["result"]] += 1
+                except SimulatedError as e:
+                    if e.status == 409 and proceed:
+                        status["version_conflicts"] += 1
+                    else:
+                        fail(doc_id, e) # Like ES, the first failed batch aborts the reindex
+
+            synthetic = int(min(entry.get("docs", 0), limit - status["total"]))
+            if failures or synthetic <= 0 or not self._matches(query, "", {}):
+                continue
+            copy = self._store(target)
+            try:
+                self._check_writable(target, copy)
+            except SimulatedError as e:
+                fail(None, e)
+                continue
+            already = min(copy["docs"], synthetic)
+            if op == "create" and already and not proceed:
+                fail(None, SimulatedError(409, "version_conflict_engine_exception", "version conflict, document already exists"))
+                continue
+            status["total"] += synthetic
+            status["created"] += synthetic - already
+            status["version_conflicts" if op == "create" else "updated"] += already
+            copy["docs"] = max(copy["docs"], synthetic)
+
+        status["batches"] = max(1, math.ceil(status["total"] / 1000))
+        return {
+            "took": 1, "timed_out": False, **status,
+            "retries": {"bulk": 0, "search": 0}, "throttled_millis": 0, "requests_per_second": -1.0, "failures": failures
+        }
+
+    def _reindex(self, params, body):
+        max_docs = body.get("max_docs", params.get("max_docs"))
+        proceed = (body.get("conflicts") or params.get("conflicts")) == "proceed"
+        response = self._copy(body["source"], body["dest"], None if max_docs is None else int(max_docs), proceed)
+        if _flag({"wait_for_completion": params.get("wait_for_completion", "true")}, "wait_for_completion"):
+            return 200, response
+        # Runs to completion right away; the task only reports the result
+        task_id = f"{self.name}-node-0:{len(self.reindex_tasks) + 1}"
+        rps = float(params.get("requests_per_second", -1))
+        status = {key: response[key] for key in ("total", "created", "updated", "deleted", "batches", "version_conflicts", "noops")}
+        self.reindex_tasks[task_id] = {
+            "completed": True,
+            "task": {
+                "node": f"{self.name}-node-0", "id": len(self.reindex_tasks) + 1, "type": "transport", "action": "indices:data/write/reindex",
+                "status": {**status, "requests_per_second": rps}, "description": f"reindex from {body['source']['index']} to {body['dest']['index']}"
+            },
+            "response": response
+        }
+        return 200, {"task": task_id}
+
+    def _get_task(self, params, body, task_id):
+        task = self.reindex_tasks.get(task_id)
+        if task is None:
+            raise SimulatedError(404, "resource_not_found_exception", f"task [{task_id}] isn't running and hasn't stored its results")
+        return 200, task
+
+    def _rethrottle(self, params, body, task_id):
+        task = self.reindex_tasks.get(task_id)
+        if task is None:
+            raise SimulatedError(404, "resource_not_found_exception", f"task [{task_id}] is missing")
+        task["task"]["status"]["requests_per_second"] = float(params.get("requests_per_second", -1))
+        return 200, {"nodes": {f"{self.name}-node-0": {"tasks": {task_id: task["task"]}}}}
+
+    # ---------------------------------------------------------
+    # Inference
+    # ---------------------------------------------------------
+    def _inference(self, params, body, inference_id, task=None):
+        prompt = body.get("input", "")
+        prompt = prompt if isinstance(prompt, str) else " ".join(prompt)
+        problem = prompt.split("Problem Code:", 1)[-1].split("\n", 1)[0].lower()
+        if "mapping" in problem:
+            answer = {"fixed_code": {"dynamic": "strict", "properties": {"@timestamp": {"type": "date"}, "message": {"type": "text"}}},
+                      "explanation": "Simulated: stop dynamic mapping."}
+        elif "ilm" in problem:
+            answer = {"fixed_code": {"policy": {"phases": {"hot": {"actions": {"rollover": {"max_size": "50GB"}}}}}},
+                      "explanation": "Simulated: attach a rollover policy."}
+        else:
+            answer = {"fixed_code": {"query": {"match_all": {}}}, "explanation": "Simulated: no change."}
+        text = json.dumps(answer)
+        # The completion task's shape, plus the 'inference_results' one InferenceService reads
+        return 200, {"completion": [{"result": text}], "inference_results": [{"predicted_value": text}]}
+
+# Simulated clusters by host name; SimulatedNode connections look theirs up here
+clusters: Dict[str, SimulatedCluster] = {}
+
+def simulate(name: str, **options) -> str:
+    """Registers (or reuses) the simulated cluster 'name'; returns the URL to connect to it."""
+    host = f"{name}.simulated"
+    if host not in clusters:
+        clusters[host] = SimulatedCluster(name=name, **options)
+    return f"http://{host}:9200"
+
+class SimulatedNode(BaseAsyncNode):
+    """elastic_transport node that answers from a SimulatedCluster instead of the network."""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.cluster = clusters[config.host]
+
+    async def perform_request(self, method, target, body=None, headers=None, request_timeout=None) -> NodeApiResponse:
+        start = time.perf_counter()
+        handler, _ = self.cluster.match(method, urlsplit(target).path)
+        await asyncio.sleep(self.cluster.delay(handler or ""))
+        error = self.cluster.fault(handler or "")
+        if error is not None:
+            status, payload = error.status, error.body()
+        else:
+            status, payload = self.cluster.handle(method, target, body)
+        raw = b"" if method == "HEAD" or payload is None else json.dumps(payload).encode()
+        meta = ApiResponseMeta(
+            status=status,
+            http_version="1.1",
+            headers=HttpHeaders(RESPONSE_HEADERS),
+            duration=time.perf_counter() - start,
+            node=self.config
+        )
+        return NodeApiResponse(meta, raw)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,376 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Deque, Optional, Tuple
+from elastic_transport import AsyncTransport, ConnectionError, ConnectionTimeout
+from app.services.telemetry import metrics, ES_REQUESTS, ES_LATENCY
+from app.config import settings
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Who the current ES call is for; API routes mark themselves interactive
+request_priority: ContextVar[str] = ContextVar("request_priority", default=BACKGROUND)
+# Off where duplicate requests would distort measurements (benchmarks)
+hedging_enabled: ContextVar[bool] = ContextVar("hedging_enabled", default=True)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+HEDGED_READ_ENDPOINTS = {"_search", "_count", "_mget", "_field_caps"}
+
+logger = logging.getLogger("autofixer.limiter")
+
+@contextmanager
+def prioritized(priority: str):
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+@contextmanager
+def no_hedging():
+    token = hedging_enabled.set(False)
+    try:
+        yield
+    finally:
+        hedging_enabled.reset(token)
+
+def _endpoints(target: str) -> set:
+    return {s for s in target.split("?", 1)[0].split("/") if s.startswith("_")}
+
+def is_idempotent_read(method: str, target: str) -> bool:
+    """Reads that are safe to send twice."""
+    return method in ("GET", "HEAD") or (method == "POST" and bool(_endpoints(target) & HEDGED_READ_ENDPOINTS))
+
+def operation_class(method: str, target: str) -> str:
+    """Buckets a request by the cluster resources it uses: 'read', 'write', 'reindex' or 'admin'."""
+    endpoints = _endpoints(target)
+    if endpoints & {"_reindex", "_tasks", "_rethrottle", "_update_by_query", "_delete_by_query"}:
+        return "reindex"
+    if endpoints & {"_bulk", "_doc", "_create", "_update"}:
+        return "write"
+    if method in ("GET", "HEAD") or endpoints & {"_search", "_count", "_mget", "_validate", "_msearch", "_field_caps"}:
+        return "read"
+    return "admin" # Mapping/settings/alias/index changes
+
+class _Limit:
+    """AIMD in-flight limit for one (cluster, operation class)."""
+
+    def __init__(self):
+        self.limit = float(settings.ES_LIMIT_INITIAL)
+        self.in_flight = 0
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {INTERACTIVE: deque(), BACKGROUND: deque()}
+        self.min_latency: Optional[float] = None # Latency baseline (slowly forgets old minimums)
+        self.last_decrease = 0.0
+        self.rejections = 0
+
+    def allowed(self, priority: str) -> bool:
+        if priority == INTERACTIVE:
+            return self.in_flight < self.limit
+        # Background work leaves headroom so interactive calls never queue behind a cycle
+        return self.in_flight < max(1.0, self.limit * settings.ES_LIMIT_BACKGROUND_SHARE)
+
+class AdaptiveLimiter:
+    """
+    One limiter shared by every ES client.
+    1. Each cluster and operation class gets its own in-flight limit.
+    2. The limit grows by ~1 per window of fast, successful requests and is cut
+       multiplicatively on 429 / es_rejected_execution_exception, timeouts, or
+       latency above ES_LIMIT_LATENCY_FACTOR x the observed baseline.
+    3. Interactive (API) requests are admitted first and can use the whole limit;
+       background cycles only get ES_LIMIT_BACKGROUND_SHARE of it.
+    """
+
+    def __init__(self):
+        self.limits: Dict[Tuple[str, str], _Limit] = {}
+
+    def _get(self, cluster: str, op: str) -> _Limit:
+        key = (cluster, op)
+        if key not in self.limits:
+            self.limits[key] = _Limit()
+        return self.limits[key]
+
+    async def acquire(self, cluster: str, op: str, priority: str) -> _Limit:
+        state = self._get(cluster, op)
+        if state.allowed(priority) and not state.waiters[INTERACTIVE] and (priority == INTERACTIVE or not state.waiters[BACKGROUND]):
+            state.in_flight += 1
+            return state
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters[priority].append(waiter)
+        try:
+            await waiter # in_flight was taken for us by _wake()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(state) # Woken and cancelled at once: hand the slot on
+            else:
+                state.waiters[priority].remove(waiter)
+            raise
+        return state
+
+    def release(self, state: _Limit):
+        state.in_flight -= 1
+        self._wake(state)
+
+    def _wake(self, state: _Limit):
+        for priority in (INTERACTIVE, BACKGROUND):
+            queue = state.waiters[priority]
+            while queue and state.allowed(priority):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    state.in_flight += 1
+                    waiter.set_result(None)
+
+    def record(self, state: _Limit, latency: Optional[float], overloaded: bool):
+        """Feeds one request outcome back into the limit (latency None = don't judge speed)."""
+        now = time.monotonic()
+        slow = False
+        if latency is not None:
+            if state.min_latency is None or latency < state.min_latency:
+                state.min_latency = latency
+            else:
+                state.min_latency += (latency - state.min_latency) * 0.01 # Let the baseline drift up slowly
+            slow = latency > state.min_latency * settings.ES_LIMIT_LATENCY_FACTOR + settings.ES_LIMIT_LATENCY_SLACK
+
+        if overloaded or slow:
+            if overloaded:
+                state.rejections += 1
+            # At most one decrease per latency window, so a burst of failures counts once
+            if now - state.last_decrease > max(state.min_latency or 0, 0.05):
+                state.limit = max(settings.ES_LIMIT_MIN, state.limit * settings.ES_LIMIT_BACKOFF)
+                state.last_decrease = now
+                logger.debug(f"ES limit cut to {state.limit:.1f} ({'rejected' if overloaded else 'slow'}).")
+        else:
+            state.limit = min(settings.ES_LIMIT_MAX, state.limit + 1.0 / state.limit)
+        self._wake(state)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            f"{cluster}/{op}": {
+                "limit": round(state.limit, 2),
+                "in_flight": state.in_flight,
+                "queued": {p: len(q) for p, q in state.waiters.items()},
+                "baseline_ms": round((state.min_latency or 0) * 1000, 1),
+                "rejections": state.rejections
+            }
+            for (cluster, op), state in self.limits.items()
+        }
+
+class CircuitOpenError(ConnectionError):
+    """Raised without contacting ES while a cluster/operation circuit is open."""
+
+    def __init__(self, cluster: str, op: str, retry_after: float):
+        super().__init__(f"Circuit for {op} requests to cluster '{cluster}' is open; retry in {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+class _Circuit:
+    """Rolling outcome window and state for one (cluster, operation class)."""
+
+    def __init__(self, cluster: str, op: str):
+        self.cluster, self.op = cluster, op
+        self.state = CLOSED
+        self.outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=settings.ES_BREAKER_WINDOW) # (failed, slow)
+        self.latencies: Deque[float] = deque(maxlen=settings.ES_BREAKER_WINDOW * 4) # Successful calls, for hedging
+        self.opened_at = 0.0
+        self.probes = 0
+        self.half_opened = 0 # Half-open periods so far; tags probes so only this period's are counted
+
+class CircuitBreaker:
+    """
+    Fails fast while a cluster (per operation class) is unhealthy.
+    1. Closed: outcomes go into a rolling window; once it has enough requests and the
+       error or slow-call rate crosses its threshold, the circuit opens.
+    2. Open: requests raise CircuitOpenError immediately, for ES_BREAKER_OPEN_SECONDS.
+    3. Half-open: a few probe requests go through; a success closes the circuit,
+       a failure re-opens it. Only probes count: requests admitted before the
+       circuit opened (or in an earlier half-open period) finish without effect.
+    """
+
+    def __init__(self):
+        self.circuits: Dict[Tuple[str, str], _Circuit] = {}
+
+    def _get(self, cluster: str, op: str) -> _Circuit:
+        key = (cluster, op)
+        if key not in self.circuits:
+            self.circuits[key] = _Circuit(cluster, op)
+        return self.circuits[key]
+
+    def before(self, cluster: str, op: str) -> Tuple[_Circuit, Optional[int]]:
+        """Admits a request: (circuit, half-open period if it is a probe, else None)."""
+        circuit = self._get(cluster, op)
+        if circuit.state == OPEN:
+            waited = time.monotonic() - circuit.opened_at
+            if waited < settings.ES_BREAKER_OPEN_SECONDS:
+                raise CircuitOpenError(cluster, op, settings.ES_BREAKER_OPEN_SECONDS - waited)
+            circuit.state, circuit.probes = HALF_OPEN, 0
+            circuit.half_opened += 1
+        if circuit.state == HALF_OPEN:
+            if circuit.probes >= settings.ES_BREAKER_HALF_OPEN_PROBES:
+                raise CircuitOpenError(cluster, op, 1)
+            circuit.probes += 1
+            return circuit, circuit.half_opened
+        return circuit, None
+
+    @staticmethod
+    def _current_probe(circuit: _Circuit, probe: Optional[int]) -> bool:
+        return probe is not None and probe == circuit.half_opened and circuit.state == HALF_OPEN
+
+    def after(self, circuit: _Circuit, probe: Optional[int], failed: bool, latency: Optional[float]):
+        slow = latency is not None and latency > settings.ES_BREAKER_SLOW_CALL
+        if not failed and latency is not None:
+            circuit.latencies.append(latency)
+
+        if probe is not None or circuit.state != CLOSED:
+            if not self._current_probe(circuit, probe):
+                return # Admitted under an earlier state: says nothing about this one
+            circuit.probes -= 1
+            if failed or slow:
+                self._open(circuit)
+            else:
+                circuit.state = CLOSED
+                circuit.outcomes.clear()
+            return
+
+        circuit.outcomes.append((failed, slow))
+        total = len(circuit.outcomes)
+        if circuit.state == CLOSED and total >= settings.ES_BREAKER_MIN_REQUESTS:
+            errors = sum(1 for f, _ in circuit.outcomes if f) / total
+            slows = sum(1 for _, s in circuit.outcomes if s) / total
+            if errors >= settings.ES_BREAKER_ERROR_RATE or slows >= settings.ES_BREAKER_SLOW_RATE:
+                self._open(circuit)
+
+    def abandon(self, circuit: _Circuit, probe: Optional[int]):
+        """A request ended without telling us anything about the cluster."""
+        if self._current_probe(circuit, probe):
+            circuit.probes -= 1
+
+    def _open(self, circuit: _Circuit):
+        circuit.state = OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.outcomes.clear()
+        logger.warning(f"ES circuit for {circuit.op} requests to cluster '{circuit.cluster}' opened.")
+
+    def hedge_delay(self, circuit: _Circuit) -> Optional[float]:
+        """p95 of recent successful latencies, or None until there are enough samples."""
+        if len(circuit.latencies) < settings.ES_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(circuit.latencies)
+        return max(settings.ES_HEDGE_MIN_DELAY, ordered[int(len(ordered) * 0.95) - 1])
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            f"{cluster}/{op}": {"state": circuit.state, "window": len(circuit.outcomes)}
+            for (cluster, op), circuit in self.circuits.items()
+        }
+
+def _rejected(status: int, body: Any) -> bool:
+    if status == 429:
+        return True
+    if isinstance(body, dict):
+        if "es_rejected_execution_exception" in str(body.get("error", "")):
+            return True
+        if body.get("errors") and isinstance(body.get("items"), list):
+            # _bulk answers 200 with per-item rejections
+            return any(
+                next(iter(item.values()), {}).get("status") == 429
+                for item in body["items"] if isinstance(item, dict)
+            )
+    return False
+
+class LimitedTransport(AsyncTransport):
+    """
+    AsyncTransport that guards every request:
+    1. Fails fast through the circuit breaker while the cluster is unhealthy.
+    2. Admits the request through the shared concurrency limiter.
+    3. Hedges idempotent reads: if no answer arrives within the p95 latency, a
+       duplicate goes out (to the next node in the pool) and the first answer wins.
+       Single-node pools are never hedged: the duplicate would hit the same node.
+    """
+
+    cluster = "default" # Set by ESClientWrapper after the client is built
+
+    async def perform_request(self, method: str, target: str, **kwargs: Any):
+        op = operation_class(method, target)
+        # The client names the API it's calling (e.g. 'indices.get_mapping'); fall back to the class
+        api = getattr(kwargs.get("otel_span"), "endpoint_id", None) or op
+        outcome = "error"
+        called = time.monotonic()
+        try:
+            circuit, probe = breaker.before(self.cluster, op)
+        except CircuitOpenError:
+            ES_REQUESTS.inc(self.cluster, api, "circuit_open")
+            raise
+        state = await limiter.acquire(self.cluster, op, request_priority.get())
+        start = time.monotonic()
+        # Blocking calls (sync _reindex, task waits) take as long as the work; their latency says nothing
+        long_running = "wait_for_completion=true" in target
+        try:
+            hedge = hedging_enabled.get() and is_idempotent_read(method, target) and len(self.node_pool) > 1
+            delay = breaker.hedge_delay(circuit) if hedge else None
+            if delay is None or long_running:
+                resp = await AsyncTransport.perform_request(self, method, target, **kwargs)
+            else:
+                resp = await self._hedged(delay, method, target, kwargs)
+            latency = None if long_running else time.monotonic() - start
+            overloaded = _rejected(resp.meta.status, resp.body)
+            limiter.record(state, latency, overloaded)
+            breaker.after(circuit, probe, overloaded or resp.meta.status >= 500, latency)
+            outcome = str(resp.meta.status)
+            return resp
+        except (ConnectionError, ConnectionTimeout):
+            limiter.record(state, time.monotonic() - start, True)
+            breaker.after(circuit, probe, True, None)
+            raise
+        except BaseException:
+            breaker.abandon(circuit, probe) # Not the cluster's fault (e.g. cancelled)
+            raise
+        finally:
+            limiter.release(state)
+            ES_REQUESTS.inc(self.cluster, api, outcome)
+            ES_LATENCY.observe(time.monotonic() - called, self.cluster, api)
+
+    async def _hedged(self, delay: float, method: str, target: str, kwargs: Dict[str, Any]):
+        primary = asyncio.ensure_future(AsyncTransport.perform_request(self, method, target, **kwargs))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            tasks.append(asyncio.ensure_future(AsyncTransport.perform_request(self, method, target, **kwargs)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return primary.result() # Both failed: surface the primary's error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+# Singleton instances
+limiter = AdaptiveLimiter()
+breaker = CircuitBreaker()
+
+ES_LIMIT = metrics.gauge("autofixer_es_concurrency_limit", "Current adaptive in-flight limit.", ("cluster", "op"))
+ES_IN_FLIGHT = metrics.gauge("autofixer_es_in_flight", "Requests currently in flight.", ("cluster", "op"))
+ES_CIRCUIT = metrics.gauge("autofixer_es_circuit_state", "Circuit state (0 closed, 1 half-open, 2 open).", ("cluster", "op"))
+CIRCUIT_LEVELS = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+def _collect():
+    for (cluster, op), state in limiter.limits.items():
+        ES_LIMIT.set(cluster, op, value=state.limit)
+        ES_IN_FLIGHT.set(cluster, op, value=state.in_flight)
+    for (cluster, op), circuit in breaker.circuits.items():
+        ES_CIRCUIT.set(cluster, op, value=CIRCUIT_LEVELS[circuit.state])
+
+metrics.on_collect(_collect)
+
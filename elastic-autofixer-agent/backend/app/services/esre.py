@@ -14,7 +14,7 @@ class ESREService:
 
     async def _get_client(self):
         if not self.client:
-            self.client = await es_wrapper.get_client()
+            self.client = await es_wrapper.get_client(es_wrapper.default)
         return self.client
 
     async def initialize_knowledge_base(self):
@@ -0,0 +1,409 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+from app.services.es_client import es_wrapper
+from app.config import settings
+
+HISTORY_INDEX = ".autofixer-history" # Data stream
+HISTORY_TEMPLATE = "autofixer-history"
+
+# Only the fields we filter/aggregate on are indexed. Whole issues and
+# proposals live in 'details', which is kept in _source but never indexed.
+HISTORY_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "@timestamp": {"type": "date"},
+        "event_id": {"type": "keyword"},
+        "issue_id": {"type": "keyword"},
+        "action": {"type": "keyword"}, # "proposal_generated", "benchmarked", "fix_applied", "fix_failed"
+        "category": {"type": "keyword"},
+        "resource": {"type": "keyword"},
+        "fingerprint": {"type": "keyword"},
+        "metrics": {
+            "properties": {
+                "improvement_percentage": {"type": "float"},
+                "latency_before_ms": {"type": "float"},
+                "latency_after_ms": {"type": "float"},
+                "time_to_fix_ms": {"type": "long"}
+            }
+        },
+        "details": {"type": "object", "enabled": False}
+    }
+}
+
+logger = logging.getLogger("autofixer.history")
+
+class HistoryWriter:
+    """
+    Buffered writer for the agent's memory (history index).
+    1. Bootstraps the history index once per process.
+    2. Buffers events in memory.
+    3. Flushes them with _bulk when the buffer is full or the interval elapses.
+    4. Spills undeliverable events to a bounded local file and replays them later.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._index_ready = False
+        self._ready_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._oldest_flushed: Optional[int] = None # Oldest @timestamp indexed since the rollup last asked
+        self._spill_lock = threading.Lock() # Spill file I/O runs in worker threads
+        self._spill_count: Optional[int] = None # Lines in the spill file (None = not counted yet)
+
+    async def _get_client(self):
+        if not self.client:
+            self.client = await es_wrapper.get_client(es_wrapper.default)
+        return self.client
+
+    @property
+    def spill_path(self) -> str:
+        return settings.HISTORY_SPILL_PATH or os.path.join(
+            tempfile.gettempdir(), "autofixer-history.spill.jsonl"
+        )
+
+    async def ensure_index(self):
+        """Installs the history data stream template (checked once per process)."""
+        if self._index_ready:
+            return
+
+        async with self._ready_lock:
+            if self._index_ready:
+                return
+            client = await self._get_client()
+
+            # Idempotent: re-putting the template also upgrades mappings/retention.
+            # The data stream itself is auto-created on the first write.
+            await client.indices.put_index_template(
+                name=HISTORY_TEMPLATE,
+                index_patterns=[HISTORY_INDEX],
+                data_stream={"hidden": True},
+                priority=500,
+                template={
+                    "settings": {"index.hidden": True},
+                    "mappings": HISTORY_MAPPINGS,
+                    "lifecycle": {"data_retention": settings.HISTORY_RETENTION}
+                },
+                meta={"managed_by": "autofixer"}
+            )
+
+            if await client.indices.exists(index=HISTORY_INDEX):
+                resolved = await client.indices.resolve_index(name=HISTORY_INDEX, expand_wildcards="all")
+                if resolved.get("indices") and not resolved.get("data_streams"):
+                    logger.warning(
+                        f"{HISTORY_INDEX} is a legacy plain index. New events will keep landing there "
+                        f"until it is reindexed into the data stream and deleted."
+                    )
+            self._index_ready = True
+
+    async def record(
+        self,
+        issue_id: str,
+        action: str,
+        details: Dict[str, Any],
+        category: Optional[str] = None,
+        resource: Optional[str] = None,
+        metrics: Optional[Dict[str, Any]] = None,
+        fingerprint: Optional[str] = None
+    ):
+        """Queues one event. Never blocks on Elasticsearch unless no flusher is running."""
+        event = {
+            "@timestamp": int(time.time() * 1000),
+            "event_id": uuid.uuid4().hex,
+            "issue_id": issue_id,
+            "action": action,
+            "details": details
+        }
+        if category:
+            event["category"] = category
+        if resource:
+            event["resource"] = resource
+        if metrics:
+            event["metrics"] = metrics
+        if fingerprint:
+            event["fingerprint"] = fingerprint
+        self._buffer.append(event)
+
+        if len(self._buffer) > settings.HISTORY_BUFFER_MAX:
+            overflow = self._buffer[:-settings.HISTORY_BUFFER_MAX]
+            self._buffer = self._buffer[-settings.HISTORY_BUFFER_MAX:]
+            await asyncio.to_thread(self._spill, overflow)
+
+        if len(self._buffer) >= settings.HISTORY_FLUSH_SIZE:
+            if self._task is not None:
+                self._wakeup.set()
+            else:
+                await self.flush()
+
+    async def flush(self):
+        """
+        Sends every buffered (and previously spilled) event to the history index.
+        Spilled events stay on disk until _bulk has taken them, so a crash mid-flush
+        can't lose them.
+        """
+        async with self._flush_lock:
+            spilled = await asyncio.to_thread(self._read_spill)
+            events = spilled + self._buffer
+            self._buffer = []
+            if not events:
+                return
+
+            pending = events
+            for attempt in range(settings.HISTORY_MAX_RETRIES + 1):
+                try:
+                    await self.ensure_index()
+                    pending = await self._send(pending)
+                except Exception as e:
+                    logger.warning(f"History flush attempt {attempt + 1} failed: {e}")
+
+                if not pending or attempt == settings.HISTORY_MAX_RETRIES:
+                    break
+                await asyncio.sleep(min(2 ** attempt * 0.5, 10.0))
+
+            on_disk = {event["event_id"] for event in spilled}
+            delivered = on_disk - {event["event_id"] for event in pending}
+            if delivered:
+                await asyncio.to_thread(self._forget_spilled, delivered)
+            unspilled = [event for event in pending if event["event_id"] not in on_disk]
+            if unspilled:
+                logger.error(f"Elasticsearch unavailable, spilling {len(unspilled)} history events to disk.")
+                await asyncio.to_thread(self._spill, unspilled)
+
+    async def _send(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Bulk-indexes events and returns the ones worth retrying."""
+        client = await self._get_client()
+        body = []
+        for event in events:
+            body.append({"create": {"_index": HISTORY_INDEX}}) # Data streams only accept 'create'
+            body.append(event)
+
+        resp = await client.bulk(body=body)
+        if not resp.get("errors"):
+            self.note_flushed(min(event["@timestamp"] for event in events))
+            return []
+
+        retry, indexed = [], []
+        for event, item in zip(events, resp["items"]):
+            result = item.get("create", {})
+            status = result.get("status", 200)
+            if status == 429 or status >= 500:
+                retry.append(event)
+            elif status >= 300:
+                logger.error(f"Dropping history event for {event['issue_id']}: {result.get('error')}")
+            else:
+                indexed.append(event["@timestamp"])
+        if indexed:
+            self.note_flushed(min(indexed))
+        return retry
+
+    def note_flushed(self, timestamp: int):
+        """Remembers the oldest event timestamp indexed, so the rollup can revisit its bucket."""
+        if self._oldest_flushed is None or timestamp < self._oldest_flushed:
+            self._oldest_flushed = timestamp
+
+    def take_oldest_flushed(self) -> Optional[int]:
+        """Oldest @timestamp indexed since the last call (None if nothing was)."""
+        oldest, self._oldest_flushed = self._oldest_flushed, None
+        return oldest
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Events recorded but not flushed yet (newest last)."""
+        return list(self._buffer)
+
+    def _spill_file_exists(self, path: str) -> bool:
+        """
+        Whether path holds a spill file. Anything but a regular file (a device,
+        a directory, a symlink...) is never read, replaced or removed: the spill
+        file is ours, whatever HISTORY_SPILL_PATH points to isn't.
+        """
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            return False
+        if not stat.S_ISREG(mode):
+            raise RuntimeError(f"HISTORY_SPILL_PATH {path} is not a regular file; not touching it.")
+        return True
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        """
+        Appends events to the spill file. Only once it holds more than
+        HISTORY_SPILL_MAX_EVENTS is it rewritten, keeping the newest.
+        """
+        path = self.spill_path
+        with self._spill_lock:
+            try:
+                exists = self._spill_file_exists(path)
+            except RuntimeError as e:
+                logger.error(f"{e} Dropping {len(events)} history events.")
+                return
+            if not exists:
+                self._spill_count = 0
+            elif self._spill_count is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._spill_count = sum(1 for line in f if line.strip())
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(event) + "\n" for event in events)
+            self._spill_count += len(events)
+
+            dropped = self._spill_count - settings.HISTORY_SPILL_MAX_EVENTS
+            if dropped > 0:
+                logger.error(f"History spill buffer full, dropping {dropped} oldest events.")
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = [line for line in f if line.strip()]
+                self._rewrite_spill(path, lines[-settings.HISTORY_SPILL_MAX_EVENTS:])
+
+    def _rewrite_spill(self, path: str, lines: List[str]):
+        """Atomically replaces the spill file (removes it when nothing is left)."""
+        if not lines:
+            os.remove(path)
+        else:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp_path, path)
+        self._spill_count = len(lines)
+
+    def _read_spill(self) -> List[Dict[str, Any]]:
+        """Reads the spill file (only a regular file we could have written), leaving it in place."""
+        path = self.spill_path
+        with self._spill_lock:
+            try:
+                if not self._spill_file_exists(path):
+                    return []
+            except RuntimeError as e:
+                logger.error(str(e))
+                return []
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+
+    def _forget_spilled(self, event_ids: set):
+        """Removes delivered events from the spill file; events spilled meanwhile stay."""
+        path = self.spill_path
+        with self._spill_lock:
+            try:
+                if not self._spill_file_exists(path):
+                    return
+            except RuntimeError:
+                return
+            with open(path, "r", encoding="utf-8") as f:
+                lines = [line for line in f if line.strip() and json.loads(line)["event_id"] not in event_ids]
+            self._rewrite_spill(path, lines)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.HISTORY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"History flush failed: {e}")
+
+    def start(self):
+        """Starts the periodic background flusher."""
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event() # Bound to this loop: the app may be started again in a new one
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the flusher and drains the buffer."""
+        if self._task is not None:
+            # Let the in-flight flush finish instead of cancelling it mid-request
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+class HistoryReader:
+    """
+    Paginated, filtered access to the history data stream.
+    Uses search_after on (@timestamp, event_id) so deep pages stay cheap.
+    """
+
+    def __init__(self):
+        self.client = None
+
+    async def _get_client(self):
+        if not self.client:
+            self.client = await es_wrapper.get_client(es_wrapper.default)
+        return self.client
+
+    @staticmethod
+    def encode_cursor(sort_values: List[Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(sort_values).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> List[Any]:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+    async def search(
+        self,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        issue_id: Optional[str] = None,
+        category: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        include_details: bool = True,
+        actions: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Returns one page of events (newest first) and the cursor for the next page."""
+        client = await self._get_client()
+
+        filters = []
+        for field, value in (("issue_id", issue_id), ("category", category), ("action", action)):
+            if value:
+                filters.append({"term": {field: value}})
+        if actions:
+            filters.append({"terms": {"action": actions}})
+        if since is not None or until is not None:
+            time_range = {}
+            if since is not None:
+                time_range["gte"] = since
+            if until is not None:
+                time_range["lt"] = until
+            filters.append({"range": {"@timestamp": time_range}})
+
+        body = {
+            "size": size,
+            "query": {"bool": {"filter": filters}},
+            "sort": [
+                {"@timestamp": {"order": "desc", "unmapped_type": "date"}},
+                {"event_id": {"order": "desc", "unmapped_type": "keyword"}}
+            ],
+            "track_total_hits": False
+        }
+        if cursor:
+            body["search_after"] = self.decode_cursor(cursor)
+        if not include_details:
+            body["_source"] = {"excludes": ["details"]}
+
+        resp = await client.search(index=HISTORY_INDEX, body=body, ignore_unavailable=True)
+        hits = resp["hits"]["hits"]
+        next_cursor = None
+        if len(hits) == size:
+            next_cursor = self.encode_cursor(hits[-1]["sort"])
+
+        return {"items": [hit["_source"] for hit in hits], "next": next_cursor}
+
+# Singleton instances
+history_writer = HistoryWriter()
+history_reader = HistoryReader()
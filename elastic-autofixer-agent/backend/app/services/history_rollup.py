@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional
+from app.services.es_client import es_wrapper
+from app.services.coordination import coordinator
+from app.services.history import HISTORY_INDEX, history_writer
+from app.config import settings
+
+ROLLUP_INDEX = ".autofixer-history-rollups"
+ROLLUP_LOCK_RESOURCE = "__history_rollup__"
+
+# Summary documents are only ever fetched by time range (or the dirty flag
+# of late-event markers); the counters themselves are read back from
+# _source and merged in Python.
+ROLLUP_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "bucket_start": {"type": "date"},
+        "bucket_end": {"type": "date"},
+        "dirty": {"type": "boolean"},
+        "summary": {"type": "object", "enabled": False}
+    }
+}
+
+IMPROVEMENT_BIN = 5 # Percentage points per histogram bin
+TIME_TO_FIX_BOUNDS_MS = [
+    1_000, 5_000, 30_000, 60_000, 300_000, 900_000,
+    3_600_000, 21_600_000, 86_400_000, 604_800_000
+]
+MAX_BUCKETS_PER_RUN = 168 # Catch up at most a week of hourly buckets per pass
+PAGE_SIZE = 1000
+
+logger = logging.getLogger("autofixer.history")
+
+class HistoryRollup:
+    """
+    Periodically condenses the history data stream into one summary document
+    per time bucket (action counts + mergeable histograms), so /history/stats
+    never has to scan raw events.
+    1. Every replica marks the bucket of the oldest event it flushed late (retries,
+       spill replays) as dirty: a 'dirty-<bucket>' document in the rollup index.
+    2. One replica (the owner of the rollup lease) summarizes new complete buckets
+       plus every bucket from the oldest dirty one on, then clears the markers.
+    3. The same replica deletes summaries older than HISTORY_ROLLUP_RETENTION_DAYS.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._index_ready = False
+        self._rolled_until: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _get_client(self):
+        if not self.client:
+            self.client = await es_wrapper.get_client(es_wrapper.default)
+        return self.client
+
+    async def ensure_index(self):
+        if self._index_ready:
+            return
+        client = await self._get_client()
+        if await client.indices.exists(index=ROLLUP_INDEX):
+            # Additive: indices created before a field was added get it mapped
+            await client.indices.put_mapping(index=ROLLUP_INDEX, body=ROLLUP_MAPPINGS)
+        else:
+            try:
+                await client.indices.create(
+                    index=ROLLUP_INDEX,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": ROLLUP_MAPPINGS
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready = True
+
+    async def _resume_point(self) -> Optional[int]:
+        """Where the previous run stopped, or the first history bucket."""
+        client = await self._get_client()
+        bucket_ms = settings.HISTORY_ROLLUP_BUCKET * 1000
+
+        resp = await client.search(
+            index=ROLLUP_INDEX,
+            body={
+                "size": 1,
+                "query": {"bool": {"must_not": [{"term": {"dirty": True}}]}},
+                "sort": [{"bucket_end": "desc"}],
+                "_source": ["bucket_end"]
+            }
+        )
+        hits = resp["hits"]["hits"]
+        if hits:
+            return hits[0]["_source"]["bucket_end"]
+
+        resp = await client.search(
+            index=HISTORY_INDEX,
+            body={"size": 0, "aggs": {"first": {"min": {"field": "@timestamp"}}}},
+            ignore_unavailable=True
+        )
+        first = resp.get("aggregations", {}).get("first", {}).get("value")
+        if first is None:
+            return None
+        return int(first) // bucket_ms * bucket_ms
+
+    def _complete_until(self) -> int:
+        """End of the last complete bucket; the flush interval is the lag for in-flight events."""
+        bucket_ms = settings.HISTORY_ROLLUP_BUCKET * 1000
+        lag_ms = int(settings.HISTORY_FLUSH_INTERVAL * 1000)
+        return (int(time.time() * 1000) - lag_ms) // bucket_ms * bucket_ms
+
+    async def mark_late(self) -> Optional[int]:
+        """
+        Marks the bucket of the oldest event flushed since the last call dirty, if it
+        may already be summarized. Returns the marked bucket start.
+        """
+        oldest = history_writer.take_oldest_flushed()
+        if oldest is None:
+            return None
+        bucket_ms = settings.HISTORY_ROLLUP_BUCKET * 1000
+        start = oldest // bucket_ms * bucket_ms
+        if start + bucket_ms > self._complete_until():
+            return None # Bucket isn't complete yet: the next rollup covers it anyway
+        try:
+            await self.ensure_index()
+            client = await self._get_client()
+            await client.index(
+                index=ROLLUP_INDEX,
+                id=f"dirty-{start}",
+                body={"bucket_start": start, "bucket_end": start + bucket_ms, "dirty": True, "summary": {}}
+            )
+        except Exception:
+            history_writer.note_flushed(oldest) # Try again next time
+            raise
+        return start
+
+    async def _scan(self, query: Dict[str, Any], source: List[str], seq_no: bool = False):
+        """Every matching rollup document, paged with search_after on bucket_start."""
+        client = await self._get_client()
+        search_after = None
+        while True:
+            body: Dict[str, Any] = {
+                "size": PAGE_SIZE,
+                "query": query,
+                "sort": [{"bucket_start": "asc"}],
+                "_source": source,
+                "seq_no_primary_term": seq_no
+            }
+            if search_after:
+                body["search_after"] = search_after
+            hits = (await client.search(index=ROLLUP_INDEX, body=body))["hits"]["hits"]
+            for hit in hits:
+                yield hit
+            if len(hits) < PAGE_SIZE:
+                return
+            search_after = hits[-1]["sort"]
+
+    async def _dirty_markers(self) -> List[Dict[str, Any]]:
+        return [hit async for hit in self._scan({"term": {"dirty": True}}, ["bucket_start"], seq_no=True)]
+
+    async def roll_up(self) -> int:
+        """
+        Summarizes every complete bucket since the last run, and recomputes buckets
+        marked dirty by late events. Returns buckets written.
+        """
+        await self.ensure_index()
+        client = await self._get_client()
+        bucket_ms = settings.HISTORY_ROLLUP_BUCKET * 1000
+
+        if self._rolled_until is None:
+            self._rolled_until = await self._resume_point()
+        if self._rolled_until is None:
+            return 0 # No history yet
+
+        dirty = await self._dirty_markers()
+        start = min([self._rolled_until] + [hit["_source"]["bucket_start"] for hit in dirty])
+        end = min(self._complete_until(), start + MAX_BUCKETS_PER_RUN * bucket_ms)
+        if end <= start:
+            return 0
+
+        resp = await client.search(
+            index=HISTORY_INDEX,
+            body={
+                "size": 0,
+                "query": {"range": {"@timestamp": {"gte": start, "lt": end}}},
+                "aggs": {
+                    "buckets": {
+                        "date_histogram": {
+                            "field": "@timestamp",
+                            "fixed_interval": f"{settings.HISTORY_ROLLUP_BUCKET}s",
+                            "min_doc_count": 1
+                        },
+                        "aggs": {
+                            "actions": {"terms": {"field": "action", "size": 50}},
+                            "categories": {"terms": {"field": "category", "size": 50}},
+                            "improvement": {
+                                "histogram": {
+                                    "field": "metrics.improvement_percentage",
+                                    "interval": IMPROVEMENT_BIN
+                                }
+                            },
+                            # Verifications carry a time_to_fix too: count each fix once, when applied
+                            "applied": {
+                                "filter": {"term": {"action": "fix_applied"}},
+                                "aggs": {
+                                    "time_to_fix": {
+                                        "range": {
+                                            "field": "metrics.time_to_fix_ms",
+                                            "ranges": self._time_to_fix_ranges()
+                                        }
+                                    },
+                                    "time_to_fix_stats": {"stats": {"field": "metrics.time_to_fix_ms"}}
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            ignore_unavailable=True
+        )
+
+        body = []
+        for bucket in resp.get("aggregations", {}).get("buckets", {}).get("buckets", []):
+            start = int(bucket["key"])
+            ttf_stats = bucket["applied"]["time_to_fix_stats"]
+            summary = {
+                "events": bucket["doc_count"],
+                "actions": {b["key"]: b["doc_count"] for b in bucket["actions"]["buckets"]},
+                "categories": {b["key"]: b["doc_count"] for b in bucket["categories"]["buckets"]},
+                "improvement_histogram": {
+                    str(int(b["key"])): b["doc_count"]
+                    for b in bucket["improvement"]["buckets"] if b["doc_count"]
+                },
+                "time_to_fix_histogram": {
+                    b["key"]: b["doc_count"]
+                    for b in bucket["applied"]["time_to_fix"]["buckets"] if b["doc_count"]
+                },
+                "time_to_fix_count": ttf_stats["count"],
+                "time_to_fix_sum_ms": ttf_stats["sum"] or 0
+            }
+            body.append({"index": {"_index": ROLLUP_INDEX, "_id": str(start)}})
+            body.append({"bucket_start": start, "bucket_end": start + bucket_ms, "summary": summary})
+
+        written = len(body) // 2
+        checkpoint = max(end, self._rolled_until)
+        if end < self._rolled_until:
+            # Caught up on dirty buckets only partway: the rest is still dirty
+            body.append({"index": {"_index": ROLLUP_INDEX, "_id": f"dirty-{end}"}})
+            body.append({"bucket_start": end, "bucket_end": end + bucket_ms, "dirty": True, "summary": {}})
+
+        # Marker so empty stretches aren't re-aggregated after a restart
+        body.append({"index": {"_index": ROLLUP_INDEX, "_id": "checkpoint"}})
+        body.append({"bucket_start": checkpoint, "bucket_end": checkpoint, "summary": {"checkpoint": True}})
+
+        # Clear the markers we covered, unless re-marked meanwhile (seq_no changed)
+        for hit in dirty:
+            if hit["_id"] != f"dirty-{end}":
+                body.append({"delete": {
+                    "_index": ROLLUP_INDEX, "_id": hit["_id"],
+                    "if_seq_no": hit["_seq_no"], "if_primary_term": hit["_primary_term"]
+                }})
+
+        await client.bulk(body=body)
+        self._rolled_until = checkpoint
+        return written
+
+    async def prune(self) -> int:
+        """Deletes summaries (and stale markers) older than HISTORY_ROLLUP_RETENTION_DAYS."""
+        await self.ensure_index()
+        client = await self._get_client()
+        cutoff = int(time.time() * 1000) - int(settings.HISTORY_ROLLUP_RETENTION_DAYS * 86_400_000)
+        query = {"bool": {
+            "filter": [{"range": {"bucket_end": {"lt": cutoff}}}],
+            "must_not": [{"ids": {"values": ["checkpoint"]}}]
+        }}
+        expired = [hit["_id"] async for hit in self._scan(query, [])]
+        for start in range(0, len(expired), PAGE_SIZE):
+            body = [{"delete": {"_index": ROLLUP_INDEX, "_id": doc_id}} for doc_id in expired[start:start + PAGE_SIZE]]
+            await client.bulk(body=body)
+        if expired:
+            logger.info(f"History rollup removed {len(expired)} summaries past retention.")
+        return len(expired)
+
+    @staticmethod
+    def _time_to_fix_ranges() -> List[Dict[str, Any]]:
+        ranges = [{"key": str(TIME_TO_FIX_BOUNDS_MS[0]), "to": TIME_TO_FIX_BOUNDS_MS[0]}]
+        for lower, upper in zip(TIME_TO_FIX_BOUNDS_MS, TIME_TO_FIX_BOUNDS_MS[1:]):
+            ranges.append({"key": str(upper), "from": lower, "to": upper})
+        ranges.append({"key": "inf", "from": TIME_TO_FIX_BOUNDS_MS[-1]})
+        return ranges
+
+    async def get_stats(self, since: Optional[int] = None, until: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Aggregated fix statistics merged from summary documents (summaries aren't
+        indexed, so every page of them is read back).
+        """
+        await self.ensure_index()
+
+        time_range = {}
+        if since is not None:
+            time_range["gte"] = since
+        if until is not None:
+            time_range["lt"] = until
+        query = {"bool": {
+            "filter": [{"range": {"bucket_start": time_range}}] if time_range else [],
+            "must_not": [{"ids": {"values": ["checkpoint"]}}, {"term": {"dirty": True}}]
+        }}
+
+        actions: Dict[str, int] = {}
+        categories: Dict[str, int] = {}
+        improvement: Dict[int, int] = {}
+        time_to_fix: Dict[str, int] = {}
+        ttf_count, ttf_sum = 0, 0.0
+        buckets = 0
+        async for hit in self._scan(query, ["summary"]):
+            summary = hit["_source"]["summary"]
+            buckets += 1
+            for key, count in summary.get("actions", {}).items():
+                actions[key] = actions.get(key, 0) + count
+            for key, count in summary.get("categories", {}).items():
+                categories[key] = categories.get(key, 0) + count
+            for key, count in summary.get("improvement_histogram", {}).items():
+                improvement[int(key)] = improvement.get(int(key), 0) + count
+            for key, count in summary.get("time_to_fix_histogram", {}).items():
+                time_to_fix[key] = time_to_fix.get(key, 0) + count
+            ttf_count += summary.get("time_to_fix_count", 0)
+            ttf_sum += summary.get("time_to_fix_sum_ms", 0)
+
+        applied = actions.get("fix_applied", 0)
+        failed = actions.get("fix_failed", 0)
+
+        return {
+            "buckets": buckets,
+            "rolled_up_until": self._rolled_until,
+            "actions": actions,
+            "categories": categories,
+            "fix_success_rate": round(applied / (applied + failed), 4) if (applied + failed) else None,
+            "median_improvement_percentage": self._median_improvement(improvement),
+            "median_time_to_fix_ms": self._median_time_to_fix(time_to_fix),
+            "mean_time_to_fix_ms": round(ttf_sum / ttf_count, 2) if ttf_count else None
+        }
+
+    @staticmethod
+    def _median_improvement(histogram: Dict[int, int]) -> Optional[float]:
+        total = sum(histogram.values())
+        if not total:
+            return None
+        seen = 0
+        for key in sorted(histogram):
+            seen += histogram[key]
+            if seen * 2 >= total:
+                return key + IMPROVEMENT_BIN / 2 # Bin midpoint
+        return None
+
+    @staticmethod
+    def _median_time_to_fix(histogram: Dict[str, int]) -> Optional[int]:
+        """Upper bound of the bin holding the median (None if it is the open-ended bin)."""
+        total = sum(histogram.values())
+        if not total:
+            return None
+        seen = 0
+        for key in [str(b) for b in TIME_TO_FIX_BOUNDS_MS] + ["inf"]:
+            seen += histogram.get(key, 0)
+            if seen * 2 >= total:
+                return None if key == "inf" else int(key)
+        return None
+
+    async def _roll_up_if_owner(self) -> int:
+        if not coordinator.owns(es_wrapper.qualify(ROLLUP_LOCK_RESOURCE, es_wrapper.default)):
+            self._rolled_until = None # Another replica rolls up; re-read its checkpoint if we take over
+            return 0
+        written = await self.roll_up()
+        await self.prune()
+        return written
+
+    async def _run(self):
+        while True:
+            try:
+                await self.mark_late()
+                await self._roll_up_if_owner()
+            except Exception as e:
+                logger.warning(f"History rollup failed: {e}")
+            await asyncio.sleep(settings.HISTORY_ROLLUP_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.mark_late() # Events from the writer's final flush
+        except Exception as e:
+            logger.warning(f"Could not mark late history events: {e}")
+
+# Singleton instance
+history_rollup = HistoryRollup()
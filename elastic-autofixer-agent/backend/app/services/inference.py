@@ -1,7 +1,9 @@
 from typing import Dict, Any, Optional
 from app.services.es_client import es_wrapper
+from app.services.telemetry import tracer, INFERENCE_REQUESTS, INFERENCE_LATENCY
 from app.config import settings
 import json
+import time
 
 class InferenceService:
     """
@@ -13,7 +15,7 @@ class InferenceService:
 
     async def _get_client(self):
         if not self.client:
-            self.client = await es_wrapper.get_client()
+            self.client = await es_wrapper.get_client(es_wrapper.default)
         return self.client
 
     async def generate_fix_proposal(self, context: str, bad_code: str) -> Dict[str, Any]:
@@ -39,19 +41,29 @@ class InferenceService:
             # Note: This assumes you have a model deployed named 'gpt-4' or similar
             # If not configured, this will throw an error, and we catch it below.
             if settings.ELASTIC_API_KEY and settings.INFERENCE_MODEL_ID:
-                response = await client.inference.inference(
-                    task_type="completion",
-                    inference_id=settings.INFERENCE_MODEL_ID,
-                    body={"input": prompt}
-                )
+                start = time.perf_counter()
+                try:
+                    with tracer.span("inference", model=settings.INFERENCE_MODEL_ID):
+                        response = await client.inference.inference(
+                            task_type="completion",
+                            inference_id=settings.INFERENCE_MODEL_ID,
+                            body={"input": prompt}
+                        )
+                finally:
+                    INFERENCE_LATENCY.observe(time.perf_counter() - start)
                 
                 # Parse the LLM response
                 result_text = response.get("inference_results", [{}])[0].get("predicted_value", "{}")
-                return json.loads(result_text)
+                result = json.loads(result_text)
+                INFERENCE_REQUESTS.inc("success")
+                return result
                 
         except Exception as e:
+            INFERENCE_REQUESTS.inc("error")
             print(f"⚠️ Inference API failed (using fallback rules): {e}")
             
+        INFERENCE_REQUESTS.inc("fallback")
+
         # 3. Fallback Mechanism (If Inference API is not set up)
         return self._fallback_logic(bad_code)
 
@@ -61,7 +73,7 @@ class InferenceService:
         """
         bad_code_lower = bad_code.lower()
 
-        # 1. Mapping Fix (Detects 'mapping' in the resource name)
+        # 1. Mapping Fix (Detects 'mapping' in the issue category/resource name)
         if "mapping" in bad_code_lower:
             return {
                 "fixed_code": {
@@ -75,7 +87,7 @@ class InferenceService:
                 "explanation": "Fallback: Detected Mapping Explosion. Solution: Disable dynamic mapping ('strict') to prevent new fields from being created automatically."
             }
 
-        # 2. ILM Fix (Detects 'ilm' in the resource name)
+        # 2. ILM Fix (Detects 'ilm' in the issue category/resource name)
         if "ilm" in bad_code_lower:
             return {
                 "fixed_code": {
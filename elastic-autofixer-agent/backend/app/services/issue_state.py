@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.services.history import history_writer, history_reader
+from app.services.es_client import es_wrapper
+from app.models.es_types import DiagnosticResult
+from app.config import settings
+
+# Issue lifecycle: open -> proposed -> applied -> verified | failed.
+# Verified and failed issues are closed: if the issue is detected again, it reopens.
+OPEN = "open"
+PROPOSED = "proposed"
+APPLIED = "applied"
+VERIFIED = "verified"
+FAILED = "failed"
+
+# History actions that move an issue between states
+ACTION_STATES = {
+    "proposal_generated": PROPOSED,
+    "fix_applied": APPLIED,
+    "fix_verified": VERIFIED,
+    "fix_failed": FAILED,
+}
+STATE_ACTIONS = {state: action for action, state in ACTION_STATES.items()}
+
+LOAD_PAGE_SIZE = 1000
+
+logger = logging.getLogger("autofixer.issues")
+
+IssueKey = Tuple[str, str] # (issue_id, fingerprint)
+
+def fingerprint(category: Optional[str], resource: Optional[str]) -> str:
+    """Identifies the resource an issue is about, independent of its metrics."""
+    return hashlib.sha1(f"{category}|{resource}".encode()).hexdigest()[:16]
+
+def issue_resource(issue: DiagnosticResult) -> str:
+    """Affected resource, qualified with its cluster so same-named indices don't collide."""
+    return es_wrapper.qualify(issue.affected_resource, issue.cluster)
+
+def issue_key(issue: DiagnosticResult) -> IssueKey:
+    return issue.issue_id, fingerprint(issue.category, issue_resource(issue))
+
+class IssueTracker:
+    """
+    Remembers which issues the agent is already handling so cycles skip them.
+    State is loaded once from history, then kept current in memory as the
+    agent records transitions.
+    """
+
+    def __init__(self):
+        self._states: Dict[IssueKey, Dict[str, Any]] = {}
+        self._pending: Set[IssueKey] = set() # proposed / applied
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        """
+        Replays history (newest first) to rebuild the latest state per issue.
+        If history can't be read, the cycle goes on with what is in memory (possibly
+        nothing) and the next call tries again.
+        """
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            latest: Dict[IssueKey, Dict[str, Any]] = {}
+            cursor = None
+            replayed = 0
+            try:
+                while True:
+                    page = await history_reader.search(
+                        size=LOAD_PAGE_SIZE,
+                        cursor=cursor,
+                        actions=list(ACTION_STATES),
+                        include_details=False
+                    )
+                    for event in page["items"]:
+                        if "fingerprint" not in event:
+                            continue # Pre-tracker events can't be matched to a resource
+                        key = (event["issue_id"], event["fingerprint"])
+                        state = ACTION_STATES[event["action"]]
+                        entry = latest.get(key)
+                        if entry is None:
+                            # First hit is the newest event: that's the current state
+                            latest[key] = {
+                                "state": state, "at": event["@timestamp"], "resource": event.get("resource"),
+                                "proposed_at": event["@timestamp"] if state == PROPOSED else None
+                            }
+                        elif state == PROPOSED and entry["proposed_at"] is None:
+                            entry["proposed_at"] = event["@timestamp"]
+                    replayed += len(page["items"])
+                    cursor = page["next"]
+                    if not cursor:
+                        break
+            except Exception as e:
+                logger.error(f"Could not load issue states from history, continuing without them: {e}")
+                return
+
+            for key, entry in latest.items():
+                if key in self._states:
+                    continue # Transitions recorded since (e.g. while history was down) are newer
+                self._set(key, entry["state"], entry["at"], entry["resource"])
+                self._states[key]["proposed_at"] = entry["proposed_at"]
+            self._loaded = True
+            logger.info(f"Issue tracker loaded {len(self._states)} issues from {replayed} history events.")
+
+    def _set(self, key: IssueKey, state: str, at: int, resource: Optional[str]):
+        entry = self._states.setdefault(key, {"proposed_at": None})
+        entry.update({"state": state, "updated_at": at, "resource": resource})
+        if state == PROPOSED:
+            entry["proposed_at"] = at
+        if state in (PROPOSED, APPLIED):
+            self._pending.add(key)
+        else:
+            self._pending.discard(key)
+
+    def state(self, key: IssueKey) -> str:
+        entry = self._states.get(key)
+        return entry["state"] if entry else OPEN
+
+    def is_handled(self, issue: DiagnosticResult) -> bool:
+        """True if a cycle should skip this issue."""
+        key = issue_key(issue)
+        entry = self._states.get(key)
+        if entry is None:
+            return False
+        age = int(time.time() * 1000) - entry["updated_at"]
+        if entry["state"] == PROPOSED:
+            # Proposals nobody applied expire, so the issue gets a fresh one
+            return age < settings.ISSUE_PROPOSAL_TTL * 1000
+        if entry["state"] == FAILED:
+            # Failed fixes become eligible again after a cool-down
+            return age < settings.ISSUE_RETRY_AFTER * 1000
+        return key in self._pending
+
+    def keys_in_state(self, state: str) -> List[IssueKey]:
+        return [key for key, entry in self._states.items() if entry["state"] == state]
+
+    def resource_of(self, key: IssueKey) -> Optional[str]:
+        entry = self._states.get(key)
+        return entry.get("resource") if entry else None
+
+    async def transition(
+        self,
+        key: IssueKey,
+        state: str,
+        category: Optional[str] = None,
+        resource: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ):
+        """Moves an issue to a new state and records it in history."""
+        now = int(time.time() * 1000)
+        metrics = dict(metrics or {})
+        entry = self._states.get(key)
+        if state in (APPLIED, VERIFIED) and entry and entry.get("proposed_at"):
+            metrics["time_to_fix_ms"] = now - entry["proposed_at"]
+
+        self._set(key, state, now, resource)
+        await history_writer.record(
+            issue_id=key[0],
+            action=STATE_ACTIONS[state],
+            category=category,
+            resource=resource,
+            fingerprint=key[1],
+            metrics=metrics,
+            details=details or {}
+        )
+
+# Singleton instance
+issue_tracker = IssueTracker()
@@ -0,0 +1,444 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator
+from app.services.es_client import es_wrapper
+from app.services.es_transport import prioritized, request_priority
+from app.services.coordination import coordinator
+from app.utils import content_hash
+from app.services.telemetry import tracer
+from app.config import settings
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL = {SUCCEEDED, FAILED}
+
+JOBS_INDEX = ".autofixer-jobs"
+GC_LOCK_RESOURCE = "__jobs_gc__"
+REMOTE_POLL_INTERVAL = 1.0 # Seconds between reads of a job another replica runs
+
+# Jobs are fetched by id or listed by kind/status; results, errors and the
+# idempotency claims' keys live in _source only.
+JOBS_MAPPINGS = {
+    "dynamic": "false",
+    "properties": {
+        "job_id": {"type": "keyword"},
+        "kind": {"type": "keyword"},
+        "status": {"type": "keyword"},
+        "cluster": {"type": "keyword"},
+        "owner": {"type": "keyword"},
+        "claim_of": {"type": "keyword"}, # Idempotency claims: the job holding the key
+        "submitted_at": {"type": "date"},
+        "heartbeat_at": {"type": "date"},
+        "expires_at": {"type": "date"}
+    }
+}
+
+logger = logging.getLogger("autofixer.jobs")
+
+class JobQueueFullError(Exception):
+    """Raised when the job backlog is at JOB_QUEUE_SIZE."""
+
+def _conflict(e: Exception) -> bool:
+    return "version_conflict" in str(e) or getattr(e, "status_code", None) == 409
+
+class JobRunner:
+    """
+    Runs long operations (generate-fix, benchmark, apply-fix) off the request path.
+    1. submit() returns a job right away; a bounded pool of workers runs it
+       on the cluster and with the priority of the submitting request.
+    2. Submits are idempotent: the same Idempotency-Key (scoped by kind and
+       cluster; by default, a hash of the kind, cluster and payload) returns the
+       existing job instead of redoing the work, until the job expires. Failed
+       jobs can be resubmitted.
+    3. Jobs are persisted in JOBS_INDEX (default cluster), so any replica can read,
+       long-poll or dedupe them; keys are claimed there with create-only writes.
+       The submitting replica runs the job and heartbeats it every JOB_HEARTBEAT;
+       one whose replica stopped heartbeating reads as failed.
+    4. Finished jobs are kept for JOB_RESULT_TTL seconds.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._by_key: Dict[str, str] = {} # idempotency key -> job id
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._index_ready = False
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        self.handlers[kind] = handler
+
+    def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(settings.JOB_WORKERS)]
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        tasks, self._workers = self._workers + [self._maintenance], []
+        self._maintenance = None
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[task for task in tasks if task is not None], return_exceptions=True)
+
+    # ---------------------------------------------------------
+    # Persistence
+    # ---------------------------------------------------------
+    async def _get_client(self):
+        # Not cached: es_wrapper keeps the connection; jobs of every cluster live on the default one
+        return await es_wrapper.get_client(es_wrapper.default)
+
+    async def ensure_index(self):
+        if self._index_ready:
+            return
+        client = await self._get_client()
+        if not await client.indices.exists(index=JOBS_INDEX):
+            try:
+                await client.indices.create(
+                    index=JOBS_INDEX,
+                    body={
+                        "settings": {"index.hidden": True},
+                        "mappings": JOBS_MAPPINGS
+                    }
+                )
+            except Exception as e:
+                if "resource_already_exists_exception" not in str(e):
+                    raise
+        self._index_ready = True
+
+    def _doc(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        now = int(time.time() * 1000)
+        return {
+            **self.public(job),
+            "owner": coordinator.replica_id,
+            "heartbeat_at": now,
+            "expires_at": now + int(settings.JOB_RESULT_TTL * 1000) if job["status"] in TERMINAL else None
+        }
+
+    async def _save(self, job: Dict[str, Any]):
+        """Writes the job's state; external versions make out-of-order writes harmless."""
+        job["_version"] += 1
+        try:
+            await self.ensure_index()
+            client = await self._get_client()
+            await client.index(
+                index=JOBS_INDEX, id=job["job_id"], body=self._doc(job),
+                version=job["_version"], version_type="external"
+            )
+        except Exception as e:
+            if not _conflict(e): # A newer state got there first
+                logger.warning(f"Could not persist job {job['job_id']}: {e}")
+
+    async def _claim(self, key: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Takes the idempotency key for job_id; returns the live job holding it instead, if any."""
+        client = await self._get_client()
+        claim_id = f"key:{content_hash(key)}"
+        claim = {"claim_of": job_id}
+        try:
+            await client.index(index=JOBS_INDEX, id=claim_id, body=claim, op_type="create")
+            return None
+        except Exception as e:
+            if not _conflict(e):
+                raise
+
+        doc = await client.get(index=JOBS_INDEX, id=claim_id)
+        holder = await self._load(doc["_source"]["claim_of"])
+        if holder is not None and holder["status"] != FAILED:
+            return holder
+        try:
+            # Holder failed or expired: take the key over, unless someone just did
+            await client.index(
+                index=JOBS_INDEX, id=claim_id, body=claim,
+                if_seq_no=doc["_seq_no"], if_primary_term=doc["_primary_term"]
+            )
+        except Exception as e:
+            if not _conflict(e):
+                raise
+            return await self._claim(key, job_id)
+        return None
+
+    async def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job as persisted (None if unknown or expired)."""
+        await self.ensure_index()
+        client = await self._get_client()
+        resp = await client.options(ignore_status=404).get(index=JOBS_INDEX, id=job_id)
+        if not resp.get("found") or "status" not in resp["_source"]:
+            return None
+        return self._view(resp["_source"])
+
+    @staticmethod
+    def _view(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        now = int(time.time() * 1000)
+        if doc.get("expires_at") is not None and doc["expires_at"] <= now:
+            return None
+        job = {k: v for k, v in doc.items() if k not in ("owner", "heartbeat_at", "expires_at")}
+        stale_before = now - int(settings.JOB_HEARTBEAT * 3 * 1000)
+        if job["status"] not in TERMINAL and doc["heartbeat_at"] < stale_before:
+            job.update(status=FAILED, error=f"Replica {doc['owner']} stopped before the job finished; resubmit it.")
+        return job
+
+    # ---------------------------------------------------------
+    # Submitting & reading
+    # ---------------------------------------------------------
+    async def submit(self, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise KeyError(kind)
+        self._purge()
+        cluster = es_wrapper.selected()
+        key = f"{kind}:{es_wrapper.current()}:{idempotency_key}" if idempotency_key else content_hash(
+            {"kind": kind, "cluster": cluster, "payload": payload}
+        )
+        existing = self.jobs.get(self._by_key.get(key, ""))
+        if existing and existing["status"] != FAILED:
+            return self.public(existing)
+        if self._queue is None or self._queue.full():
+            raise JobQueueFullError(f"Job queue is full ({settings.JOB_QUEUE_SIZE} pending).")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "cluster": cluster,
+            "idempotency_key": key,
+            "submitted_at": int(time.time() * 1000),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "_payload": payload,
+            "_priority": request_priority.get(),
+            "_expires_at": None,
+            "_version": 0
+        }
+        # Saved before claiming, so a replica that loses the race finds the holder
+        await self._save(job)
+        try:
+            holder = await self._claim(key, job["job_id"])
+        except Exception as e:
+            logger.warning(f"Could not claim idempotency key for job {job['job_id']}; deduplicating on this replica only: {e}")
+            holder = None
+        if holder is not None:
+            await self._discard(job["job_id"])
+            return holder
+
+        self.jobs[job["job_id"]] = job
+        self._by_key[key] = job["job_id"]
+        self._changed[job["job_id"]] = asyncio.Event()
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except asyncio.QueueFull:
+            # Filled up while we were persisting
+            self._transition(job, FAILED, error="Job queue is full.", _expires_at=time.monotonic())
+            await self._save(job)
+            raise JobQueueFullError(f"Job queue is full ({settings.JOB_QUEUE_SIZE} pending).")
+        return self.public(job)
+
+    async def _discard(self, job_id: str):
+        try:
+            client = await self._get_client()
+            await client.options(ignore_status=404).delete(index=JOBS_INDEX, id=job_id)
+        except Exception as e:
+            logger.warning(f"Could not delete duplicate job {job_id}: {e}")
+
+    @staticmethod
+    def public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in job.items() if not k.startswith("_")}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job from any replica: ours from memory, others' from JOBS_INDEX."""
+        self._purge()
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return self.public(job)
+        try:
+            return await self._load(job_id)
+        except Exception as e:
+            logger.warning(f"Could not read job {job_id}: {e}")
+            return None
+
+    async def list_jobs(self, kind: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Latest jobs of every replica (ours only, if JOBS_INDEX can't be read)."""
+        self._purge()
+        found = {job_id: self.public(job) for job_id, job in self.jobs.items()}
+        filters: List[Dict[str, Any]] = [{"exists": {"field": "status"}}] # Not the claims
+        if kind is not None:
+            filters.append({"term": {"kind": kind}})
+        try:
+            client = await self._get_client()
+            resp = await client.search(
+                index=JOBS_INDEX,
+                body={"size": 100, "query": {"bool": {"filter": filters}}, "sort": [{"submitted_at": "desc"}]},
+                ignore_unavailable=True
+            )
+            for hit in resp["hits"]["hits"]:
+                job = self._view(hit["_source"])
+                if job is not None and hit["_id"] not in found:
+                    found[hit["_id"]] = job
+        except Exception as e:
+            logger.warning(f"Could not list persisted jobs: {e}")
+        return [
+            job for job in sorted(found.values(), key=lambda j: j["submitted_at"], reverse=True)
+            if status is None or job["status"] == status # After _view: stale jobs read as failed
+        ]
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long poll: returns once the job finishes or the timeout passes."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return await self._wait_remote(job_id, timeout)
+        deadline = time.monotonic() + timeout
+        while job["status"] not in TERMINAL and time.monotonic() < deadline:
+            event = self._changed.get(job_id)
+            if event is None:
+                break
+            try:
+                await asyncio.wait_for(event.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+        return self.public(job)
+
+    async def watch(self, job_id: str, timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the job now and after every status change, until it finishes or the timeout passes."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            async for remote in self._watch_remote(job_id, timeout):
+                yield remote
+            return
+        deadline = time.monotonic() + timeout
+        last = None
+        while True:
+            event = self._changed.get(job_id) # Taken before yielding, so no change slips by
+            if job["status"] != last:
+                last = job["status"]
+                yield self.public(job)
+            if last in TERMINAL or time.monotonic() >= deadline or event is None:
+                return
+            try:
+                await asyncio.wait_for(event.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _wait_remote(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        job = None
+        async for job in self._watch_remote(job_id, timeout):
+            pass
+        return job
+
+    async def _watch_remote(self, job_id: str, timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        """watch() for a job another replica runs: polls JOBS_INDEX every REMOTE_POLL_INTERVAL."""
+        job = await self.get(job_id)
+        deadline = time.monotonic() + timeout
+        last = None
+        while job is not None:
+            if job["status"] != last:
+                last = job["status"]
+                yield job
+            remaining = deadline - time.monotonic()
+            if last in TERMINAL or remaining <= 0:
+                return
+            await asyncio.sleep(min(REMOTE_POLL_INTERVAL, remaining))
+            job = await self.get(job_id) or job
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": len(self._workers), "queued": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    # ---------------------------------------------------------
+    # Workers
+    # ---------------------------------------------------------
+    def _transition(self, job: Dict[str, Any], status: str, **fields):
+        job.update(status=status, **fields)
+        # Wake watchers and arm a fresh event for the next change
+        event = self._changed.get(job["job_id"])
+        self._changed[job["job_id"]] = asyncio.Event()
+        if event is not None:
+            event.set()
+
+    async def _work(self):
+        while True:
+            job = self.jobs.get(await self._queue.get())
+            if job is None:
+                continue # Expired before it ran
+            self._transition(job, RUNNING, started_at=int(time.time() * 1000))
+            await self._save(job)
+            try:
+                with es_wrapper.using(job["cluster"]), prioritized(job["_priority"]), tracer.span(f"job.{job['kind']}"):
+                    result = await self.handlers[job["kind"]](job["_payload"])
+                status, fields = SUCCEEDED, {"result": result}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job['job_id']} ({job['kind']}) failed: {e}")
+                status, fields = FAILED, {"error": str(e) or type(e).__name__}
+            self._transition(
+                job, status, finished_at=int(time.time() * 1000),
+                _expires_at=time.monotonic() + settings.JOB_RESULT_TTL, **fields
+            )
+            await self._save(job)
+
+    async def _maintain(self):
+        """Heartbeats our unfinished jobs and deletes expired ones (and their key claims)."""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT)
+            try:
+                await self._heartbeat()
+                if coordinator.owns(es_wrapper.qualify(GC_LOCK_RESOURCE, es_wrapper.default)):
+                    await self._delete_expired()
+            except Exception as e:
+                logger.warning(f"Job maintenance failed: {e}")
+
+    async def _heartbeat(self):
+        body = []
+        for job in self.jobs.values():
+            if job["status"] not in TERMINAL:
+                job["_version"] += 1
+                body.append({"index": {"_index": JOBS_INDEX, "_id": job["job_id"], "version": job["_version"], "version_type": "external"}})
+                body.append(self._doc(job))
+        if body:
+            await self.ensure_index()
+            client = await self._get_client()
+            await client.bulk(body=body) # Version conflicts only mean a newer state was saved
+
+    async def _delete_expired(self):
+        client = await self._get_client()
+        resp = await client.search(
+            index=JOBS_INDEX,
+            body={"size": 1000, "query": {"range": {"expires_at": {"lt": int(time.time() * 1000)}}}, "_source": False},
+            ignore_unavailable=True
+        )
+        expired = [hit["_id"] for hit in resp["hits"]["hits"]]
+        if not expired:
+            return
+        claims = await client.search(
+            index=JOBS_INDEX,
+            body={"size": 1000, "query": {"terms": {"claim_of": expired}}, "_source": False, "seq_no_primary_term": True}
+        )
+        body = [{"delete": {"_index": JOBS_INDEX, "_id": job_id}} for job_id in expired]
+        for hit in claims["hits"]["hits"]:
+            # Unless the key was claimed again meanwhile
+            body.append({"delete": {
+                "_index": JOBS_INDEX, "_id": hit["_id"],
+                "if_seq_no": hit["_seq_no"], "if_primary_term": hit["_primary_term"]
+            }})
+        await client.bulk(body=body)
+
+    def _purge(self):
+        now = time.monotonic()
+        for job_id in [j for j, job in self.jobs.items() if job["_expires_at"] is not None and job["_expires_at"] <= now]:
+            job = self.jobs.pop(job_id)
+            self._changed.pop(job_id, None)
+            if self._by_key.get(job["idempotency_key"]) == job_id:
+                del self._by_key[job["idempotency_key"]]
+
+# Singleton instance
+jobs = JobRunner()
@@ -0,0 +1,287 @@
+import atexit
+import bisect
+import functools
+import json
+import logging
+import queue
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, List, Optional, Tuple, Callable, Deque
+from app.config import settings
+
+logger = logging.getLogger("autofixer.telemetry")
+
+# Seconds; covers a cached cat call up to a slow reindex poll
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self.values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.values: Dict[Tuple[str, ...], List[float]] = {} # labels -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value: float, *labels: str):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, series in self.values.items():
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, "+Inf"), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus registry (text exposition format 0.0.4).
+    1. Metrics are updated on the event loop, so no locking is needed.
+    2. Collectors run at scrape time to refresh gauges that mirror other
+       components' state (limiter, breaker, caches).
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        return self._register(Histogram(name, help, labels))
+
+    def on_collect(self, fn: Callable[[], None]):
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter("autofixer_http_requests_total", "API requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = metrics.histogram("autofixer_http_request_duration_seconds", "API request latency.", ("method", "route"))
+ES_REQUESTS = metrics.counter("autofixer_es_requests_total", "Elasticsearch calls by cluster, API and status.", ("cluster", "api", "status"))
+ES_LATENCY = metrics.histogram("autofixer_es_request_duration_seconds", "Elasticsearch call latency (incl. limiter wait).", ("cluster", "api"))
+INFERENCE_REQUESTS = metrics.counter("autofixer_inference_requests_total", "Inference API calls by outcome.", ("outcome",))
+INFERENCE_LATENCY = metrics.histogram("autofixer_inference_duration_seconds", "Inference API latency.")
+CACHE_REQUESTS = metrics.counter("autofixer_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+STAGE_LATENCY = metrics.histogram("autofixer_stage_duration_seconds", "Duration of agent stages (traced spans).", ("stage",))
+STAGE_ERRORS = metrics.counter("autofixer_stage_errors_total", "Agent stages that raised.", ("stage",))
+LOG_DROPPED = metrics.counter("autofixer_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+# ---------------------------------------------------------
+# Tracing
+# ---------------------------------------------------------
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Per-cycle traces: span() nests under the enclosing span, or starts a new trace.
+    1. Finished traces are kept in a ring buffer for /api/v1/traces.
+    2. Every span feeds the stage latency histogram, so /metrics shows where
+       cycle time goes without keeping traces around.
+    3. With opentelemetry-api installed, spans are mirrored to OTel (and the ES
+       client's own spans nest under them).
+    """
+
+    def __init__(self, size: Optional[int] = None):
+        self.size = size
+        self._traces: Optional[Deque[Dict[str, Any]]] = None
+        self._otel: Any = None # OTel tracer; False once we know there isn't one
+
+    @property
+    def traces(self) -> Deque[Dict[str, Any]]:
+        if self._traces is None:
+            self._traces = deque(maxlen=self.size or settings.TRACE_BUFFER)
+        return self._traces
+
+    def _otel_tracer(self):
+        """Optional: imported on the first span, so startup doesn't pay for it."""
+        if self._otel is None:
+            self._otel = False
+            if settings.TRACING_OTEL:
+                try:
+                    from opentelemetry import trace as otel_trace
+                    self._otel = otel_trace.get_tracer("autofixer")
+                except ImportError:
+                    pass
+        return self._otel
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        parent = _current_span.get()
+        now = time.time()
+        if parent is None:
+            trace = {"trace_id": uuid.uuid4().hex, "name": name, "started_at": int(now * 1000), "spans": []}
+        else:
+            trace = parent["trace"]
+        span = {
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "start_ms": round((now * 1000) - trace["started_at"], 2),
+            "attributes": attributes,
+            "status": "ok"
+        }
+        trace["spans"].append(span)
+        token = _current_span.set({"trace": trace, "span_id": span["span_id"], "span": span})
+        start = time.perf_counter()
+        otel = self._otel_tracer()
+        otel_span = otel.start_as_current_span(name, attributes=attributes) if otel else None
+        try:
+            if otel_span is not None:
+                with otel_span:
+                    yield span
+            else:
+                yield span
+        except BaseException as e:
+            span["status"] = "error"
+            span["error"] = str(e) or type(e).__name__
+            STAGE_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            span["duration_ms"] = round(elapsed * 1000, 2)
+            STAGE_LATENCY.observe(elapsed, name)
+            _current_span.reset(token)
+            if parent is None:
+                trace["duration_ms"] = span["duration_ms"]
+                self.traces.append(trace)
+
+    def traced(self, name: str):
+        """Decorator form of span() for coroutine functions."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @staticmethod
+    def annotate(**attributes: Any):
+        """Adds attributes to the current span (no-op outside one)."""
+        current = _current_span.get()
+        if current is not None:
+            current["span"]["attributes"].update(attributes)
+
+    def recent(self, limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        traces = [trace for trace in reversed(self.traces) if name is None or trace["name"] == name]
+        return traces[:limit]
+
+tracer = Tracer()
+
+# ---------------------------------------------------------
+# Logging
+# ---------------------------------------------------------
+class EcsFormatter(logging.Formatter):
+    """Renders records logged with extra={'ecs': {...}} as one JSON line (on the listener thread)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "ecs", None)
+        if fields is None:
+            return super().format(record)
+        return json.dumps({**fields, "message": record.getMessage()})
+
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc() # Never block the event loop on logging
+
+_listener: Optional[QueueListener] = None
+
+def start_logging(level: int = logging.INFO):
+    """
+    Routes all logging through a bounded queue; formatting and I/O happen on a
+    listener thread instead of the event loop.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler()
+    output.setFormatter(EcsFormatter("%(levelname)s:%(name)s:%(message)s"))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [_DroppingQueueHandler(log_queue)]
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Drains queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
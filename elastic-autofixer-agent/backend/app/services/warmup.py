@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from app.config import settings
+
+logger = logging.getLogger("autofixer.warmup")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+RETRYING = "retrying"
+
+class WarmUp:
+    """
+    Start-up work that needs Elasticsearch, run in the background so the API is
+    live immediately and a slow or unreachable cluster can't hold up a pod start.
+    1. Each step is its own task and retries with exponential back-off until it
+       succeeds; a step can wait for another one (e.g. the knowledge base waits
+       for the cluster connection).
+    2. The service is ready once every required step is done (/readyz).
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._fns: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.started_at: Optional[float] = None
+
+    def add(self, name: str, fn: Callable[[], Awaitable[Any]], required: bool = True, after: Optional[str] = None):
+        self._fns[name] = fn
+        self.steps[name] = {"state": PENDING, "required": required, "after": after, "attempts": 0, "error": None}
+
+    def start(self):
+        if self._tasks:
+            return
+        self.started_at = time.monotonic()
+        self._done = {name: asyncio.Event() for name in self.steps}
+        self._tasks = [asyncio.create_task(self._run_step(name)) for name in self.steps]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_step(self, name: str):
+        step = self.steps[name]
+        if step["after"]:
+            await self._done[step["after"]].wait()
+        while True:
+            step["state"] = RUNNING
+            step["attempts"] += 1
+            try:
+                await self._fns[name]()
+                break
+            except Exception as e:
+                delay = min(settings.ES_CONNECT_BACKOFF_MAX, 2 ** (step["attempts"] - 1))
+                step.update(state=RETRYING, error=str(e), retry_in=delay)
+                logger.warning(f"Warm-up step '{name}' failed (attempt {step['attempts']}), retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+        step.update(state=DONE, error=None, took_ms=round((time.monotonic() - self.started_at) * 1000, 1))
+        step.pop("retry_in", None)
+        self._done[name].set()
+
+    def ready(self) -> bool:
+        return self.started_at is not None and all(
+            step["state"] == DONE for step in self.steps.values() if step["required"]
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready(), "steps": self.steps}
+
+# Singleton instance
+warmup = WarmUp()
@@ -0,0 +1,11 @@
+import hashlib
+import json
+from typing import Any
+
+def canonical_json(value: Any) -> bytes:
+    """Stable JSON encoding (sorted keys, no whitespace): equal values give equal bytes."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+def content_hash(value: Any) -> str:
+    """SHA-256 of a value's canonical JSON; used for content addressing, cache keys and ETags."""
+    return hashlib.sha256(canonical_json(value)).hexdigest()
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import tempfile
+
+# Settings are read once, so the simulated clusters are configured before anything imports app.*
+SPILL_DIR = tempfile.mkdtemp(prefix="autofixer-tests-")
+os.environ.update({
+    "ELASTIC_ENDPOINT": "",
+    "ELASTIC_CLOUD_ID": "",
+    "ELASTIC_API_KEY": "simulated", # Enables the inference path
+    "ELASTIC_CLUSTERS": json.dumps({
+        "default": {"simulated": {"indices": 10, "bad_share": 0.2, "latency_ms": 0, "inference_ms": 0}},
+        "east": {"simulated": {"indices": 4, "bad_share": 0.5, "latency_ms": 0, "inference_ms": 0, "seed": 1}}
+    }),
+    "COORDINATION_ENABLED": "false",
+    "HISTORY_SPILL_PATH": os.path.join(SPILL_DIR, "history-spill.jsonl")
+})
+
+import pytest
+from app.services import es_simulator
+from app.services.es_client import es_wrapper
+
+@pytest.fixture
+def run():
+    """
+    Runs a coroutine against fresh simulated clusters: each test starts from the
+    synthetic fleet, with no documents left behind by an earlier one.
+    """
+    def runner(coro):
+        async def main():
+            es_simulator.clusters.clear()
+            try:
+                return await coro
+            finally:
+                await es_wrapper.close()
+        return asyncio.run(main())
+    return runner
+
+@pytest.fixture
+def cluster():
+    """The simulated cluster behind a name (after the test connected to it)."""
+    return lambda name="default": es_simulator.clusters[f"{name}.simulated"]
+
+@pytest.fixture
+def api():
+    """The app, started (lifespan and warm-up) against fresh simulated clusters."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    es_simulator.clusters.clear()
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,37 @@
+import pytest
+from app.services.es_client import es_wrapper
+from app.services.agent_flow import agent
+from app.core.diagnostic import scanner
+from app.core.fix_generator import fix_generator
+from app.core.validator import validator
+
+def test_scan_finds_the_bad_indices(run, cluster):
+    async def scenario():
+        results = await scanner.scan_clusters()
+        return {name: {issue.affected_resource for issue in issues} for name, issues in results.items()}
+
+    found = run(scenario())
+    for name in ("default", "east"):
+        bad = {index for index in cluster(name).indices if index.startswith("bad-")}
+        assert bad and bad <= found[name]
+
+def test_scan_failure_propagates(run, cluster):
+    async def scenario():
+        await es_wrapper.get_client()
+        cluster().error_rate = 1.0 # Every call (retries included) fails with 503
+        await scanner.scan_all()
+
+    with pytest.raises(Exception, match="unavailable_shards_exception"):
+        run(scenario())
+
+def test_cycle_proposes_and_mapping_fix_applies(run):
+    async def scenario():
+        cycle = await agent.run_autonomous_cycle()
+        issue = next(issue for issue in await scanner.scan_all() if issue.category == "mapping")
+        proposal = await fix_generator.generate_fix(issue)
+        assert await validator.validate_syntax(proposal)
+        return cycle, await validator.apply_fix(proposal)
+
+    cycle, applied = run(scenario())
+    assert cycle["status"] == "action_required"
+    assert applied["status"] == "success", applied
@@ -0,0 +1,21 @@
+def _mapping_issue(api, cluster):
+    issues = api.get("/api/v1/diagnose", params={"cluster": cluster}).json()
+    return next(issue for issue in issues if issue["category"] == "mapping")
+
+def test_fixes_apply_to_the_issue_cluster(api, cluster):
+    issue = _mapping_issue(api, "east")
+    proposal = api.post("/api/v1/generate-fix", json=issue).json() # No ?cluster=: the default
+    assert proposal["cluster"] == "east"
+
+    before = {name: cluster(name).indices[issue["affected_resource"]]["version"] for name in ("default", "east")}
+    resp = api.post("/api/v1/apply-fix", json=proposal)
+    assert resp.status_code == 200, resp.text
+    after = {name: cluster(name).indices[issue["affected_resource"]]["version"] for name in ("default", "east")}
+    assert after["east"] > before["east"]
+    assert after["default"] == before["default"] # Same index name, other cluster: untouched
+
+def test_conflicting_cluster_parameter_is_rejected(api):
+    proposal = api.post("/api/v1/generate-fix", json=_mapping_issue(api, "east")).json()
+    for path in ("/api/v1/apply-fix", "/api/v1/benchmark", "/api/v1/canary", "/api/v1/jobs/apply-fix"):
+        resp = api.post(path, json=proposal, params={"cluster": "default"})
+        assert resp.status_code == 400, (path, resp.text)
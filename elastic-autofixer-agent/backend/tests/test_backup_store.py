@@ -0,0 +1,96 @@
+import types
+import pytest
+from app.config import settings
+from app.services import backup_store as backups
+from app.services.backup_store import BackupStore, BLOB_INDEX, SNAPSHOT_INDEX
+
+DAY_MS = 86_400_000
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Epoch ms the store sees as 'now' (it stamps snapshots and blobs with it)."""
+    now = {"ms": 1_700_000_000_000}
+    monkeypatch.setattr(backups, "time", types.SimpleNamespace(time=lambda: now["ms"] / 1000))
+    return now
+
+def mappings(dynamic="true"):
+    return {"mappings": {"dynamic": dynamic, "properties": {"message": {"type": "text"}}}}
+
+async def count(store, index):
+    client = await store._get_client()
+    return (await client.count(index=index))["count"]
+
+def test_identical_mappings_are_stored_once(run, clock):
+    async def scenario():
+        store = BackupStore()
+        first = await store.save({f"logs-{i}": mappings() for i in range(3)}, "mapping")
+        second = await store.save({"logs-9": mappings(), "other": mappings("strict")}, "mapping")
+        loaded = await store.load(list(first.values()) + list(second.values()))
+        return first, second, loaded, await count(store, BLOB_INDEX), await count(store, SNAPSHOT_INDEX)
+
+    first, second, loaded, blobs, snapshots = run(scenario())
+    assert blobs == 2 and snapshots == 5
+    shared = [loaded[backup_id]["parts"]["mappings"] for backup_id in [*first.values(), second["logs-9"]]]
+    assert len(set(shared)) == 1
+    assert loaded[second["other"]]["state"] == mappings("strict")
+
+def test_restore_goes_back_to_a_point_in_time(run, cluster, clock):
+    index = "logs-app-00002"
+
+    async def scenario():
+        store = BackupStore()
+        await store.save({index: mappings("strict")}, "mapping")
+        taken = clock["ms"]
+        clock["ms"] += 60_000
+        await store.save({index: mappings("false")}, "mapping")
+
+        restored = await store.restore(index, "mapping", at=taken + 1_000)
+        dynamic = cluster().indices[index]["mappings"]["dynamic"]
+        latest = await store.restore(index, "mapping")
+        return restored, dynamic, latest, await store.find(index, "mapping", at=taken - 1)
+
+    restored, dynamic, latest, before_any = run(scenario())
+    assert restored["status"] == "rolled_back" and dynamic == "strict"
+    assert latest["backup_id"] != restored["backup_id"]
+    assert cluster().indices["logs-app-00002"]["mappings"]["dynamic"] == "false"
+    assert before_any is None
+
+def test_restore_many_groups_identical_bodies(run, cluster, clock):
+    same = ["logs-app-00002", "logs-app-00003"]
+
+    async def scenario():
+        store = BackupStore()
+        ids = await store.save({index: mappings("strict") for index in same}, "mapping")
+        ids.update(await store.save({"bad-ilm-00001": mappings("false")}, "mapping"))
+        calls = cluster().requests.get("put_mapping", 0)
+        outcomes = await store.restore_many(list(ids.values()))
+        return outcomes, cluster().requests["put_mapping"] - calls
+
+    outcomes, put_mappings = run(scenario())
+    assert {status for status, _ in outcomes.values()} == {"rolled_back"}
+    assert put_mappings == 2 # One multi-index call for the two identical bodies
+    assert all(cluster().indices[index]["mappings"]["dynamic"] == "strict" for index in same)
+
+@pytest.mark.parametrize("grace, blobs_deleted", [(60.0, 1), (100 * 86_400.0, 0)])
+def test_gc_keeps_the_newest_snapshot_and_recent_blobs(run, clock, monkeypatch, grace, blobs_deleted):
+    monkeypatch.setattr(settings, "BACKUP_RETENTION_DAYS", 30.0)
+    monkeypatch.setattr(settings, "BACKUP_GC_GRACE", grace)
+
+    async def scenario():
+        store = BackupStore()
+        old = await store.save({"logs": mappings("strict"), "quiet": mappings("true")}, "mapping")
+        clock["ms"] += DAY_MS
+        newer = await store.save({"logs": mappings("false")}, "mapping")
+        clock["ms"] += 40 * DAY_MS
+        result = await store.gc()
+        remaining = await store.load(list(old.values()) + list(newer.values()))
+        return old, newer, result, remaining, await count(store, BLOB_INDEX)
+
+    old, newer, result, remaining, blobs = run(scenario())
+    # Both are past retention, but only 'logs' has a newer snapshot
+    assert result["snapshots_deleted"] == 1
+    assert set(remaining) == {old["quiet"], newer["logs"]}
+    assert all("state" in snapshot for snapshot in remaining.values())
+    # The old 'logs' blob is unreferenced now; it goes once the grace period is over
+    assert result["blobs_deleted"] == blobs_deleted
+    assert blobs == 3 - blobs_deleted
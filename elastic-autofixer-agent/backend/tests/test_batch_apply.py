@@ -0,0 +1,85 @@
+import pytest
+from app.config import settings
+from app.core.batch_apply import batch_applier, JOURNAL_INDEX
+from app.models.es_types import FixProposal
+from app.services import es_simulator
+from app.services.es_client import es_wrapper
+
+STRICT = {"dynamic": "strict"}
+
+def proposal(index, fixed_code=STRICT, cluster=None):
+    return FixProposal(
+        issue_id=f"issue-{index}", original_code={"index": index, "category": "mapping"},
+        fixed_code=fixed_code, explanation="", estimated_impact="", cluster=cluster
+    )
+
+async def create(*names, fields=1):
+    client = await es_wrapper.get_client()
+    for name in names:
+        properties = {f"f{i}": {"type": "keyword"} for i in range(fields)}
+        await client.indices.create(index=name, body={"mappings": {"properties": properties}})
+
+def test_identical_fixes_share_one_call_and_are_journaled(run, cluster):
+    async def scenario():
+        await create("logs-a", "logs-b", "logs-c")
+        calls = cluster().requests.get("put_mapping", 0)
+        # Same fix with its keys in another order groups too
+        result = await batch_applier.apply_batch([
+            proposal("logs-a"), proposal("logs-b"), proposal("logs-c", {"dynamic": "strict"}), proposal("logs-a")
+        ])
+        client = await es_wrapper.get_client()
+        await client.indices.refresh(index=JOURNAL_INDEX)
+        return result, cluster().requests["put_mapping"] - calls, await batch_applier.get_batch(result["batch_id"])
+
+    result, calls, batch = run(scenario())
+    assert (result["applied"], result["skipped"], result["failed"]) == (3, 1, 0)
+    assert result["cluster"] == "default"
+    assert calls == 1
+    assert batch["counts"] == {"success": 3}
+    assert {entry["index"] for entry in batch["results"]} == {"logs-a", "logs-b", "logs-c"}
+
+def test_partial_failure_falls_back_per_index(run, cluster, monkeypatch):
+    original = es_simulator.SimulatedCluster._put_mapping
+
+    def put_mapping(self, params, body, index):
+        if "logs-c" in index.split(","):
+            raise es_simulator.SimulatedError(400, "illegal_argument_exception", "simulated rejection")
+        return original(self, params, body, index)
+
+    monkeypatch.setattr(es_simulator.SimulatedCluster, "_put_mapping", put_mapping)
+
+    async def scenario():
+        await create("logs-a", "logs-b", "logs-c")
+        return await batch_applier.apply_batch([proposal("logs-a"), proposal("logs-b"), proposal("logs-c")])
+
+    result = run(scenario())
+    statuses = {r["index"]: r["status"] for r in result["results"]}
+    assert statuses == {"logs-a": "success", "logs-b": "success", "logs-c": "error"}
+
+def test_exploded_indices_are_not_made_strict_in_place(run, cluster, monkeypatch):
+    monkeypatch.setattr(settings, "REINDEX_EXPLODED_FIELDS", 2)
+
+    async def scenario():
+        await create("small")
+        await create("exploded", fields=5)
+        return await batch_applier.apply_batch([proposal("small"), proposal("exploded")])
+
+    result = run(scenario())
+    statuses = {r["index"]: r["status"] for r in result["results"]}
+    assert statuses == {"small": "success", "exploded": "reindex_required"}
+    assert cluster().indices["exploded"]["mappings"].get("dynamic") != "strict"
+
+def test_batch_is_rolled_back_on_its_own_cluster(api, cluster):
+    names = ["logs-app-00002", "logs-app-00003"]
+    resp = api.post("/api/v1/apply-fix/batch", json={"proposals": [proposal(name, cluster="east").dict() for name in names]})
+    assert resp.status_code == 200, resp.text
+    result = resp.json()
+    assert result["cluster"] == "east" and result["applied"] == 2
+
+    batch = api.get(f"/api/v1/apply-fix/batch/{result['batch_id']}").json() # No ?cluster=
+    assert batch["cluster"] == "east" and batch["counts"] == {"success": 2}
+
+    resp = api.post(f"/api/v1/apply-fix/batch/{result['batch_id']}/rollback")
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["rolled_back"] == 2
+    assert api.get(f"/api/v1/apply-fix/batch/{result['batch_id']}").json()["counts"] == {"rolled_back": 2}
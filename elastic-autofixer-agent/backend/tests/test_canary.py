@@ -0,0 +1,57 @@
+import pytest
+from app.config import settings
+from app.core.benchmarker import benchmarker
+from app.core.canary import canary_runner, CanaryRunner
+from app.core.diagnostic import scanner
+from app.core.fix_generator import fix_generator
+from app.models.es_types import BenchmarkResult
+
+def test_merge_mappings_rejects_type_changes():
+    current = {"properties": {
+        "status": {"type": "keyword"},
+        "user": {"properties": {"name": {"type": "text", "fields": {"raw": {"type": "keyword"}}}}}
+    }}
+    merged = CanaryRunner._merge_mappings(current, {"properties": {
+        "status": {"type": "keyword", "ignore_above": 256},
+        "user": {"properties": {"email": {"type": "keyword"}}}
+    }})
+    assert merged["properties"]["status"] == {"type": "keyword", "ignore_above": 256}
+    assert set(merged["properties"]["user"]["properties"]) == {"name", "email"}
+
+    with pytest.raises(ValueError, match=r"mapper \[status\] .* \[keyword\] to \[text\]"):
+        CanaryRunner._merge_mappings(current, {"properties": {"status": {"type": "text"}}})
+    with pytest.raises(ValueError, match=r"mapper \[user.name.raw\]"):
+        CanaryRunner._merge_mappings(current, {"properties": {"user": {"properties": {
+            "name": {"type": "text", "fields": {"raw": {"type": "wildcard"}}}
+        }}}})
+
+def test_compare_interleaves_and_takes_medians(run, monkeypatch):
+    calls, latencies = [], {"a": iter([1.0, 1.0, 50.0, 1.0, 1.0]), "b": iter([2.0, 2.0, 2.0, 90.0, 2.0])}
+
+    async def timed(index, body):
+        calls.append(index)
+        return next(latencies[index])
+
+    monkeypatch.setattr(benchmarker, "_timed_search", timed)
+    result = run(benchmarker.compare("a", {}, {}, optimized_index="b"))
+    assert calls == ["a", "b", "b", "a", "a", "b", "b", "a", "a", "b"]
+    assert (result.latency_before_ms, result.latency_after_ms) == (1.0, 2.0) # Outliers don't move medians
+
+def test_canary_ignores_regressions_under_the_floor(run, monkeypatch):
+    async def compare(*args, **kwargs):
+        return BenchmarkResult(
+            latency_before_ms=1.0, latency_after_ms=4.0, cpu_before=0.0, cpu_after=0.0,
+            improvement_percentage=-300.0, is_safe=False
+        )
+
+    async def scenario():
+        issue = next(issue for issue in await scanner.scan_all() if issue.category == "mapping")
+        return await canary_runner.run(await fix_generator.generate_fix(issue), sample_docs=50)
+
+    monkeypatch.setattr(benchmarker, "compare", compare)
+    report = run(scenario())
+    assert report["checks"]["latency"]["passed"], report
+
+    monkeypatch.setattr(settings, "CANARY_LATENCY_FLOOR_MS", 2.0)
+    report = run(scenario())
+    assert not report["checks"]["latency"]["passed"]
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services.coordination import Coordinator, LeaseHeldError, coordinator
+from app.services.es_client import es_wrapper
+from app.services.agent_flow import agent
+from app.core.diagnostic import scanner
+
+@pytest.fixture(autouse=True)
+def short_leases(monkeypatch):
+    monkeypatch.setattr(settings, "COORDINATION_PARTITIONS", 16)
+    monkeypatch.setattr(settings, "COORDINATION_LEASE_TTL", 0.4)
+    monkeypatch.setattr(settings, "COORDINATION_HEARTBEAT", 0.05)
+
+async def _replicas(*names):
+    client = await es_wrapper.get_client()
+    return [Coordinator(client=client, replica_id=name, enabled=True) for name in names]
+
+async def _settle(replicas, rounds=4):
+    """Heartbeats until the ring has converged (hand-overs take a round each)."""
+    for _ in range(rounds):
+        for replica in replicas:
+            await replica.heartbeat()
+
+def _assert_partitioned(replicas):
+    owned = [set(replica.owned_partitions) for replica in replicas]
+    assert set().union(*owned) == set(range(settings.COORDINATION_PARTITIONS))
+    assert sum(map(len, owned)) == settings.COORDINATION_PARTITIONS # Disjoint
+    assert all(owned) # The ring gives everyone a share
+
+def test_partitions_are_disjoint_and_fail_over(run):
+    async def scenario():
+        a, b, c = await _replicas("a", "b", "c")
+        await _settle([a, b, c])
+        _assert_partitioned([a, b, c])
+        assert all(sum(replica.owns(f"index-{i}") for replica in (a, b, c)) == 1 for i in range(50))
+
+        # c dies without releasing; once its leases expire the others take them over
+        await asyncio.sleep(settings.COORDINATION_LEASE_TTL + 0.1)
+        await _settle([a, b])
+        _assert_partitioned([a, b])
+
+    run(scenario())
+
+def test_resource_lock_is_exclusive_across_and_within_replicas(run):
+    async def scenario():
+        a, b = await _replicas("a", "b")
+        async with a.resource_lock("logs"):
+            with pytest.raises(LeaseHeldError):
+                async with b.resource_lock("logs"):
+                    pass
+            with pytest.raises(LeaseHeldError): # A second request on the same replica
+                async with a.resource_lock("logs"):
+                    pass
+            # Held past its TTL: renewals keep the lease alive
+            await asyncio.sleep(settings.COORDINATION_LEASE_TTL * 2)
+            with pytest.raises(LeaseHeldError):
+                async with b.resource_lock("logs"):
+                    pass
+
+        async with b.resource_lock("logs"):
+            pass
+
+    run(scenario())
+
+def test_the_cycle_only_scans_its_partitions(run, cluster, monkeypatch):
+    monkeypatch.setattr(coordinator, "_enabled", True)
+    monkeypatch.setattr(coordinator, "_held", {}) # No partitions: another replica has them all
+
+    async def scenario():
+        full = await scanner.scan_all()
+        mappings_read = cluster().requests.get("get_mapping", 0)
+        cycle = await agent.run_autonomous_cycle()
+        return full, mappings_read, cycle
+
+    issues, mappings_read, cycle = run(scenario())
+    assert issues # /diagnose still sees the whole cluster
+    assert mappings_read
+    assert cycle["status"] == "idle"
+    # The cycle's scan skipped every index outside this replica's partitions
+    assert cluster().requests.get("get_mapping", 0) == mappings_read
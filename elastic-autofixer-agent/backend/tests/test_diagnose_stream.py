@@ -0,0 +1,56 @@
+import json
+from app.services.es_simulator import SimulatedError
+
+def ndjson(resp):
+    return [json.loads(line) for line in resp.text.splitlines()]
+
+def sse(resp):
+    events = []
+    for frame in resp.text.split("\n\n"):
+        if frame:
+            event, data = frame.split("\n")
+            assert event.startswith("event: ") and data.startswith("data: ")
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+def test_ndjson_by_default_with_a_trailing_summary(api):
+    resp = api.get("/api/v1/diagnose/stream", params={"cluster": "east"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    records = ndjson(resp)
+
+    *issues, summary = records
+    assert issues and {record["type"] for record in issues} == {"issue"}
+    assert {record["data"]["cluster"] for record in issues} == {"east"}
+    assert summary["type"] == "summary"
+    assert summary["issues"] == len(issues)
+    assert summary["clusters"] == {"east": {"issues": len(issues), "error": None}}
+
+def test_sse_when_the_client_accepts_event_streams(api):
+    plain = ndjson(api.get("/api/v1/diagnose/stream", params={"cluster": "east"}))
+    for params, headers in (({"cluster": "east"}, {"Accept": "text/event-stream"}), ({"cluster": "east", "format": "sse"}, {})):
+        resp = api.get("/api/v1/diagnose/stream", params=params, headers=headers)
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = sse(resp)
+        assert [name for name, _ in events] == [record["type"] for record in plain]
+        assert events[-1][1]["issues"] == plain[-1]["issues"]
+
+    # An explicit format wins over Accept; anything else is rejected
+    resp = api.get("/api/v1/diagnose/stream", params={"cluster": "east", "format": "ndjson"}, headers={"Accept": "text/event-stream"})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    assert api.get("/api/v1/diagnose/stream", params={"format": "xml"}).status_code == 400
+
+def test_a_failed_cluster_is_an_error_record(api, cluster):
+    api.get("/api/v1/diagnose") # Connects to every cluster
+    cluster("east").fault = lambda handler: SimulatedError(503, "unavailable_shards_exception", "Simulated.") if handler == "cat_indices" else None
+
+    records = ndjson(api.get("/api/v1/diagnose/stream"))
+    errors = [record for record in records if record["type"] == "error"]
+    assert [error["cluster"] for error in errors] == ["east"]
+    assert {record["data"]["cluster"] for record in records if record["type"] == "issue"} == {"default"}
+
+    summary = records[-1]
+    assert summary["type"] == "summary"
+    assert summary["clusters"]["east"]["issues"] == 0
+    assert summary["clusters"]["east"]["error"] == errors[0]["error"]
+    assert summary["clusters"]["default"]["error"] is None
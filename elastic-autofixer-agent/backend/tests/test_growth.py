@@ -0,0 +1,69 @@
+import types
+import numpy as np
+import pytest
+from app.config import settings
+from app.core import growth
+from app.core.diagnostic import scanner
+from app.core.growth import GB, DAY, GrowthForecaster, _days_to, _slopes
+
+def test_slopes_fit_each_row_over_its_own_samples():
+    times = np.array([0.0, 10.0, 20.0, 30.0])
+    values = np.array([
+        [100.0, 120.0, 140.0, 160.0], # +2/s
+        [1e12, 1e12 + 50, np.nan, 1e12 + 150], # +5/s with a gap; large values don't lose precision
+        [np.nan, np.nan, np.nan, 7.0] # One sample: no rate yet
+    ])
+    mask = ~np.isnan(values)
+    (slope,), samples = _slopes(times, mask, (values, values[:, -1]))
+    assert slope == pytest.approx([2.0, 5.0, 0.0])
+    assert samples.tolist() == [4, 3, 1]
+
+def test_days_to_a_limit():
+    current = np.array([0.0, 10.0, 10.0, 5.0, 5.0])
+    limit = np.array([100.0, 10.0, 100.0, 100.0, 0.0])
+    per_day = np.array([10.0, 1.0, 0.0, -1.0, 1.0])
+    # Growing, already there, flat, shrinking, no limit
+    assert _days_to(current, limit, per_day).tolist() == [10.0, 0.0, np.inf, np.inf, np.inf]
+
+def _indices(day: int):
+    """Index listings on a given day; rates are GB/day from the sizes on day 0."""
+    rates = {"slow": (300, 5), "fast": (400, 20), "medium": (300, 10), "unmanaged": (1, 0), "managed": (1, 0)}
+    return [
+        {"index": name, "pri": "20", "pri.store.size": str((size + rate * day) * GB), "docs.count": "1000"}
+        for name, (size, rate) in rates.items()
+    ] + [{"index": ".system", "pri": "1", "pri.store.size": "0", "docs.count": "0"}]
+
+def test_lifecycle_issues_come_soonest_breach_first(run, monkeypatch):
+    clock = {"s": 1_700_000_000.0}
+    monkeypatch.setattr(growth, "time", types.SimpleNamespace(time=lambda: clock["s"]))
+    monkeypatch.setattr("app.core.diagnostic.growth_forecaster", GrowthForecaster())
+    monkeypatch.setattr(settings, "GROWTH_MAX_INDEX_SIZE_GB", 500.0)
+    policies = {"slow": "logs", "fast": "logs", "medium": None, "unmanaged": None, "managed": "logs"}
+
+    async def lifecycle_policies():
+        return policies
+    monkeypatch.setattr(scanner, "_lifecycle_policies", lifecycle_policies)
+
+    async def scenario():
+        scans = []
+        for day in range(settings.GROWTH_MIN_SAMPLES):
+            clock["s"] += DAY
+            scans.append([issue async for issue in scanner.iter_lifecycle_issues(_indices(day))])
+        return scans
+
+    scans = run(scenario())
+    # Until rates are trusted, only the missing policies show up
+    assert [issue.issue_id for issue in scans[0]] == ["missing_ilm_medium", "missing_ilm_unmanaged"]
+
+    issues = scans[-1]
+    assert [(issue.affected_resource, issue.severity) for issue in issues] == [
+        ("fast", "critical"),  # 440GB, +20GB/day: 3 days
+        ("medium", "high"),    # 320GB, +10GB/day: 18 days
+        ("unmanaged", "medium") # Not growing, but no policy
+    ]
+    fast, medium, unmanaged = issues
+    assert fast.metrics["days_to_breach"] == pytest.approx(3.0)
+    assert fast.metrics["limit"] == "index_size"
+    assert medium.issue_id == "missing_ilm_medium" and "No ILM policy" in medium.description
+    assert unmanaged.description.startswith("Missing ILM Policy")
+    assert unmanaged.metrics["days_to_breach"] is None
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import pytest
+from app.config import settings
+from app.services.es_simulator import SimulatedError
+from app.services.history import HistoryWriter, HISTORY_INDEX
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """A fresh writer spilling into the test's own directory, retrying without long waits."""
+    monkeypatch.setattr(settings, "HISTORY_SPILL_PATH", str(tmp_path / "history.spill.jsonl"))
+    monkeypatch.setattr(settings, "HISTORY_MAX_RETRIES", 1)
+    monkeypatch.setattr(settings, "ES_MAX_RETRIES", 0)
+    return HistoryWriter()
+
+def bulk_down(cluster) -> list:
+    """Fails every _bulk; returns the list the failed attempts are counted in."""
+    attempts = []
+
+    def fault(handler):
+        if handler == "bulk":
+            attempts.append(handler)
+            return SimulatedError(503, "unavailable_shards_exception", "Simulated.")
+    cluster().fault = fault
+    return attempts
+
+def spilled(writer):
+    with open(writer.spill_path, encoding="utf-8") as f:
+        return [json.loads(line)["issue_id"] for line in f]
+
+async def indexed(writer):
+    client = await writer._get_client()
+    resp = await client.search(index=HISTORY_INDEX, size=100, sort=[{"@timestamp": "asc"}])
+    return sorted(hit["_source"]["issue_id"] for hit in resp["hits"]["hits"])
+
+def test_flushes_once_the_buffer_is_full(run, cluster, writer, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_FLUSH_SIZE", 3)
+
+    async def scenario():
+        for i in range(2):
+            await writer.record(f"issue-{i}", "fix_applied", {})
+        buffered = len(writer.pending())
+        await writer.record("issue-2", "fix_applied", {})
+        return buffered, writer.pending(), await indexed(writer)
+
+    buffered, pending, ids = run(scenario())
+    assert buffered == 2 and not pending
+    assert ids == ["issue-0", "issue-1", "issue-2"]
+    assert cluster().requests["bulk"] == 1
+
+def test_flushes_on_the_interval_and_drains_on_stop(run, writer, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_FLUSH_INTERVAL", 0.05)
+
+    async def scenario():
+        writer.start()
+        await writer.record("periodic", "fix_applied", {})
+        await asyncio.sleep(0.3)
+        flushed = not writer.pending()
+        await writer.record("at-stop", "fix_applied", {})
+        await writer.stop()
+        return flushed, writer.pending(), await indexed(writer)
+
+    flushed, pending, ids = run(scenario())
+    assert flushed and not pending
+    assert ids == ["at-stop", "periodic"]
+
+def test_undeliverable_events_are_spilled_and_replayed(run, cluster, writer):
+    async def scenario():
+        await writer.record("first", "fix_applied", {})
+        await writer._get_client()
+        attempts = bulk_down(cluster)
+        await writer.flush()
+        tries = len(attempts)
+        after_failure = spilled(writer)
+
+        # Still down: the spill file is kept as is (not lost, not duplicated)
+        await writer.record("second", "fix_applied", {})
+        await writer.flush()
+        still_down = spilled(writer)
+
+        cluster().fault = lambda handler: None
+        await writer.flush()
+        return tries, after_failure, still_down, await indexed(writer)
+
+    tries, after_failure, still_down, ids = run(scenario())
+    assert tries == settings.HISTORY_MAX_RETRIES + 1
+    assert after_failure == ["first"]
+    assert still_down == ["first", "second"]
+    assert ids == ["first", "second"]
+    assert not HistoryWriter()._read_spill()
+
+def test_spill_file_is_trimmed_to_its_cap(writer, monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_SPILL_MAX_EVENTS", 3)
+    for i in range(5):
+        writer._spill([{"event_id": str(i), "issue_id": f"issue-{i}"}])
+    assert spilled(writer) == ["issue-2", "issue-3", "issue-4"]
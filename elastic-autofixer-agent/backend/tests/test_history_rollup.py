@@ -0,0 +1,90 @@
+import time
+import pytest
+from app.config import settings
+from app.services.coordination import coordinator
+from app.services.history import history_writer
+from app.services import history_rollup as rollup_module
+from app.services.history_rollup import history_rollup
+
+BUCKET_MS = 60_000
+
+@pytest.fixture
+def history(monkeypatch):
+    """Writer and rollup with nothing cached from earlier tests, on one-minute buckets."""
+    for service in (history_writer, history_rollup):
+        monkeypatch.setattr(service, "client", None)
+        monkeypatch.setattr(service, "_index_ready", False)
+    monkeypatch.setattr(history_rollup, "_rolled_until", None)
+    monkeypatch.setattr(history_writer, "_oldest_flushed", None)
+    monkeypatch.setattr(settings, "HISTORY_ROLLUP_BUCKET", BUCKET_MS // 1000)
+    monkeypatch.setattr(settings, "HISTORY_FLUSH_INTERVAL", 0.0)
+
+async def record_at(timestamp: int, issue_id: str):
+    """An event flushed now but stamped in the past (a retry or a spill replay)."""
+    await history_writer.record(issue_id, "fix_applied", {}, category="mapping", metrics={"time_to_fix_ms": 2_000})
+    history_writer._buffer[-1]["@timestamp"] = timestamp
+    await history_writer.flush()
+
+def test_late_events_are_rolled_into_their_bucket(run, cluster, history):
+    start = (int(time.time() * 1000) // BUCKET_MS - 10) * BUCKET_MS
+
+    async def scenario():
+        await record_at(start + 1_000, "on-time")
+        assert await history_rollup.mark_late() == start # Flushed after its bucket was complete
+        assert await history_rollup.roll_up() == 1
+        before = await history_rollup.get_stats()
+
+        await record_at(start + 2_000, "late")
+        await record_at(start + 3 * BUCKET_MS, "later")
+        marked = await history_rollup.mark_late()
+        await history_rollup.roll_up()
+        return before, marked, await history_rollup.get_stats()
+
+    before, marked, after = run(scenario())
+    assert before["actions"] == {"fix_applied": 1}
+    assert marked == start # Oldest of the late events
+    assert after["actions"] == {"fix_applied": 3}
+    assert after["buckets"] == 2
+    assert not [doc for doc in cluster().indices[".autofixer-history-rollups"]["store"] if doc.startswith("dirty-")]
+
+def test_only_the_lease_owner_rolls_up(run, history, monkeypatch):
+    async def scenario():
+        await record_at(int(time.time() * 1000) - 5 * BUCKET_MS, "event")
+        await history_rollup.mark_late()
+        monkeypatch.setattr(coordinator, "owns", lambda resource: False)
+        skipped = await history_rollup._roll_up_if_owner()
+        monkeypatch.setattr(coordinator, "owns", lambda resource: resource == "__history_rollup__")
+        return skipped, await history_rollup._roll_up_if_owner()
+
+    assert run(scenario()) == (0, 1)
+
+def test_stats_page_through_every_summary(run, history, monkeypatch):
+    monkeypatch.setattr(rollup_module, "PAGE_SIZE", 2)
+    start = (int(time.time() * 1000) // BUCKET_MS - 10) * BUCKET_MS
+
+    async def scenario():
+        for i in range(5):
+            await record_at(start + i * BUCKET_MS, f"issue-{i}")
+        await history_rollup.roll_up()
+        return await history_rollup.get_stats()
+
+    stats = run(scenario())
+    assert stats["buckets"] == 5
+    assert stats["actions"] == {"fix_applied": 5}
+
+def test_summaries_past_retention_are_pruned(run, cluster, history, monkeypatch):
+    now = int(time.time() * 1000)
+    start = (now // BUCKET_MS - 10) * BUCKET_MS
+
+    async def scenario():
+        await record_at(start, "old")
+        await record_at(start + 5 * BUCKET_MS, "recent")
+        await history_rollup.roll_up()
+        # Keep only what ended in the last 7 buckets
+        monkeypatch.setattr(settings, "HISTORY_ROLLUP_RETENTION_DAYS", 7 * BUCKET_MS / 86_400_000)
+        return await history_rollup.prune(), await history_rollup.get_stats()
+
+    pruned, stats = run(scenario())
+    assert pruned == 1
+    assert stats["buckets"] == 1 and stats["actions"] == {"fix_applied": 1}
+    assert "checkpoint" in cluster().indices[".autofixer-history-rollups"]["store"]
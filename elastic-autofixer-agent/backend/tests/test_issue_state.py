@@ -0,0 +1,49 @@
+import types
+from app.config import settings
+from app.models.es_types import DiagnosticResult
+from app.services import issue_state
+from app.services.issue_state import IssueTracker, issue_key, APPLIED, FAILED, PROPOSED
+
+def issue():
+    return DiagnosticResult(
+        issue_id="missing_ilm_logs", severity="medium", category="ilm",
+        description="", affected_resource="logs", detected_at="now", metrics={}
+    )
+
+def test_proposals_and_failures_expire(monkeypatch):
+    now = {"s": 1_700_000_000.0}
+    monkeypatch.setattr(issue_state, "time", types.SimpleNamespace(time=lambda: now["s"]))
+    tracker = IssueTracker()
+    key = issue_key(issue())
+
+    tracker._set(key, PROPOSED, int(now["s"] * 1000), None)
+    now["s"] += settings.ISSUE_PROPOSAL_TTL - 1
+    assert tracker.is_handled(issue())
+    now["s"] += 2
+    assert not tracker.is_handled(issue()) # Never applied: propose again
+
+    tracker._set(key, APPLIED, int(now["s"] * 1000), None)
+    now["s"] += settings.ISSUE_PROPOSAL_TTL * 10
+    assert tracker.is_handled(issue()) # Applied fixes wait for verification, however long
+
+    tracker._set(key, FAILED, int(now["s"] * 1000), None)
+    assert tracker.is_handled(issue())
+    now["s"] += settings.ISSUE_RETRY_AFTER + 1
+    assert not tracker.is_handled(issue())
+
+def test_an_unreadable_history_leaves_an_empty_state(run, monkeypatch):
+    calls = []
+
+    async def unavailable(**kwargs):
+        calls.append(kwargs)
+        raise ConnectionError("history is down")
+    monkeypatch.setattr(issue_state.history_reader, "search", unavailable)
+    tracker = IssueTracker()
+
+    async def scenario():
+        await tracker.load()
+        await tracker.load()
+
+    run(scenario())
+    assert not tracker.is_handled(issue())
+    assert len(calls) == 2 # Not marked loaded: every cycle tries again
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services import jobs as jobs_module
+from app.services.es_client import es_wrapper
+from app.services.jobs import JobRunner, FAILED, SUCCEEDED
+
+@pytest.fixture
+def replicas(monkeypatch):
+    """Two job runners sharing the jobs index, like two replicas behind a load balancer."""
+    monkeypatch.setattr(jobs_module, "REMOTE_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT", 0.05)
+
+    def make(handler):
+        runners = [JobRunner(), JobRunner()]
+        for runner in runners:
+            runner.register("echo", handler)
+        return runners
+    return make
+
+def test_jobs_are_shared_across_replicas(run, replicas):
+    async def echo(payload):
+        await asyncio.sleep(0.05)
+        return {"echo": payload["n"]}
+
+    async def scenario():
+        a, b = replicas(echo)
+        a.start(); b.start()
+        try:
+            job = await a.submit("echo", {"n": 1}, idempotency_key="k1")
+            duplicate = await b.submit("echo", {"n": 1}, idempotency_key="k1")
+            with es_wrapper.using("east"):
+                other_cluster = await b.submit("echo", {"n": 1}, idempotency_key="k1")
+            finished = await b.wait(job["job_id"], 5)
+            listed = [j["job_id"] for j in await b.list_jobs(kind="echo")]
+            return job, duplicate, other_cluster, finished, listed
+        finally:
+            await a.stop(); await b.stop()
+
+    job, duplicate, other_cluster, finished, listed = run(scenario())
+    assert duplicate["job_id"] == job["job_id"]
+    assert job["idempotency_key"] == "echo:default:k1"
+    assert other_cluster["job_id"] != job["job_id"] and other_cluster["cluster"] == "east"
+    assert finished["status"] == SUCCEEDED and finished["result"] == {"echo": 1}
+    assert job["job_id"] in listed and other_cluster["job_id"] in listed
+
+def test_jobs_of_a_stopped_replica_read_as_failed(run, replicas):
+    async def hang(payload):
+        await asyncio.Event().wait()
+
+    async def scenario():
+        a, b = replicas(hang)
+        a.start(); b.start()
+        try:
+            job = await a.submit("echo", {}, idempotency_key="k2")
+            await asyncio.sleep(0.1)
+            running = await b.get(job["job_id"])
+            await a.stop() # No more heartbeats
+            await asyncio.sleep(0.2)
+            orphaned = await b.get(job["job_id"])
+            resubmitted = await b.submit("echo", {}, idempotency_key="k2")
+            return running, orphaned, resubmitted, job
+        finally:
+            await a.stop(); await b.stop()
+
+    running, orphaned, resubmitted, job = run(scenario())
+    assert running["status"] == "running"
+    assert orphaned["status"] == FAILED and "stopped" in orphaned["error"]
+    assert resubmitted["job_id"] != job["job_id"]
@@ -0,0 +1,63 @@
+import pytest
+from collections import OrderedDict
+from app.config import settings
+from app.core.query_cost import query_cost
+from app.services.es_client import es_wrapper
+
+DOCS = 300
+
+@pytest.fixture
+def estimate(run, monkeypatch):
+    """Estimates against an 'events' index with one unique user per doc (sample: 100 terms)."""
+    monkeypatch.setattr(query_cost, "_profiles", OrderedDict())
+    monkeypatch.setattr(settings, "QUERY_COST_TERMS_SAMPLE", 100)
+
+    def estimator(*bodies):
+        async def scenario():
+            client = await es_wrapper.get_client()
+            await client.indices.create(index="events", body={"mappings": {"properties": {
+                "user": {"type": "keyword"},
+                "status": {"type": "keyword"},
+                "items": {"type": "nested", "properties": {"sku": {"type": "keyword"}}}
+            }}})
+            body = []
+            for i in range(DOCS):
+                body += [{"index": {"_index": "events", "_id": str(i)}}, {"user": f"user-{i:04d}", "status": ["ok", "error"][i % 2]}]
+            await client.bulk(body=body, refresh=True)
+            return [await query_cost.estimate("events", body) for body in bodies]
+        return run(scenario())
+    return estimator
+
+def factors(result):
+    return {item["factor"] for item in result["factors"]}
+
+def test_leading_wildcard_costs_more_than_a_term(estimate):
+    term, wildcard = estimate(
+        {"query": {"term": {"user": "user-0001"}}},
+        {"query": {"wildcard": {"user": {"value": "*0001"}}}}
+    )
+    assert wildcard["cost"] > term["cost"]
+    assert "leading_wildcard" in factors(wildcard) and not factors(term)
+    # A full _terms_enum page (100 of 300 terms) is saturated: one term per doc, not 100
+    assert next(f for f in wildcard["factors"] if f["factor"] == "leading_wildcard")["cost"] == pytest.approx(DOCS / 1000)
+
+def test_deep_pagination_is_penalized(estimate):
+    shallow, deep = estimate({"from": 0, "size": 10}, {"from": settings.QUERY_COST_DEEP_FROM, "size": 10})
+    assert deep["cost"] > shallow["cost"]
+    assert "deep_pagination" in factors(deep) and not factors(shallow)
+
+def test_terms_agg_on_high_cardinality_field(estimate):
+    low, high = estimate(
+        {"size": 0, "aggs": {"by_status": {"terms": {"field": "status"}}}},
+        {"size": 0, "aggs": {"by_user": {"terms": {"field": "user"}}}}
+    )
+    assert "high_cardinality_terms" in factors(high) and "high_cardinality_terms" not in factors(low)
+    assert high["cost"] > low["cost"]
+
+def test_nested_query_is_penalized(estimate):
+    flat, nested = estimate(
+        {"query": {"term": {"status": "ok"}}},
+        {"query": {"nested": {"path": "items", "query": {"term": {"items.sku": "a"}}}}}
+    )
+    assert nested["cost"] > flat["cost"]
+    assert {"factor": "nested", "field": "items", "cost": pytest.approx(DOCS / 1000 * 3)} in nested["factors"]
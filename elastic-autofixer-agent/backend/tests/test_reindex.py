@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.core.reindexer import reindexer, SourceLocked
+from app.core.validator import validator
+from app.models.es_types import FixProposal
+from app.services.es_client import es_wrapper
+
+# price: long -> keyword can't be done in place
+TYPE_CHANGE = {"properties": {"price": {"type": "keyword"}}}
+
+@pytest.fixture(autouse=True)
+def fast_jobs(monkeypatch):
+    monkeypatch.setattr(reindexer, "_index_ready", set()) # Each test starts on a fresh cluster
+    monkeypatch.setattr(settings, "REINDEX_POLL_INTERVAL", 0.01)
+
+async def _orders(client, alias=True):
+    await client.indices.create(index="orders-v1", mappings={"properties": {"price": {"type": "long"}, "sku": {"type": "keyword"}}})
+    for i in range(1, 4):
+        await client.index(index="orders-v1", id=str(i), document={"price": i * 10, "sku": f"sku-{i}"})
+    if alias:
+        await client.indices.put_alias(index="orders-v1", name="orders")
+
+def _proposal(index: str, fixed_code: dict) -> FixProposal:
+    return FixProposal(
+        issue_id="mapping_orders", original_code={"index": index, "category": "mapping"},
+        fixed_code=fixed_code, explanation="test", estimated_impact="none"
+    )
+
+def test_apply_fix_never_reindexes_implicitly(run):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _orders(client)
+        result = await validator.apply_fix(_proposal("orders", TYPE_CHANGE))
+        return result, await client.cat.indices(index="orders-*", format="json", h="index")
+
+    result, indices = run(scenario())
+    assert result["status"] == "reindex_required"
+    assert indices == [{"index": "orders-v1"}] # No target index was created
+
+def test_refuses_unaliased_sources_and_field_drops(run, monkeypatch):
+    monkeypatch.setattr(settings, "REINDEX_EXPLODED_FIELDS", 1)
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _orders(client, alias=False)
+        with pytest.raises(ValueError, match="not behind an alias"):
+            await reindexer.start("orders-v1", TYPE_CHANGE)
+        await client.indices.put_alias(index="orders-v1", name="orders")
+        with pytest.raises(ValueError, match="allow_field_drop"):
+            await reindexer.start("orders", {"dynamic": "strict", "properties": {"sku": {"type": "keyword"}}})
+
+    run(scenario())
+
+def test_catch_up_carries_updates_deletes_and_keeps_the_source(run, monkeypatch):
+    monkeypatch.setattr(reindexer, "_spawn", lambda job: None) # Driven by hand below
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _orders(client)
+        job = await reindexer.start("orders", TYPE_CHANGE, issue_id="mapping_orders", category="mapping")
+        with pytest.raises(SourceLocked):
+            await reindexer.start("orders", TYPE_CHANGE)
+        await reindexer._start_copy(job)
+
+        # Writes that land while the bulk copy runs
+        await client.index(index="orders-v1", id="1", document={"price": 11, "sku": "sku-1"})
+        await client.delete(index="orders-v1", id="2")
+        await client.index(index="orders-v1", id="4", document={"price": 40, "sku": "sku-4"})
+        await reindexer._drive(job)
+
+        copied = await client.search(index=job["target"], query={"match_all": {}}, size=10)
+        aliases = await client.indices.get_alias(name="orders")
+        source = await client.indices.get_settings(index="orders-v1", flat_settings=True)
+        lock = await client.options(ignore_status=404).get(index=".autofixer-reindex-jobs", id="source-lock:orders-v1")
+        return job, {hit["_id"]: hit["_source"]["price"] for hit in copied["hits"]["hits"]}, aliases, source, lock
+
+    job, prices, aliases, source, lock = run(scenario())
+    assert job["state"] == "done", job["error"]
+    assert prices == {"1": 11, "3": 30, "4": 40}
+    assert list(aliases) == [job["target"]]
+    assert source["orders-v1"]["settings"]["index.blocks.write"] == "true" # Kept, not deleted
+    assert not lock["found"]
+
+def test_overrunning_final_pass_lifts_the_write_block(run, monkeypatch):
+    async def slow_final_pass(job):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(reindexer, "_spawn", lambda job: None)
+    monkeypatch.setattr(reindexer, "_final_pass", slow_final_pass)
+    monkeypatch.setattr(settings, "REINDEX_BLOCK_TIMEOUT", 0.01)
+    monkeypatch.setattr(settings, "REINDEX_CATCH_UP_ATTEMPTS", 2)
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _orders(client)
+        job = await reindexer.start("orders", TYPE_CHANGE)
+        await reindexer._drive(job)
+        source = await client.indices.get_settings(index="orders-v1", flat_settings=True)
+        return job, source["orders-v1"]["settings"]
+
+    job, source = run(scenario())
+    assert job["state"] == "failed" and job["catch_up_attempts"] == 2
+    assert source.get("index.blocks.write") == "false"
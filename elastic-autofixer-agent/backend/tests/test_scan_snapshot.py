@@ -0,0 +1,104 @@
+import asyncio
+import types
+import pytest
+from app.config import settings
+from app.core import scan_snapshot as snapshot_module
+from app.core.scan_snapshot import ScanSnapshots, scan_snapshots
+from app.services.es_client import es_wrapper
+from app.services.es_simulator import SimulatedError
+
+@pytest.fixture
+def scans(monkeypatch):
+    """Counts scans (each one yielding to the loop first, so callers can overlap) on a fake clock."""
+    now = {"s": 1_000.0}
+    monkeypatch.setattr(snapshot_module, "time", types.SimpleNamespace(monotonic=lambda: now["s"], time=lambda: now["s"]))
+    monkeypatch.setattr(scan_snapshots, "snapshots", {})
+    monkeypatch.setattr(scan_snapshots, "_inflight", {})
+    started = []
+    scan_all = snapshot_module.scanner.scan_all
+
+    async def counted(errors=None):
+        started.append(es_wrapper.current())
+        await asyncio.sleep(0.01)
+        return await scan_all(errors)
+    monkeypatch.setattr(snapshot_module.scanner, "scan_all", counted)
+    return types.SimpleNamespace(started=started, clock=now)
+
+def unreachable(cluster):
+    cluster().fault = lambda handler: SimulatedError(503, "unavailable_shards_exception", "Simulated.") if handler == "cat_indices" else None
+
+def test_concurrent_callers_share_one_scan(run, scans):
+    snapshots = ScanSnapshots()
+
+    async def scenario():
+        return await asyncio.gather(*(snapshots.get("default") for _ in range(5)))
+
+    results = run(scenario())
+    assert scans.started == ["default"]
+    assert all(result is results[0] for result in results)
+
+def test_stale_snapshots_are_served_while_one_rescan_runs(run, scans):
+    snapshots = ScanSnapshots()
+
+    async def scenario():
+        first = await snapshots.get("default")
+        scans.clock["s"] += settings.SCAN_SNAPSHOT_TTL / 2
+        assert await snapshots.get("default") is first # Fresh: no rescan
+
+        scans.clock["s"] += settings.SCAN_SNAPSHOT_TTL
+        stale = await asyncio.gather(*(snapshots.get("default") for _ in range(3)))
+        assert all(result is first for result in stale) # Served at once...
+        await asyncio.gather(*snapshots._inflight.values()) # ...while one background scan refreshes it
+        refreshed = snapshots.snapshots["default"]
+
+        scans.clock["s"] += settings.SCAN_SNAPSHOT_TTL + settings.SCAN_SNAPSHOT_STALE + 1
+        expired = await snapshots.get("default") # Too old to serve: rescanned first
+        return first, refreshed, expired
+
+    first, refreshed, expired = run(scenario())
+    assert len(scans.started) == 3
+    assert refreshed is not first and expired is not refreshed
+    assert refreshed["etag"] == first["etag"] # Same issues, same ETag
+
+def test_failed_scans_are_not_cached(run, cluster, scans):
+    snapshots = ScanSnapshots()
+
+    async def scenario():
+        await es_wrapper.get_client()
+        unreachable(cluster)
+        with pytest.raises(Exception):
+            await snapshots.get("default")
+        cached = dict(snapshots.snapshots)
+        cluster().fault = lambda handler: None
+        return cached, await snapshots.get("default")
+
+    cached, snapshot = run(scenario())
+    assert cached == {}
+    assert len(scans.started) == 2 and snapshot["issues"]
+
+def test_diagnose_revalidates_with_etags(api, scans):
+    first = api.get("/api/v1/diagnose", params={"cluster": "east"})
+    assert first.status_code == 200 and first.json()
+    etag = first.headers["ETag"]
+    assert first.headers["Age"] == "0"
+
+    scans.clock["s"] += 12.5
+    again = api.get("/api/v1/diagnose", params={"cluster": "east"}, headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert again.status_code == 304 and not again.content
+    assert again.headers["ETag"] == etag
+    assert (again.headers["Age"], again.headers["X-Snapshot-Age-Ms"]) == ("12", "12500")
+
+    assert api.get("/api/v1/diagnose", params={"cluster": "east"}, headers={"If-None-Match": '"other"'}).status_code == 200
+    assert scans.started == ["east"] # All served from the one snapshot
+
+def test_diagnose_lists_clusters_that_failed(api, cluster, scans):
+    api.get("/api/v1/diagnose") # Connects to every cluster
+    scan_snapshots.snapshots.clear()
+    unreachable(lambda: cluster("east"))
+    resp = api.get("/api/v1/diagnose")
+    assert resp.status_code == 200
+    assert resp.headers["X-Failed-Clusters"] == "east"
+    assert {issue["cluster"] for issue in resp.json()} == {"default"}
+
+    assert api.get("/api/v1/diagnose", params={"cluster": "east"}).status_code == 502
+    assert "east" not in scan_snapshots.snapshots
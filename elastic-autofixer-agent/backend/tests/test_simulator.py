@@ -0,0 +1,84 @@
+import pytest
+from elasticsearch import ApiError
+from app.services.es_client import es_wrapper
+
+async def _seed(client, index, docs, mappings=None):
+    await client.indices.create(index=index, mappings=mappings or {"dynamic": "false", "properties": {}})
+    for doc_id, source in docs.items():
+        await client.index(index=index, id=doc_id, document=source)
+
+def test_reindex_copies_matching_documents_and_source_fields(run, cluster):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _seed(client, "src", {
+            "1": {"@timestamp": 10, "a": 1, "b": 2},
+            "2": {"@timestamp": 20, "a": 3, "b": 4},
+            "3": {"@timestamp": 30, "a": 5, "b": 6}
+        })
+        resp = await client.reindex(
+            source={"index": "src", "query": {"range": {"@timestamp": {"gte": 20}}}, "_source": ["a"]},
+            dest={"index": "dst"}
+        )
+        copied = await client.search(index="dst", query={"match_all": {}}, sort=["@timestamp"])
+        return resp, [(hit["_id"], hit["_source"]) for hit in copied["hits"]["hits"]]
+
+    resp, hits = run(scenario())
+    assert resp["created"] == 2 and resp["failures"] == []
+    assert sorted(hits) == [("2", {"a": 3}), ("3", {"a": 5})]
+
+def test_reindex_create_conflicts_and_strict_target(run):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _seed(client, "src", {"1": {"a": 1}, "2": {"a": 2, "extra": True}})
+        await _seed(client, "dst", {"1": {"a": 1}})
+        proceed = await client.reindex(source={"index": "src"}, dest={"index": "dst", "op_type": "create"}, conflicts="proceed")
+
+        await client.indices.create(index="strict", mappings={"dynamic": "strict", "properties": {"a": {"type": "long"}}})
+        aborted = await client.reindex(source={"index": "src"}, dest={"index": "strict"}, conflicts="proceed")
+        return proceed, aborted
+
+    proceed, aborted = run(scenario())
+    assert (proceed["created"], proceed["version_conflicts"]) == (1, 1)
+    assert aborted["failures"][0]["cause"]["type"] == "strict_dynamic_mapping_exception"
+
+def test_async_reindex_reports_through_tasks_api(run):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _seed(client, "src", {"1": {"a": 1}})
+        started = await client.reindex(source={"index": "src"}, dest={"index": "dst"}, requests_per_second=50, wait_for_completion=False)
+        await client.reindex_rethrottle(task_id=started["task"], requests_per_second=10)
+        return await client.tasks.get(task_id=started["task"])
+
+    task = run(scenario())
+    assert task["completed"]
+    assert task["response"]["created"] == 1
+    assert task["task"]["status"]["requests_per_second"] == 10
+
+def test_synthetic_documents_copy_as_a_count(run, cluster):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        source = next(name for name in cluster().indices if name.startswith("logs-app"))
+        await client.reindex(source={"index": source}, dest={"index": "copy"})
+        return (await client.count(index=source))["count"], (await client.count(index="copy"))["count"]
+
+    source_count, copy_count = run(scenario())
+    assert copy_count == source_count > 0
+
+def test_write_block_rejects_writes(run):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await _seed(client, "src", {"1": {"a": 1}})
+        await client.indices.add_block(index="src", block="write")
+        await client.index(index="src", id="2", document={"a": 2})
+
+    with pytest.raises(ApiError) as error:
+        run(scenario())
+    assert error.value.meta.status == 403
+
+def test_resolve_index_lists_concrete_indices(run):
+    async def scenario():
+        client = await es_wrapper.get_client()
+        return await client.indices.resolve_index(name="logs-app-*")
+
+    resolved = run(scenario())
+    assert resolved["indices"] and all(entry["name"].startswith("logs-app-") for entry in resolved["indices"])
@@ -0,0 +1,20 @@
+import importlib.util
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parents[2] / "scripts" / "check_startup_budget.py"
+
+def _budget_check():
+    spec = importlib.util.spec_from_file_location("check_startup_budget", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_starts_within_budget_while_the_cluster_is_unreachable():
+    check = _budget_check()
+    result = check.measure(runs=2)
+
+    assert result["import_s"] <= check.IMPORT_BUDGET
+    assert not result["import_printed"]
+    assert result["startup_s"] <= check.STARTUP_BUDGET
+    assert result["live"] == 200
+    assert result["ready"] == 503
@@ -0,0 +1,143 @@
+import asyncio
+import time
+import pytest
+from elastic_transport import NodeConfig
+from elasticsearch import ApiError
+from app.config import settings
+from app.services.es_client import es_wrapper
+from app.services.es_simulator import SimulatedError
+from app.services.es_transport import (
+    AdaptiveLimiter, CircuitBreaker, LimitedTransport, breaker, limiter, operation_class,
+    CLOSED, HALF_OPEN, OPEN, INTERACTIVE, BACKGROUND
+)
+
+def test_only_half_open_probes_are_counted(monkeypatch):
+    monkeypatch.setattr(settings, "ES_BREAKER_HALF_OPEN_PROBES", 1)
+    circuits = CircuitBreaker()
+    circuit, early = circuits.before("default", "read") # Admitted while closed
+    assert early is None
+
+    circuit.state, circuit.opened_at = OPEN, time.monotonic() - settings.ES_BREAKER_OPEN_SECONDS
+    _, probe = circuits.before("default", "read")
+    assert circuit.state == HALF_OPEN and probe is not None
+
+    circuits.after(circuit, early, True, None) # The early request fails late: not a verdict on the probe period
+    circuits.abandon(circuit, early)
+    assert (circuit.state, circuit.probes) == (HALF_OPEN, 1)
+
+    circuits.after(circuit, probe, False, 0.01)
+    assert (circuit.state, circuit.probes) == (CLOSED, 0)
+    circuits.abandon(circuit, probe) # Finishing twice (or after the period) never goes negative
+    assert circuit.probes == 0
+
+def test_reads_are_hedged_only_with_several_nodes(run, monkeypatch):
+    hedged = []
+    original = LimitedTransport._hedged
+
+    async def recording(self, delay, method, target, kwargs):
+        hedged.append(target)
+        return await original(self, delay, method, target, kwargs)
+
+    monkeypatch.setattr(LimitedTransport, "_hedged", recording)
+    monkeypatch.setattr(breaker, "circuits", {}) # Latency samples below stay out of other tests
+
+    async def scenario():
+        client = await es_wrapper.get_client()
+        circuit = breaker._get("default", operation_class("POST", "/_search"))
+        circuit.latencies.extend([0.01] * settings.ES_HEDGE_MIN_SAMPLES)
+        await client.search(index="*", size=0)
+        single = len(hedged)
+        client.transport.node_pool.add(NodeConfig("http", "default.simulated", 9201))
+        await client.search(index="*", size=0)
+        return single, len(hedged)
+
+    assert run(scenario()) == (0, 1)
+
+def test_limit_grows_additively_on_success():
+    limits = AdaptiveLimiter()
+    state = limits._get("default", "read")
+    start = state.limit
+    for _ in range(int(start)):
+        limits.record(state, 0.01, False)
+    # ~1 per window of `limit` fast successes
+    assert start + 0.9 < state.limit <= start + 1
+
+@pytest.mark.parametrize("status, error", [
+    (429, {"type": "too_many_requests"}),
+    (503, {"type": "es_rejected_execution_exception", "reason": "queue full"}),
+])
+def test_limit_is_cut_multiplicatively_on_rejection(run, cluster, monkeypatch, status, error):
+    monkeypatch.setattr(limiter, "limits", {})
+    monkeypatch.setattr(breaker, "circuits", {})
+
+    async def scenario():
+        client = await es_wrapper.get_client()
+        await client.search(index="*", size=0) # Sets a latency baseline
+        before = limiter.limits[("default", "read")].limit
+        cluster().fault = lambda handler: SimulatedError(status, error["type"], "Simulated.")
+        with pytest.raises(ApiError):
+            await client.options(max_retries=0).search(index="*", size=0)
+        return before, limiter.limits[("default", "read")]
+
+    before, state = run(scenario())
+    assert state.limit == pytest.approx(before * settings.ES_LIMIT_BACKOFF)
+    assert state.rejections == 1
+
+def test_a_burst_of_rejections_cuts_the_limit_once():
+    limits = AdaptiveLimiter()
+    state = limits._get("default", "read")
+    for _ in range(5):
+        limits.record(state, 0.01, True)
+    assert state.limit == pytest.approx(settings.ES_LIMIT_INITIAL * settings.ES_LIMIT_BACKOFF)
+    assert state.rejections == 5
+
+def test_interactive_callers_are_admitted_before_queued_background_ones(run, monkeypatch):
+    monkeypatch.setattr(settings, "ES_LIMIT_INITIAL", 2)
+    limits = AdaptiveLimiter()
+    admitted = []
+
+    async def caller(priority):
+        await limits.acquire("default", "read", priority)
+        admitted.append(priority)
+
+    async def scenario():
+        held = [await limits.acquire("default", "read", INTERACTIVE) for _ in range(2)]
+        waiting = [asyncio.ensure_future(caller(BACKGROUND))]
+        await asyncio.sleep(0)
+        waiting.append(asyncio.ensure_future(caller(INTERACTIVE))) # Queued later...
+        await asyncio.sleep(0)
+        assert not admitted
+
+        limits.release(held[0])
+        await asyncio.sleep(0)
+        assert admitted == [INTERACTIVE] # ...but admitted first
+        limits.release(held[1])
+        await asyncio.gather(*waiting)
+
+    run(scenario())
+    assert admitted == [INTERACTIVE, BACKGROUND]
+
+def test_background_traffic_is_capped_at_its_share(run, monkeypatch):
+    monkeypatch.setattr(settings, "ES_LIMIT_INITIAL", 4)
+    monkeypatch.setattr(settings, "ES_LIMIT_BACKGROUND_SHARE", 0.5)
+    limits = AdaptiveLimiter()
+
+    async def scenario():
+        state = None
+        for _ in range(2):
+            state = await limits.acquire("default", "read", BACKGROUND)
+        third = asyncio.ensure_future(limits.acquire("default", "read", BACKGROUND))
+        await asyncio.sleep(0)
+        assert not third.done() and state.in_flight == 2
+
+        # Interactive callers can still use the headroom
+        for _ in range(2):
+            await asyncio.wait_for(limits.acquire("default", "read", INTERACTIVE), 1)
+        assert state.in_flight == 4
+
+        for _ in range(3):
+            limits.release(state)
+        await asyncio.wait_for(third, 1) # Back under the background share
+        return state.in_flight
+
+    assert run(scenario()) == 2
@@ -0,0 +1,87 @@
+import types
+import pytest
+from app.config import settings
+from app.core import validation_cache as cache_module, validator as validator_module
+from app.core.validation_cache import ValidationCache
+from app.core.validator import validator
+from app.models.es_types import FixProposal
+from app.services.es_client import es_wrapper
+from app.services.es_simulator import SimulatedError
+
+INDEX = "logs-app-00002"
+QUERY = {"match": {"message": "error"}}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic seconds the cache sees."""
+    now = {"s": 1_000.0}
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(monotonic=lambda: now["s"]))
+    return now
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ValidationCache(max_size=2)
+    first, second, third = (("default:logs", "v1", digest) for digest in "abc")
+    cache.put(first, True)
+    cache.put(second, False)
+    assert cache.get(first) is True # Now the most recently used
+    cache.put(third, True)
+    assert cache.get(second) is None
+    assert (cache.get(first), cache.get(third)) == (True, True)
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ValidationCache(ttl=10.0)
+    key = ("default:logs", "v1", "a")
+    cache.put(key, True)
+    clock["s"] += 9.0
+    assert cache.get(key) is True
+    clock["s"] += 2.0
+    assert cache.get(key) is None
+    assert cache.stats() == {"size": 0, "hits": 1, "misses": 1}
+
+async def _add_field(index: str):
+    client = await es_wrapper.get_client()
+    await client.indices.put_mapping(index=index, body={"properties": {"extra": {"type": "keyword"}}})
+
+@pytest.mark.parametrize("cluster_state", [True, False], ids=["mappings_version", "get_mapping"])
+def test_a_mapping_change_is_a_miss(run, cluster, clock, cluster_state):
+    async def scenario():
+        cache = ValidationCache()
+        await es_wrapper.get_client()
+        if not cluster_state: # e.g. Serverless: the mapping itself is the version
+            cluster().fault = lambda handler: SimulatedError(400, "illegal_argument_exception", "No.") if handler == "cluster_state" else None
+        before = await cache.mapping_version(INDEX)
+        cache.put(cache.key(INDEX, before, QUERY), True)
+
+        await _add_field(INDEX)
+        memoized = await cache.mapping_version(INDEX) # Trusted for VALIDATION_VERSION_TTL
+        clock["s"] += settings.VALIDATION_VERSION_TTL + 1
+        after = await cache.mapping_version(INDEX)
+        return cache, before, memoized, after
+
+    cache, before, memoized, after = run(scenario())
+    assert memoized == before != after
+    assert cache.get(cache.key(INDEX, after, QUERY)) is None
+    assert cache.stats()["size"] == 0 # Entries for the old version were dropped
+    assert cluster().requests.get("get_mapping", 0) == (0 if cluster_state else 2)
+
+def test_validate_many_sends_identical_queries_once(run, cluster, monkeypatch):
+    monkeypatch.setattr(validator_module, "validation_cache", ValidationCache())
+
+    def fix(query):
+        return FixProposal(
+            issue_id="query", original_code={"index": INDEX}, fixed_code={"query": query},
+            explanation="", estimated_impact=""
+        )
+
+    fixes = [fix(QUERY), fix(dict(QUERY)), fix({"term": {"level": "error"}}), fix(QUERY)]
+
+    async def scenario():
+        first = await validator.validate_many(fixes)
+        sent = cluster().requests["validate_query"]
+        again = await validator.validate_many(fixes)
+        return first, sent, again
+
+    first, sent, again = run(scenario())
+    assert first == again == [True] * 4
+    assert sent == 2 # One per distinct query
+    assert cluster().requests["validate_query"] == 2 # The second round was all cache hits
@@ -9,6 +9,13 @@ API_URL = "http://127.0.0.1:8000/api/v1"
 
 st.set_page_config(page_title="Elastic Auto-Fixer Agent", page_icon="🛠️", layout="wide")
 
+def wait_for_job(job, timeout=60):
+    """Long-polls a background job until it finishes (or the timeout passes)."""
+    deadline = time.time() + timeout
+    while job['status'] not in ('succeeded', 'failed') and time.time() < deadline:
+        job = requests.get(f"{API_URL}/jobs/{job['job_id']}", params={"wait": 10}).json()
+    return job
+
 # Header
 st.title("🛠️ Elastic Auto-Fixer Agent")
 st.markdown("### Autonomous SRE for Elastic Cloud Serverless")
@@ -51,9 +58,16 @@ else:
             if st.session_state.get(f'fix_{i}'):
                 with st.spinner("Consulting LLM & ESRE..."):
                     try:
-                        # Call Generate Fix API
-                        fix_resp = requests.post(f"{API_URL}/generate-fix", json=issue)
-                        proposal = fix_resp.json()
+                        # Submit a Generate Fix job. Submits are idempotent, so reruns
+                        # get the same job (and result) back instead of a new LLM call.
+                        # Jobs run on the issue's own cluster (the proposal carries it along too)
+                        scope = {"cluster": issue.get('cluster')} if issue.get('cluster') else {}
+                        job = requests.post(f"{API_URL}/jobs/generate-fix", json=issue, params=scope).json()
+                        job = wait_for_job(job)
+                        if job['status'] != 'succeeded':
+                            st.error(f"Fix generation {job['status']}: {job.get('error') or 'timed out'}")
+                            st.stop()
+                        proposal = job['result']
                         
                         st.markdown("---")
                         st.subheader("💡 AI Fix Proposal")
@@ -71,13 +85,14 @@ else:
                         # Apply Button
                         if st.button(f"🚀 Apply Fix to Cluster", key=f"apply_{i}"):
                             with st.spinner("Applying & Benchmarking..."):
-                                apply_resp = requests.post(f"{API_URL}/apply-fix", json=proposal)
-                                if apply_resp.status_code == 200:
-                                    st.success(f"✅ Success: {apply_resp.json()['message']}")
+                                apply_job = requests.post(f"{API_URL}/jobs/apply-fix", json=proposal, params=scope).json()
+                                apply_job = wait_for_job(apply_job, timeout=300)
+                                if apply_job['status'] == 'succeeded':
+                                    st.success(f"✅ Success: {apply_job['result']['message']}")
                                     time.sleep(2)
                                     st.rerun()
                                 else:
-                                    st.error("Failed to apply fix.")
+                                    st.error(f"Failed to apply fix: {apply_job.get('error') or 'timed out'}")
                                     
                     except Exception as e:
                         st.error(f"Error: {e}")
\ No newline at end of file
@@ -16,6 +16,37 @@ export const AutoFixerAPI = {
     }
   },
 
+  // 1b. Stream Problems as they are found (NDJSON); resolves with the final summary
+  streamDiagnosis: async (onIssue: (issue: any) => void) => {
+    try {
+      const response = await fetch(`${API_BASE}/diagnose/stream`);
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let pending = '';
+      let summary = null;
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        pending += decoder.decode(value, { stream: true });
+        const lines = pending.split('\n');
+        pending = lines.pop() || '';
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const record = JSON.parse(line);
+          if (record.type === 'issue') onIssue(record.data);
+          else if (record.type === 'summary') summary = record;
+        }
+      }
+      return summary;
+    } catch (e) {
+      console.error("Streaming diagnosis failed", e);
+      return null;
+    }
+  },
+
   // 2. Ask AI to Generate a Fix
   generateFix: async (diagnostic: any) => {
     try {
@@ -22,6 +22,41 @@ export function registerAutofixerRoutes(router: IRouter) {
     }
   );
 
+  // 1b. Streaming Diagnostics Route (NDJSON / SSE piped straight through, never buffered)
+  router.get(
+    {
+      path: '/api/autofixer/diagnose/stream',
+      validate: false,
+    },
+    async (context, request, response) => {
+      const params: Record<string, string> = {};
+      for (const key of ['format', 'cluster']) {
+        const value = request.url?.searchParams?.get(key);
+        if (value) params[key] = value;
+      }
+      // Stop the backend scan when the browser goes away
+      const controller = new AbortController();
+      request.events?.aborted$?.subscribe(() => controller.abort());
+      try {
+        const res = await axios.get(`${PYTHON_BACKEND_URL}/diagnose/stream`, {
+          params,
+          responseType: 'stream',
+          signal: controller.signal,
+        });
+        return response.ok({
+          body: res.data,
+          headers: {
+            'content-type': res.headers['content-type'],
+            'cache-control': 'no-cache',
+            'x-accel-buffering': 'no',
+          },
+        });
+      } catch (err) {
+        return response.customError({ statusCode: 502, body: 'Python Backend Unavailable' });
+      }
+    }
+  );
+
   // 2. Generate Fix Route
   router.post(
     {
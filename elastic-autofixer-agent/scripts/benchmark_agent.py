@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Measures the agent against simulated fleets of growing size (see app/services/es_simulator.py):
+# scan time, cycle time, fixes/sec, ES calls per scan and peak memory per fleet size.
+# Results go to benchmarks/latest.json; with a baseline there, regressions beyond
+# --tolerance exit with code 1. Record a baseline on the machine that checks it:
+#   python scripts/benchmark_agent.py --save-baseline
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+RESULTS_DIR = ROOT_DIR / "benchmarks"
+
+# Metric -> (higher is better, absolute change ignored as noise)
+METRICS = {
+    "scan_s": (False, 0.05),
+    "cycle_s": (False, 0.05),
+    "fixes_per_s": (True, 5.0),
+    "es_requests_per_scan": (False, 0),
+    "peak_mb": (False, 2.0),
+}
+
+PROBE = """
+import asyncio, json, os, statistics, sys, time, tracemalloc
+params = json.loads(sys.argv[1])
+out = sys.stdout
+sys.stdout = open(os.devnull, "w") # The agent prints per index; that cost stays in the timings
+
+from app.services.es_client import es_wrapper
+from app.services.es_simulator import clusters
+from app.core.diagnostic import scanner
+from app.core.fix_generator import fix_generator
+from app.core.validator import validator
+from app.services.agent_flow import agent
+
+async def timed(fn):
+    start = time.perf_counter()
+    result = await fn()
+    return time.perf_counter() - start, result
+
+async def main():
+    await es_wrapper.connect()
+    cluster = next(iter(clusters.values()))
+    fleet = len(cluster.indices)
+
+    scans, issues = [], []
+    calls = sum(cluster.requests.values())
+    for _ in range(params["runs"]):
+        took, issues = await timed(scanner.scan_all)
+        scans.append(took)
+    requests_per_scan = (sum(cluster.requests.values()) - calls) / params["runs"]
+
+    cycles = [(await timed(agent.run_autonomous_cycle))[0] for _ in range(params["cycles"])]
+
+    # Fix throughput: generate -> validate -> apply, several at once
+    semaphore = asyncio.Semaphore(params["concurrency"])
+    async def fix(issue):
+        async with semaphore:
+            proposal = await fix_generator.generate_fix(issue)
+            if not await validator.validate_syntax(proposal):
+                return False
+            return (await validator.apply_fix(proposal))["status"] == "success"
+    targets = issues[:params["fixes"]]
+    took, outcomes = await timed(lambda: asyncio.gather(*(fix(issue) for issue in targets)))
+
+    # Memory in a separate pass: tracemalloc would slow down the timed ones
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    await scanner.scan_all()
+    await agent.run_autonomous_cycle()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    await es_wrapper.close()
+
+    print(json.dumps({
+        "indices": fleet,
+        "issues": len(issues),
+        "scan_s": round(statistics.median(scans), 4),
+        "cycle_s": round(statistics.median(cycles), 4),
+        "fixes_per_s": round(sum(outcomes) / took, 2) if took else 0.0,
+        "fixes_ok": f"{sum(outcomes)}/{len(targets)}",
+        "es_requests_per_scan": round(requests_per_scan, 1),
+        "peak_mb": round(peak / 2 ** 20, 2)
+    }), file=out)
+
+asyncio.run(main())
+"""
+
+def run_probe(size: int, args: argparse.Namespace) -> dict:
+    simulated = {
+        "indices": size,
+        "bad_share": args.bad_share,
+        "bad_fields": args.bad_fields,
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "inference_ms": args.inference_ms,
+        "error_rate": args.error_rate,
+        "reject_rate": args.reject_rate,
+        "queries": args.queries,
+        "hot_share": args.hot_share,
+        "seed": args.seed
+    }
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        "ELASTIC_ENDPOINT": "",
+        "ELASTIC_CLOUD_ID": "",
+        "ELASTIC_API_KEY": "simulated", # Enables the inference path
+        "ELASTIC_CLUSTERS": json.dumps({"default": {"simulated": simulated}}),
+        "COORDINATION_ENABLED": "false",
+        "GROWTH_SAMPLE_INTERVAL": "0" # Every scan samples, so growth is forecast (and timed) within the run
+    }
+    params = {"runs": args.runs, "cycles": args.cycles, "fixes": args.fixes, "concurrency": args.concurrency}
+    with tempfile.TemporaryDirectory() as spill_dir:
+        # A throwaway spill file: the probe's history events never mix with a real replica's
+        env["HISTORY_SPILL_PATH"] = str(Path(spill_dir) / "history-spill.jsonl")
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, json.dumps(params)], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, timeout=args.timeout
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark of {size} indices failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for size, current in results.items():
+        before = baseline.get(size)
+        if before is None:
+            continue
+        for metric, (higher_is_better, noise) in METRICS.items():
+            old, new = before.get(metric), current.get(metric)
+            if old is None or new is None or abs(new - old) <= noise:
+                continue
+            worse = new < old * (1 - tolerance) if higher_is_better else new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{size} indices: {metric} {old} -> {new}")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Agent performance vs. fleet size, against a simulated cluster.")
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma-separated index counts (up to 50000)")
+    parser.add_argument("--runs", type=int, default=3, help="Scans per size (median is reported)")
+    parser.add_argument("--cycles", type=int, default=3, help="Agent cycles per size (median is reported)")
+    parser.add_argument("--fixes", type=int, default=20, help="Issues to fix for the fixes/sec measurement")
+    parser.add_argument("--concurrency", type=int, default=8, help="Fixes in flight at once")
+    parser.add_argument("--bad-share", type=float, default=0.1, help="Share of indices with an issue")
+    parser.add_argument("--bad-fields", type=int, default=600, help="Fields in a 'bad-mapping' index")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Median ES call latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal spread of the latency")
+    parser.add_argument("--inference-ms", type=float, default=50.0, help="Median _inference latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failing with 503")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="Share of calls rejected with 429")
+    parser.add_argument("--queries", type=int, default=20, help="Running searches for the query cost checks")
+    parser.add_argument("--hot-share", type=float, default=0.05, help="Share of indices growing toward a shard size limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per fleet size")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative slowdown counted as a regression")
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the new baseline")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("sizes", "output", "baseline", "save_baseline", "timeout", "tolerance")}
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"⏱️  Benchmarking {size} indices...", flush=True)
+        results[str(size)] = run = run_probe(size, args)
+        print(
+            f"   scan {run['scan_s'] * 1000:.0f}ms, cycle {run['cycle_s'] * 1000:.0f}ms, "
+            f"{run['fixes_per_s']} fixes/s ({run['fixes_ok']}), {run['es_requests_per_scan']} ES calls/scan, "
+            f"peak {run['peak_mb']}MB"
+        )
+
+    report = {
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": config,
+        "results": results
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"📝 Results written to {args.output}")
+
+    failures = []
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"📌 Baseline updated: {args.baseline}")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["config"] != config:
+            print("⚠️  Baseline was recorded with other parameters; not compared.")
+        else:
+            failures = compare(results, baseline["results"], args.tolerance)
+
+    for failure in failures:
+        print(f"❌ Regression: {failure}")
+    if not failures:
+        print("✅ No regressions")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
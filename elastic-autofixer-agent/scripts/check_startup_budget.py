@@ -0,0 +1,100 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Checks that the backend imports and starts within budget, even when Elasticsearch
+# is unreachable. Each measurement runs in a fresh interpreter (cold imports).
+# Exit code 1 if a budget is exceeded; run in CI: python scripts/check_startup_budget.py
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+IMPORT_BUDGET = 2.0 # Seconds allowed to import app.main
+STARTUP_BUDGET = 0.5 # Seconds allowed for lifespan startup
+
+IMPORT_PROBE = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+STARTUP_PROBE = """
+import asyncio, time, httpx
+from app.main import app
+
+async def main():
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter() - start
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://probe") as http:
+            live = (await http.get("/livez")).status_code
+            ready = (await http.get("/readyz")).status_code
+    print(started, live, ready)
+
+asyncio.run(main())
+"""
+
+def run_probe(code: str, env: dict) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Probe failed:\n{result.stderr}")
+    return result.stdout
+
+def probe_env() -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": str(BACKEND_DIR),
+        # Nothing listens here: startup must not wait for the cluster
+        "ELASTIC_ENDPOINT": "http://127.0.0.1:9",
+        "ELASTIC_CLUSTERS": "",
+        "COORDINATION_ENABLED": "false"
+    }
+
+def measure(runs: int) -> dict:
+    """Best-of-N import and startup times, and the health endpoints while the cluster is unreachable."""
+    env = probe_env()
+    outputs = [run_probe(IMPORT_PROBE, env) for _ in range(runs)]
+    samples = [run_probe(STARTUP_PROBE, env).strip().splitlines()[-1].split() for _ in range(runs)]
+    return {
+        "import_s": min(float(out.strip().splitlines()[-1]) for out in outputs),
+        "import_printed": any(len(out.strip().splitlines()) > 1 for out in outputs),
+        "startup_s": min(float(sample[0]) for sample in samples),
+        "live": int(samples[-1][1]),
+        "ready": int(samples[-1][2])
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time and startup-time budget check for the backend.")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET, help="Seconds allowed to import app.main")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET, help="Seconds allowed for lifespan startup")
+    parser.add_argument("--runs", type=int, default=3, help="Best of N (filters out a noisy first run)")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    failures = []
+    print(f"⏱️  import app.main: {result['import_s'] * 1000:.0f}ms (budget {args.import_budget * 1000:.0f}ms)")
+    if result["import_s"] > args.import_budget:
+        failures.append("import time over budget")
+    if result["import_printed"]:
+        failures.append("importing app.main printed output")
+
+    print(f"⏱️  lifespan startup: {result['startup_s'] * 1000:.0f}ms (budget {args.startup_budget * 1000:.0f}ms)")
+    print(f"   /livez -> {result['live']}, /readyz -> {result['ready']} (cluster unreachable)")
+    if result["startup_s"] > args.startup_budget:
+        failures.append("startup time over budget")
+    if result["live"] != 200:
+        failures.append("/livez should answer while the cluster is unreachable")
+    if result["ready"] != 503:
+        failures.append("/readyz should report not-ready while the cluster is unreachable")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Startup budget OK")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())